@@ -4,12 +4,12 @@ from .config import Dev
 from .extensions import cors, bcrypt, socketio
 from . import extensions
 from .errors import register_error_handlers
+from .utils import offload
 from pymongo import MongoClient
 from .services.chat import init_gemini 
 from .sockets.events import start_streamer_once
 from dotenv import load_dotenv
 from .blueprints.market.scheduler import start_market_scheduler
-from .services.market import preload_historical_cache
 
 
 load_dotenv()
@@ -64,16 +64,17 @@ def create_app(config_class=Dev):
 
     register_error_handlers(app)
 
-    # Socket.IO (match CORS with your frontend)
-    socketio.init_app(app, cors_allowed_origins=[frontend])
-
-    # Preload historical daily bars for frequently used symbols
-    try:
-        preload_historical_cache()
-    except Exception:
-        pass
-
-    # Start background streamer and schedulers
+    # Socket.IO (match CORS with your frontend); with several workers, a
+    # message queue carries broadcasts between them
+    async_mode = app.config.get("SOCKETIO_ASYNC_MODE", "threading")
+    offload.configure(async_mode, app.config.get("OFFLOAD_WORKERS", offload.DEFAULT_WORKERS))
+    socketio_opts = {"cors_allowed_origins": [frontend], "async_mode": async_mode}
+    if app.config.get("SOCKETIO_MESSAGE_QUEUE"):
+        socketio_opts["message_queue"] = app.config["SOCKETIO_MESSAGE_QUEUE"]
+    socketio.init_app(app, **socketio_opts)
+
+    # Start background streamer and schedulers (the scheduler preloads
+    # historical daily bars in the feed process)
     start_streamer_once(app)
     start_market_scheduler(app)
 
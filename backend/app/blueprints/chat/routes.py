@@ -3,6 +3,7 @@ from bson import ObjectId
 import jwt
 import google.generativeai as genai
 from ...extensions import db
+from ...utils import offload
 
 bp = Blueprint("chat", __name__)
 users_collection = db["users"] 
@@ -63,7 +64,8 @@ def chat():
     try:
         genai.configure(api_key=current_app.config["GEMINI_API_KEY"])
         model = genai.GenerativeModel("gemini-2.0-flash")
-        answer = model.generate_content(prompt).text
+        # gRPC call: keep it off the event loop under gevent / eventlet
+        answer = offload.run_blocking(model.generate_content, prompt).text
     except Exception as e:
         current_app.logger.exception("Gemini error")
         return jsonify({"error": "AI service unavailable"}), 503
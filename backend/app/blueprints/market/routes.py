@@ -1,6 +1,11 @@
 # app/blueprints/market/routes.py
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, Response, jsonify, request
 from ...services import market
+from ...services import cache
+from ...sockets import events as stream
+from ...services.downsample import MIN_POINTS, SHAPES
+from ...utils import codec, singleflight
+from ...utils.responses import err
 
 bp = Blueprint("market", __name__)
 
@@ -13,14 +18,50 @@ def symbols():
 def snapshot():
     """
     Returns   { "AAPL": {price, change, volume, ...}, ... }
+
+    Served from the pre-serialized snapshot; the ETag is the snapshot epoch and
+    version, so a matching If-None-Match gets an empty 304.
+
+    With `Accept: application/msgpack` the body is MessagePack in columns:
+    { "symbol": [...], "price": [...], "change": [...], ... }
     """
-    data = market.snapshot(market.SUBSCRIBE_SYMBOLS)
-    return jsonify(data)
+    if codec.wants_msgpack(request.accept_mimetypes):
+        body, version = market.snapshot_view.current_packed()
+        etag, mimetype = f"snap-{market.snapshot_view.epoch}-{version}-mp", codec.MSGPACK_MIMETYPE
+    else:
+        body, version = market.snapshot_view.current()
+        etag, mimetype = f"snap-{market.snapshot_view.epoch}-{version}", "application/json"
+    if request.if_none_match.contains(etag):
+        resp = Response(status=304)
+    else:
+        resp = Response(body, mimetype=mimetype)
+    resp.set_etag(etag)
+    resp.headers["Cache-Control"] = "no-cache"
+    resp.vary.add("Accept")
+    return resp
 
 @bp.get("/history/<symbol>/<period>")
 def history(symbol, period="1d"):
-    data = market.history(symbol, period)
-    return jsonify(data)
+    """
+    Optional `max_points` reduces the series for a chart that wide, with
+    `shape=ohlc` (default; merged candles) or `shape=line` (LTTB on close).
+    """
+    max_points = request.args.get("max_points", type=int)
+    shape = request.args.get("shape", "ohlc")
+    if max_points is not None and max_points < MIN_POINTS:
+        return err(f"max_points must be an integer >= {MIN_POINTS}", 400)
+    if shape not in SHAPES:
+        return err(f"shape must be one of {', '.join(SHAPES)}", 400)
+    opts = {"max_points": max_points, "shape": shape}
+    # MessagePack clients always get columns
+    if codec.wants_msgpack(request.accept_mimetypes):
+        data = market.history(symbol, period, columnar=True, **opts)
+        resp = Response(codec.packb(data), mimetype=codec.MSGPACK_MIMETYPE)
+    else:
+        columnar = request.args.get("format") == "columns"
+        resp = jsonify(market.history(symbol, period, columnar=columnar, **opts))
+    resp.vary.add("Accept")
+    return resp
 
 
 @bp.get("/market-status")
@@ -28,3 +69,25 @@ def market_status():
     return jsonify(market.get_market_status())
 
 
+@bp.get("/stats/upstream")
+def upstream_stats():
+    """Upstream calls executed vs. requests coalesced onto an in-flight call."""
+    return jsonify(singleflight.all_stats())
+
+
+@bp.get("/stats/cache")
+def cache_stats():
+    """Per-cache size, hit/miss/eviction counts and loader timings."""
+    return jsonify(cache.all_stats())
+
+
+@bp.get("/stats/streamer")
+def streamer_stats():
+    """Ticks in vs. messages out, and subscription counts, for the live stream."""
+    return jsonify(stream.stream_stats())
+
+
+@bp.get("/streamer/status")
+def streamer_status():
+    """Upstream connection state (streaming / polling / backoff / ...) and message rates."""
+    return jsonify(stream.streamer_status())
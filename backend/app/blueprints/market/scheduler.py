@@ -1,19 +1,57 @@
-import threading, time
+import logging, threading, time
 from flask import current_app
-from ...services import market
+from ...services import market, market_calendar, orders
+from ...sockets import events as stream
 
 
-def _daily_refresh_loop(app, interval_hours=24):
+def _daily_refresh_loop(app):
     with app.app_context():
         while True:
             try:
-                # Refresh at market close policy; we run daily regardless
                 market.refresh_historical_daily_all()
             except Exception:
                 pass
-            time.sleep(int(interval_hours * 3600))
+            # Next run once the next session's close has settled
+            time.sleep(market_calendar.seconds_until_daily_refresh())
 
 
-def start_market_scheduler(app):
+# How often a worker checks whether the feed process refreshed daily bars
+REFRESH_CHECK_SEC = 60
+
+
+def _follow_refresh_loop(app):
+    with app.app_context():
+        while True:
+            try:
+                market.follow_daily_refresh()
+            except Exception:
+                logging.exception("Daily refresh check failed")
+            time.sleep(REFRESH_CHECK_SEC)
+
+
+def _start_feed_jobs(app):
+    # Preload historical daily bars for frequently used symbols
+    try:
+        market.preload_historical_cache()
+    except Exception:
+        pass
     t = threading.Thread(target=_daily_refresh_loop, args=(app,), daemon=True)
-    t.start()
\ No newline at end of file
+    t.start()
+    # Warm symbol metadata concurrently and keep it fresh off the request path;
+    # other workers still fill their own cache on demand
+    market.meta_refresher.start(market.SUBSCRIBE_SYMBOLS)
+    # Cut and persist bars built from the trade stream
+    market.bar_builder.start()
+    if market.quote_board is not None:
+        # Match every worker's resting orders on every tick, not just this one's
+        orders.engine.start_sync()
+
+
+def start_market_scheduler(app):
+    # Shared upstream and DB work runs once, in the feed process
+    stream.run_as_feed_leader(lambda: _start_feed_jobs(app))
+    if market.quote_board is not None:
+        # Workers that do not refresh daily bars pick up the feed process's refreshes
+        threading.Thread(target=_follow_refresh_loop, args=(app,), daemon=True).start()
+    # Rest stored open orders and expire DAY orders after the close
+    orders.engine.start()
@@ -2,17 +2,14 @@
 from flask import Blueprint, request, current_app, jsonify, abort
 from ...extensions import db
 from ...utils.responses import ok, err
-from ...services.portfolio import PortfolioSvc
-from ...services import market
+from ...services.portfolio import pricing
+from ...services import market, orders, trading, valuation
 import jwt
 from bson import ObjectId
 from flask import jsonify
 from datetime import datetime
-import yfinance as yf
-from ...services.market import fetch_quote
 
 bp = Blueprint("portfolio", __name__)
-portfolio = PortfolioSvc()
 users_collection = db["users"] 
 portfoliodb= db["portfolios"]
 holdingsdb = db["portfolio_holdings"]
@@ -50,7 +47,8 @@ def get_balance():
         h["stock_symbol"]: h["quantity"]
         for h in holdingsdb.find({"portfolio_id": portfolio["_id"]})
     }
-    return ok({"usd": portfolio.get("available_balance", 0), "shares": holdings})
+    usd = portfolio.get("available_balance", 0)
+    return ok({"usd": usd, "shares": holdings, "total_value": pricing.total_value(usd, holdings)})
 
 # --------------------------------------------------------------------
 @bp.post("/trade")
@@ -75,79 +73,73 @@ def trade():
     if side not in {"BUY", "SELL"}:
         return err("tradeType must be BUY or SELL", 400)
 
-    # current market price
-    price = fetch_quote(symbol)["price"]
-    total = price * qty
+    # recent streamed price, else a live quote (the last close only after hours)
+    price = pricing.execution_price(symbol)
+    if price <= 0:
+        return err(f"No price available for {symbol}", 400)
 
-    portfolio = portfoliodb.find_one({"user_id": user["_id"]})
-    if not portfolio:
-        return err("Portfolio not found", 404)
+    # guarded, atomic updates; the response comes from the updated documents
+    try:
+        result = trading.execute_market_order(user["_id"], symbol, side, qty, price)
+    except trading.TradeRejected as e:
+        return err(str(e), e.status)
+    return ok(result)
 
-    # ----- BUY -------------------------------------------------------
-    if side == "BUY":
-        if portfolio.get("available_balance", 0) < total:
-            return err("Insufficient balance", 400)
+# --------------------------------------------------------------------
+def _price_arg(data, key):
+    value = data.get(key)
+    return None if value in (None, "") else float(value)
 
-        # decrement cash
-        portfoliodb.update_one(
-            {"_id": portfolio["_id"]},
-            {"$inc": {"available_balance": -total}}
-        )
 
-        # update / insert holding
-        holding = holdingsdb.find_one(
-            {"portfolio_id": portfolio["_id"], "stock_symbol": symbol}
-        )
-        if holding:
-            new_qty = holding["quantity"] + qty
-            new_avg = (
-                (holding["quantity"] * holding["average_price"]) + (qty * price)
-            ) / new_qty
-            holdingsdb.update_one(
-                {"_id": holding["_id"]},
-                {"$set": {"quantity": new_qty, "average_price": new_avg}}
-            )
-        else:
-            holdingsdb.insert_one({
-                "portfolio_id": portfolio["_id"],
-                "stock_symbol": symbol,
-                "quantity": qty,
-                "average_price": price
-            })
+@bp.post("/orders")
+def place_order():
+    """Resting order: {symbol, side, type: limit|stop|stop_limit, quantity,
+    limit_price, stop_price, tif: gtc|day}; filled by the order engine."""
+    user = _get_user()
+    if hasattr(user, "status_code"):
+        return user
 
-    # ----- SELL ------------------------------------------------------
-    else:  # SELL
-        holding = holdingsdb.find_one(
-            {"portfolio_id": portfolio["_id"], "stock_symbol": symbol}
+    data = request.get_json(silent=True) or {}
+    symbol = (data.get("symbol") or "").upper()
+    side   = (data.get("side") or data.get("tradeType") or "").upper()
+    if symbol not in market.SUBSCRIBE_SYMBOLS:
+        return err("Resting orders are only supported for streamed symbols", 400)
+    try:
+        qty = int(float(data.get("quantity")))
+        limit_price = _price_arg(data, "limit_price")
+        stop_price = _price_arg(data, "stop_price")
+    except (TypeError, ValueError):
+        return err("quantity and prices must be numbers", 400)
+
+    quote = market.latest_stock_data.get(symbol) or {}
+    try:
+        order = orders.engine.place(
+            user["_id"], symbol, side, (data.get("type") or "").lower(), qty,
+            limit_price, stop_price, (data.get("tif") or "gtc").lower(),
+            last_price=quote.get("price"), last_time=quote.get("timestamp"),
         )
-        if not holding or holding["quantity"] < qty:
-            return err("Insufficient shares", 400)
+    except ValueError as e:
+        return err(str(e), 400)
+    return ok(order), 201
 
-        new_qty = holding["quantity"] - qty
-        if new_qty == 0:
-            holdingsdb.delete_one({"_id": holding["_id"]})
-        else:
-            holdingsdb.update_one(
-                {"_id": holding["_id"]},
-                {"$set": {"quantity": new_qty}}
-            )
 
-        # increment cash
-        portfoliodb.update_one(
-            {"_id": portfolio["_id"]},
-            {"$inc": {"available_balance": total}}
-        )
+@bp.get("/orders")
+def list_orders():
+    user = _get_user()
+    if hasattr(user, "status_code"):
+        return user
+    return ok({"orders": orders.engine.list_orders(user["_id"], request.args.get("status"))})
 
-    # ----- response --------------------------------------------------
-    updated = portfoliodb.find_one({"_id": portfolio["_id"]})
-    shares = {
-        h["stock_symbol"]: h["quantity"]
-        for h in holdingsdb.find({"portfolio_id": portfolio["_id"]})
-    }
-    return ok({
-        "usd": updated["available_balance"],
-        "shares": shares
-    })
+
+@bp.delete("/orders/<order_id>")
+def cancel_order(order_id):
+    user = _get_user()
+    if hasattr(user, "status_code"):
+        return user
+    order = orders.engine.cancel(user["_id"], order_id)
+    if order is None:
+        return err("Open order not found", 404)
+    return ok(order)
 
 def get_stock_name(symbol):
     stock_names = {
@@ -173,12 +165,6 @@ def get_stock_name(symbol):
     }
     return stock_names.get(symbol, symbol)
 
-def _current_price(symbol: str) -> float:
-    try:
-        return float(yf.Ticker(symbol).history(period="1d")["Close"].iloc[-1])
-    except Exception:
-        return 0.0  
-
 @bp.get("/portfolio")
 def get_portfolio():
             try:
@@ -215,58 +201,10 @@ def get_portfolio():
                         'availableBalance': portfolio["available_balance"]
                     })
 
-                # Get all holdings for this portfolio
+                # Get all holdings for this portfolio, valued in one batched lookup
                 holdings = list(holdingsdb.find({"portfolio_id": portfolio["_id"]}))
-                
-                formatted_holdings = []
-                holdings_value = 0
-                total_cost = 0
-                daily_profit = 0
-
-                for holding in holdings:
-                    current_price = _current_price(holding['stock_symbol'])
-                    
-                    # Get previous day's closing price
-                    stock = yf.Ticker(holding['stock_symbol'])
-                    hist = stock.history(period='2d')
-                    previous_close = hist['Close'].iloc[-2] if len(hist) >= 2 else current_price
-                    
-                    holding_value = current_price * holding['quantity']
-                    holding_cost = holding['average_price'] * holding['quantity']
-                    holdings_value += holding_value
-                    total_cost += holding_cost
-
-                    # Calculate daily profit for this holding
-                    daily_holding_profit = (current_price - previous_close) * holding['quantity']
-                    daily_profit += daily_holding_profit
-
-                    formatted_holdings.append({
-                        'stock_symbol': holding['stock_symbol'],
-                        'stock_name': get_stock_name(holding['stock_symbol']),
-                        'quantity': holding['quantity'],
-                        'average_price': holding['average_price'],
-                        'current_price': current_price,
-                        'previous_close': previous_close,
-                        'total_value': holding_value
-                    })
-
                 available_balance = portfolio.get("available_balance", 0)
-                total_value = available_balance + holdings_value
-
-                # Calculate overall return: (total_value - (available_balance + total_cost)) / (available_balance + total_cost) * 100
-                initial_investment = available_balance + total_cost
-                if initial_investment > 0:
-                    overall_return = ((total_value - initial_investment) / initial_investment) * 100
-                else:
-                    overall_return = 0
-
-                return jsonify({
-                    'holdings': formatted_holdings,
-                    'totalValue': total_value,
-                    'dailyProfit': daily_profit,
-                    'overallReturn': overall_return,
-                    'availableBalance': available_balance
-                })
+                return jsonify(valuation.value_portfolio(available_balance, holdings, get_stock_name))
 
             except Exception as e:
                 return jsonify({'error': str(e)}), 500
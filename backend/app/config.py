@@ -1,5 +1,6 @@
 # app/config.py
 import os
+import tempfile
 from pathlib import Path
 from dotenv import load_dotenv
 
@@ -13,6 +14,28 @@ class Config:
     TZ = os.environ.get("TZ", "UTC")
     # Streaming / polling
     STREAM_INTERVAL_SEC = int(os.environ.get("STREAM_INTERVAL_SEC", "2"))
+    # Conflated stock_update fan-out cadence (ticks merged per symbol in between)
+    STREAM_FLUSH_MS = int(os.environ.get("STREAM_FLUSH_MS", "250"))
+    # Full-state keyframe cadence for clients on the delta encoding
+    STREAM_KEYFRAME_SEC = int(os.environ.get("STREAM_KEYFRAME_SEC", "30"))
+    # Upstream socket counts as dead after this long without any message
+    STREAM_HEARTBEAT_SEC = int(os.environ.get("STREAM_HEARTBEAT_SEC", "60"))
+    # Multi-worker deployments: one elected process owns the upstream feed and
+    # publishes quotes to a shared-memory board that every worker reads
+    QUOTE_BOARD = os.environ.get("QUOTE_BOARD", "0") == "1"
+    QUOTE_BOARD_NAME = os.environ.get("QUOTE_BOARD_NAME", "finsight-quotes")
+    FEED_LOCK_PATH = os.environ.get(
+        "FEED_LOCK_PATH", os.path.join(tempfile.gettempdir(), "finsight-feed.lock")
+    )
+    # Socket.IO message queue shared by the workers (e.g. redis://localhost:6379/0,
+    # or another kombu URL). It must be a real broker that all workers can reach:
+    # kombu's memory:// is per process and relays nothing between workers
+    SOCKETIO_MESSAGE_QUEUE = os.environ.get("SOCKETIO_MESSAGE_QUEUE")
+    # Socket.IO server: "threading" (Werkzeug, local dev) or "gevent" / "eventlet"
+    # for production; async modes need run.py so the stdlib is patched first
+    SOCKETIO_ASYNC_MODE = os.environ.get("SOCKETIO_ASYNC_MODE", "threading")
+    # Native threads for blocking calls (yfinance, Gemini) under an async mode
+    OFFLOAD_WORKERS = int(os.environ.get("OFFLOAD_WORKERS", "16"))
     # Gemini (optional)
     GEMINI_API_KEY = os.environ.get("GEMINI_API_KEY")
     # Finnhub (optional; not required because we stream via yfinance)
@@ -0,0 +1,168 @@
+"""Streaming OHLCV bars built from the live trade feed.
+
+Finnhub trades (`p`, `v`, `t` in ms) are folded into one open bar per symbol
+and interval. A bar is cut when a trade lands in a later bucket, or by the
+background loop once its end has passed (quiet symbols still get their bars
+closed on the boundary). Completed bars are queued and written to the bar
+store in one bulk write per interval; until then they are served from
+memory together with the still-open bar.
+"""
+
+import logging
+import threading
+import time
+from typing import Any, Dict, List, Tuple
+
+from . import barstore
+
+INTERVALS: Dict[str, int] = {"1m": 60, "5m": 300}
+# Wait this long past a bar's end for late trades before cutting it
+CUT_GRACE_SEC = 2
+PERSIST_EVERY_SEC = 15
+# Stored intraday history is trimmed to these windows
+RETENTION_SEC: Dict[str, int] = {"1m": 7 * 24 * 3600, "5m": 60 * 24 * 3600}
+TRIM_EVERY_SEC = 3600
+
+Key = Tuple[str, str]
+
+
+class BarBuilder:
+    def __init__(self, intervals: Dict[str, int] = INTERVALS):
+        self._intervals = dict(intervals)
+        self._lock = threading.Lock()
+        self._open: Dict[Key, Dict[str, Any]] = {}
+        # Completed bars not yet persisted, per (symbol, interval), oldest first
+        self._done: Dict[Key, List[Dict[str, Any]]] = {}
+        self._persist_lock = threading.Lock()
+        self._trades = 0
+        self._late = 0
+        self._cut = 0
+        self._persisted = 0
+        self._errors = 0
+        self._started = False
+
+    def add_trade(self, symbol: str, price: float, volume: float, ts_ms: int) -> None:
+        if price <= 0:
+            return
+        ts = int(ts_ms) // 1000
+        with self._lock:
+            self._trades += 1
+            for name, secs in self._intervals.items():
+                start = ts - ts % secs
+                key = (symbol, name)
+                bar = self._open.get(key)
+                if bar is not None and start < bar["time"]:
+                    # Trade for a bar that was already cut
+                    self._late += 1
+                    continue
+                if bar is None or start > bar["time"]:
+                    if bar is not None:
+                        self._done.setdefault(key, []).append(bar)
+                        self._cut += 1
+                    self._open[key] = {
+                        "time": start, "open": price, "high": price,
+                        "low": price, "close": price, "volume": float(volume or 0.0),
+                    }
+                    continue
+                bar["high"] = max(bar["high"], price)
+                bar["low"] = min(bar["low"], price)
+                bar["close"] = price
+                bar["volume"] += float(volume or 0.0)
+
+    def cut(self, now: float | None = None) -> int:
+        """Close open bars whose bucket ended (plus grace) before `now`."""
+        now = time.time() if now is None else now
+        cut = 0
+        with self._lock:
+            for key, bar in list(self._open.items()):
+                if bar["time"] + self._intervals[key[1]] + CUT_GRACE_SEC <= now:
+                    self._done.setdefault(key, []).append(self._open.pop(key))
+                    cut += 1
+            self._cut += cut
+        return cut
+
+    def persist(self) -> int:
+        """Bulk-write completed bars, one `write_many` per interval.
+
+        Bars stay in memory until the write succeeds, so readers always find
+        them in at least one of memory and the store.
+        """
+        with self._persist_lock:
+            with self._lock:
+                pending = {key: list(bars) for key, bars in self._done.items() if bars}
+            if not pending:
+                return 0
+            by_interval: Dict[str, Dict[str, List[Dict[str, Any]]]] = {}
+            for (sym, name), bars in pending.items():
+                by_interval.setdefault(name, {})[sym] = bars
+            try:
+                for name, bars_by_symbol in by_interval.items():
+                    barstore.write_many(bars_by_symbol, name)
+            except Exception:
+                with self._lock:
+                    self._errors += 1
+                raise
+            count = 0
+            with self._lock:
+                for key, bars in pending.items():
+                    # Only this thread removes, so the written bars are still the prefix
+                    del self._done[key][: len(bars)]
+                    if not self._done[key]:
+                        del self._done[key]
+                    count += len(bars)
+                self._persisted += count
+            return count
+
+    @property
+    def generation(self) -> int:
+        """Grows whenever completed bars move from memory to the store."""
+        with self._lock:
+            return self._persisted
+
+    def live_bars(self, symbol: str, interval: str, start: int = 0) -> List[Dict[str, Any]]:
+        """Unpersisted completed bars plus the open bar, at or after `start`."""
+        key = (symbol, interval)
+        with self._lock:
+            bars = list(self._done.get(key, []))
+            if key in self._open:
+                bars.append(self._open[key])
+            return [dict(b) for b in bars if b["time"] >= start]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "trades": self._trades,
+                "late_trades": self._late,
+                "bars_cut": self._cut,
+                "bars_persisted": self._persisted,
+                "bars_pending": sum(len(b) for b in self._done.values()),
+                "open_bars": len(self._open),
+                "persist_errors": self._errors,
+            }
+
+    def _loop(self) -> None:
+        last_trim = 0.0
+        while True:
+            time.sleep(PERSIST_EVERY_SEC)
+            try:
+                self.cut()
+                self.persist()
+                now = time.time()
+                if now - last_trim >= TRIM_EVERY_SEC:
+                    for name, keep in RETENTION_SEC.items():
+                        barstore.trim(name, int(now - keep))
+                    last_trim = now
+            except Exception:
+                logging.exception("Bar builder persist error")
+
+    @property
+    def running(self) -> bool:
+        """Whether this process builds bars (only the feed process does)."""
+        return self._started
+
+    def start(self) -> None:
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        threading.Thread(target=self._loop, daemon=True, name="bar-builder").start()
@@ -0,0 +1,91 @@
+"""Process-local cache of recent bars and per-symbol daily aggregates.
+
+Snapshots need the last/previous close and volume plus a 30-day average
+volume for every symbol. Reading those from MongoDB per request costs several
+round trips per symbol, so this cache keeps the trailing bars per
+`(symbol, interval)` together with precomputed aggregates. It is filled at
+preload, reloaded after every daily refresh (in other worker processes once
+they see the refresh published, see `market.follow_daily_refresh`), and
+lazily loads a symbol the first time it is asked for.
+"""
+
+import logging
+from typing import Any, Dict, Iterable, List
+
+from . import barstore
+from .cache import get_cache
+
+AVG_VOLUME_WINDOW = 30
+
+
+def _aggregates(bars: List[Dict[str, Any]]) -> Dict[str, float]:
+    def _f(bar: Dict[str, Any], field: str) -> float:
+        return float(bar.get(field, 0.0) or 0.0)
+
+    last = bars[-1] if bars else {}
+    prev = bars[-2] if len(bars) >= 2 else {}
+    recent = bars[-AVG_VOLUME_WINDOW:]
+    volumes = [_f(b, "volume") for b in recent]
+    return {
+        "last_time": int(last.get("time", 0) or 0),
+        "last_close": _f(last, "close"),
+        "prev_close": _f(prev, "close"),
+        "last_volume": _f(last, "volume"),
+        "prev_volume": _f(prev, "volume"),
+        "avg_volume_30d": sum(volumes) / len(volumes) if volumes else 0.0,
+    }
+
+
+class BarCache:
+    """`(symbol, interval) -> {bars, aggregates}` map on a named cache."""
+
+    def __init__(self, window: int = AVG_VOLUME_WINDOW):
+        self._window = window
+        # No TTL: entries are replaced by reload() after each bar refresh, here
+        # or, in other workers, when they pick up the published refresh
+        self._entries = get_cache("bars", maxsize=1024, ttl=None)
+
+    def put(self, symbol: str, interval: str, bars: List[Dict[str, Any]]) -> Dict[str, Any]:
+        tail = list(bars[-self._window:])
+        entry = {"bars": tail, "stats": _aggregates(tail)}
+        self._entries.set((symbol, interval), entry)
+        return entry
+
+    def _entry(self, symbol: str, interval: str) -> Dict[str, Any]:
+        entry = self._entries.get((symbol, interval))
+        if entry is not None:
+            return entry
+        try:
+            bars = barstore.read_last(symbol, interval, self._window)
+        except Exception:
+            logging.exception(f"Failed to load {interval} bars for {symbol}")
+            bars = []
+        return self.put(symbol, interval, bars)
+
+    def stats(self, symbol: str, interval: str = "1d") -> Dict[str, float]:
+        return self._entry(symbol, interval)["stats"]
+
+    def bars(self, symbol: str, interval: str = "1d") -> List[Dict[str, Any]]:
+        return list(self._entry(symbol, interval)["bars"])
+
+    def reload(self, symbols: Iterable[str], interval: str = "1d") -> None:
+        """Re-read the trailing window for `symbols` from the bar store."""
+        for sym in symbols:
+            try:
+                self.put(sym, interval, barstore.read_last(sym, interval, self._window))
+            except Exception:
+                logging.exception(f"Failed to reload {interval} bars for {sym}")
+                self.invalidate([sym], interval)
+
+    def invalidate(self, symbols: Iterable[str] | None = None, interval: str | None = None) -> None:
+        if symbols is None and interval is None:
+            self._entries.clear()
+            return
+        wanted = set(symbols) if symbols is not None else None
+        for key in self._entries.keys():
+            sym, ivl = key
+            if (wanted is None or sym in wanted) and (interval is None or ivl == interval):
+                self._entries.delete(key)
+
+
+bar_cache = BarCache()
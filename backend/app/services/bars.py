@@ -0,0 +1,60 @@
+"""OHLCV frame conversion shared by every history path.
+
+yfinance returns bars as a DataFrame indexed by timestamp with Open/High/Low/
+Close/Volume columns. Everything here works on whole NumPy columns instead of
+walking the frame row by row with `iterrows`.
+
+Two output shapes are supported:
+- rows:    [{"time", "open", "high", "low", "close", "volume"}, ...]
+- columns: {"time": [...], "open": [...], ..., "volume": [...]}
+"""
+
+from typing import Any, Dict, List
+
+import numpy as np
+
+BAR_FIELDS = ("time", "open", "high", "low", "close", "volume")
+_PRICE_COLUMNS = (("open", "Open"), ("high", "High"), ("low", "Low"), ("close", "Close"))
+
+
+def frame_to_arrays(df) -> Dict[str, np.ndarray]:
+    """Return parallel NumPy arrays for an OHLCV frame.
+
+    Rows without a close are dropped; a missing or NaN volume becomes 0.
+    """
+    if df is None or df.empty:
+        return {f: np.empty(0, dtype=np.int64 if f == "time" else np.float64) for f in BAR_FIELDS}
+    close = df["Close"].to_numpy(dtype=np.float64, na_value=np.nan)
+    keep = ~np.isnan(close)
+    out: Dict[str, np.ndarray] = {"time": df.index.as_unit("s").asi8[keep]}
+    for key, col in _PRICE_COLUMNS:
+        out[key] = df[col].to_numpy(dtype=np.float64, na_value=np.nan)[keep]
+    if "Volume" in df.columns:
+        vol = df["Volume"].to_numpy(dtype=np.float64, na_value=0.0)[keep]
+        out["volume"] = np.nan_to_num(vol, nan=0.0)
+    else:
+        out["volume"] = np.zeros(int(keep.sum()), dtype=np.float64)
+    return out
+
+
+def frame_to_columns(df) -> Dict[str, List[Any]]:
+    """Columnar bars: one JSON-ready list per field."""
+    arrays = frame_to_arrays(df)
+    return {f: arrays[f].tolist() for f in BAR_FIELDS}
+
+
+def frame_to_bars(df) -> List[Dict[str, Any]]:
+    """Row bars in the shape stored in the bar store and served by `/history`."""
+    return columns_to_bars(frame_to_columns(df))
+
+
+def columns_to_bars(cols: Dict[str, List[Any]]) -> List[Dict[str, Any]]:
+    return [
+        dict(zip(BAR_FIELDS, values))
+        for values in zip(*(cols[f] for f in BAR_FIELDS))
+    ]
+
+
+def bars_to_columns(bars: List[Dict[str, Any]]) -> Dict[str, List[Any]]:
+    """Convert already materialised row bars (e.g. read from Mongo) to columns."""
+    return {f: [b.get(f, 0) for b in bars] for f in BAR_FIELDS}
@@ -0,0 +1,249 @@
+"""Bucketed OHLCV storage in MongoDB.
+
+Bars live in the `price_bars` collection, one document per symbol, interval
+and time bucket (a UTC calendar month for daily bars, a UTC day for intraday
+bars):
+
+    {symbol, interval, time: <bucket start>, end: <newest bar time>, bars: [...]}
+
+The compound index on (symbol, interval, time) lets range reads touch only the
+buckets overlapping the requested window, and `$filter` trims the edge
+buckets server-side so callers never deserialize bars they did not ask for.
+"""
+
+import logging
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List
+
+from pymongo import ASCENDING, DESCENDING, ReturnDocument, UpdateOne
+
+from .. import extensions
+
+COLLECTION = "price_bars"
+LEGACY_COLLECTION = "historical_prices"
+# One document per interval whose version grows with every completed refresh
+REFRESH_COLLECTION = "bar_refresh"
+# `$sortArray` in the bucket merge needs MongoDB 5.2+
+MIN_SERVER_VERSION = (5, 2)
+
+_indexes_ready = False
+_legacy_migrated = False
+
+
+def _col():
+    db = getattr(extensions, "db", None)
+    return db[COLLECTION] if db is not None else None
+
+
+def bucket_start(ts: int, interval: str) -> int:
+    """Start (epoch seconds, UTC) of the bucket holding a bar at `ts`."""
+    dt = datetime.fromtimestamp(int(ts), tz=timezone.utc)
+    if interval == "1d":
+        dt = dt.replace(day=1)
+    dt = dt.replace(hour=0, minute=0, second=0, microsecond=0)
+    return int(dt.timestamp())
+
+
+def ensure_indexes() -> None:
+    global _indexes_ready
+    col = _col()
+    if col is None or _indexes_ready:
+        return
+    version = tuple(col.database.client.server_info()["versionArray"][:2])
+    if version < MIN_SERVER_VERSION:
+        raise RuntimeError(
+            f"The bar store needs MongoDB {'.'.join(map(str, MIN_SERVER_VERSION))}+, "
+            f"the server is {'.'.join(map(str, version))}"
+        )
+    col.create_index(
+        [("symbol", ASCENDING), ("interval", ASCENDING), ("time", ASCENDING)],
+        unique=True,
+        name="symbol_interval_time",
+    )
+    _indexes_ready = True
+
+
+def _bucket_ops(symbol: str, interval: str, bars: List[Dict[str, Any]]) -> List[UpdateOne]:
+    by_bucket: Dict[int, List[Dict[str, Any]]] = {}
+    for bar in bars:
+        by_bucket.setdefault(bucket_start(bar["time"], interval), []).append(bar)
+    ops: List[UpdateOne] = []
+    for start, chunk in sorted(by_bucket.items()):
+        key = {"symbol": symbol, "interval": interval, "time": start}
+        times = [b["time"] for b in chunk]
+        # One pipeline update per bucket: drop stored bars being replaced (e.g. a
+        # partial session), append the new ones and re-sort, atomically
+        kept = {
+            "$filter": {
+                "input": {"$ifNull": ["$bars", []]},
+                "as": "b",
+                "cond": {"$not": {"$in": ["$$b.time", times]}},
+            }
+        }
+        merged = {"$concatArrays": [kept, {"$literal": chunk}]}
+        ops.append(
+            UpdateOne(
+                key,
+                [
+                    {
+                        "$set": {
+                            "bars": {"$sortArray": {"input": merged, "sortBy": {"time": 1}}},
+                            "end": {"$max": ["$end", max(times)]},
+                            "updated_at": datetime.utcnow(),
+                        }
+                    }
+                ],
+                upsert=True,
+            )
+        )
+    return ops
+
+
+def _dedupe(bars: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Bars with one entry per time (the last one stored wins), oldest first."""
+    by_time = {b["time"]: b for b in bars}
+    if len(by_time) == len(bars):
+        return bars
+    return [by_time[t] for t in sorted(by_time)]
+
+
+def write_many(bars_by_symbol: Dict[str, List[Dict[str, Any]]], interval: str) -> None:
+    """Merge bars for many symbols with a single `bulk_write`.
+
+    Bars whose timestamp is already stored replace the stored bar. Each bucket
+    is one pipeline update (MongoDB 5.2+ for `$sortArray`), so concurrent
+    writers to the same bucket cannot interleave and duplicate times.
+    """
+    col = _col()
+    if col is None:
+        return
+    ops: List[UpdateOne] = []
+    for sym, bars in bars_by_symbol.items():
+        if bars:
+            ops.extend(_bucket_ops(sym, interval, bars))
+    if ops:
+        col.bulk_write(ops, ordered=False)
+
+
+def write_bars(symbol: str, interval: str, bars: List[Dict[str, Any]]) -> None:
+    write_many({symbol: bars}, interval)
+
+
+def read_range(
+    symbol: str, interval: str, start: int | None = None, end: int | None = None
+) -> List[Dict[str, Any]]:
+    """Bars with `start <= time <= end`, oldest first, one per time."""
+    col = _col()
+    if col is None:
+        return []
+    match: Dict[str, Any] = {"symbol": symbol, "interval": interval}
+    conds = []
+    time_q: Dict[str, int] = {}
+    if start is not None:
+        time_q["$gte"] = bucket_start(start, interval)
+        conds.append({"$gte": ["$$b.time", int(start)]})
+    if end is not None:
+        time_q["$lte"] = int(end)
+        conds.append({"$lte": ["$$b.time", int(end)]})
+    if time_q:
+        match["time"] = time_q
+    bars_expr: Any = "$bars"
+    if conds:
+        bars_expr = {"$filter": {"input": "$bars", "as": "b", "cond": {"$and": conds}}}
+    pipeline = [
+        {"$match": match},
+        {"$sort": {"time": 1}},
+        {"$project": {"_id": 0, "bars": bars_expr}},
+    ]
+    out: List[Dict[str, Any]] = []
+    for doc in col.aggregate(pipeline):
+        out.extend(doc.get("bars") or [])
+    # Buckets written before the writes were atomic may still hold duplicates
+    return _dedupe(out)
+
+
+def read_last(symbol: str, interval: str, n: int = 1) -> List[Dict[str, Any]]:
+    """The newest `n` bars, oldest first, walking buckets newest-first."""
+    col = _col()
+    if col is None or n <= 0:
+        return []
+    cursor = (
+        col.find({"symbol": symbol, "interval": interval}, {"_id": 0, "bars": 1})
+        .sort("time", DESCENDING)
+        .batch_size(4)
+    )
+    chunks: List[List[Dict[str, Any]]] = []
+    count = 0
+    for doc in cursor:
+        bars = doc.get("bars") or []
+        chunks.append(bars)
+        count += len(bars)
+        if count >= n:
+            break
+    out = _dedupe([b for chunk in reversed(chunks) for b in chunk])
+    return out[-n:]
+
+
+def last_times(symbols: Iterable[str], interval: str) -> Dict[str, int]:
+    """Newest stored bar time per symbol, in one aggregation."""
+    col = _col()
+    if col is None:
+        return {}
+    pipeline = [
+        {"$match": {"symbol": {"$in": list(symbols)}, "interval": interval}},
+        {"$group": {"_id": "$symbol", "end": {"$max": "$end"}}},
+    ]
+    return {doc["_id"]: int(doc["end"]) for doc in col.aggregate(pipeline) if doc.get("end") is not None}
+
+
+def trim(interval: str, before: int) -> int:
+    """Drop buckets that end before `before`; returns the number removed."""
+    col = _col()
+    if col is None:
+        return 0
+    return col.delete_many({"interval": interval, "end": {"$lt": int(before)}}).deleted_count
+
+
+def migrate_legacy() -> None:
+    """Copy single-document `historical_prices` arrays into buckets once.
+
+    Only the legacy symbol names are read up front; bars are fetched just for
+    symbols that have no bucketed daily bars yet. After one complete pass the
+    process skips the check entirely.
+    """
+    global _legacy_migrated
+    db = getattr(extensions, "db", None)
+    if db is None or _legacy_migrated:
+        return
+    legacy = db[LEGACY_COLLECTION]
+    symbols = legacy.distinct("symbol", {"interval": "1d"})
+    have = last_times(symbols, "1d") if symbols else {}
+    pending = [sym for sym in symbols if sym not in have]
+    if pending:
+        logging.info(f"Migrating legacy daily bars for {len(pending)} symbols into {COLLECTION}")
+        docs = legacy.find({"interval": "1d", "symbol": {"$in": pending}}, {"_id": 0, "symbol": 1, "bars": 1})
+        write_many({d["symbol"]: d.get("bars") or [] for d in docs}, "1d")
+    _legacy_migrated = True
+
+
+def publish_refresh(interval: str) -> int:
+    """Announce that `interval` bars were refreshed; returns the new version."""
+    db = getattr(extensions, "db", None)
+    if db is None:
+        return 0
+    doc = db[REFRESH_COLLECTION].find_one_and_update(
+        {"_id": interval},
+        {"$inc": {"version": 1}, "$set": {"updated_at": datetime.utcnow()}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    return int(doc["version"])
+
+
+def refresh_version(interval: str) -> int:
+    """Version last published for `interval` (0 if never)."""
+    db = getattr(extensions, "db", None)
+    if db is None:
+        return 0
+    doc = db[REFRESH_COLLECTION].find_one({"_id": interval}, {"version": 1})
+    return int(doc["version"]) if doc else 0
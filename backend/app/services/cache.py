@@ -0,0 +1,240 @@
+"""Named, thread-safe in-process caches with stats.
+
+Every cache gets a per-cache lock, LRU eviction bounded by entry count and
+(optionally) approximate byte size, a TTL, and an optional
+stale-while-revalidate window: once an entry's TTL has passed it may still be
+served for `stale_ttl` more seconds while a background reload replaces it.
+Hit/miss/eviction counts and loader timings are kept per cache and exposed
+through `all_stats()` (served at `/api/stats/cache`).
+
+Caches are created once by name through `get_cache()` so any module can
+share one and the stats endpoint sees all of them.
+"""
+
+import logging
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Hashable, Iterator, List, Tuple
+
+from ..utils.singleflight import SingleFlight
+
+_MISSING = object()
+
+# Shared pool for stale-while-revalidate background reloads
+_reload_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="cache-reload")
+
+
+def approx_size(obj: Any, _depth: int = 0) -> int:
+    """Rough deep size in bytes of JSON-like values (dicts, lists, scalars)."""
+    size = sys.getsizeof(obj)
+    if _depth > 6:
+        return size
+    if isinstance(obj, dict):
+        size += sum(approx_size(k, _depth + 1) + approx_size(v, _depth + 1) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set)):
+        size += sum(approx_size(v, _depth + 1) for v in obj)
+    return size
+
+
+class _Entry:
+    __slots__ = ("value", "expires", "stale_until", "size")
+
+    def __init__(self, value: Any, expires: float, stale_until: float, size: int):
+        self.value = value
+        self.expires = expires
+        self.stale_until = stale_until
+        self.size = size
+
+
+class NamedCache:
+    def __init__(
+        self,
+        name: str,
+        maxsize: int = 256,
+        ttl: float | None = 600,
+        stale_ttl: float = 0,
+        max_bytes: int | None = None,
+        sizeof: Callable[[Any], int] | None = None,
+    ):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_bytes = max_bytes
+        self._sizeof = sizeof or (approx_size if max_bytes else (lambda _v: 0))
+        self._lock = threading.Lock()
+        self._data: "OrderedDict[Hashable, _Entry]" = OrderedDict()
+        self._bytes = 0
+        self._flight = SingleFlight(f"cache.{name}")
+        self._stats = {
+            "hits": 0,
+            "stale_hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "expirations": 0,
+            "loads": 0,
+            "load_errors": 0,
+            "load_time_sec": 0.0,
+        }
+
+    # ---------- internals ----------------------------------------------
+    def _drop(self, key: Hashable) -> None:
+        entry = self._data.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry.size
+
+    def _lookup(self, key: Hashable, now: float) -> Tuple[Any, bool]:
+        """(value, is_fresh) or (_MISSING, False); caller holds the lock."""
+        entry = self._data.get(key)
+        if entry is None:
+            return _MISSING, False
+        if now < entry.expires:
+            self._data.move_to_end(key)
+            return entry.value, True
+        if now < entry.stale_until:
+            self._data.move_to_end(key)
+            return entry.value, False
+        self._drop(key)
+        self._stats["expirations"] += 1
+        return _MISSING, False
+
+    # ---------- public -------------------------------------------------
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Fresh value for `key` or `default` (stale entries count as misses)."""
+        with self._lock:
+            value, fresh = self._lookup(key, time.monotonic())
+            if value is not _MISSING and fresh:
+                self._stats["hits"] += 1
+                return value
+            self._stats["misses"] += 1
+            return default
+
+    def get_stale(self, key: Hashable, default: Any = None) -> Tuple[Any, bool]:
+        """`(value, is_fresh)`; serves entries inside the stale window."""
+        with self._lock:
+            value, fresh = self._lookup(key, time.monotonic())
+            if value is _MISSING:
+                self._stats["misses"] += 1
+                return default, False
+            self._stats["hits" if fresh else "stale_hits"] += 1
+            return value, fresh
+
+    def set(self, key: Hashable, value: Any, ttl: float | None = _MISSING) -> None:  # type: ignore[assignment]
+        """Store `value`; `ttl` overrides the cache default (None = no expiry)."""
+        ttl = self.ttl if ttl is _MISSING else ttl
+        now = time.monotonic()
+        expires = float("inf") if ttl is None else now + ttl
+        size = self._sizeof(value)
+        with self._lock:
+            self._drop(key)
+            self._data[key] = _Entry(value, expires, expires + self.stale_ttl, size)
+            self._bytes += size
+            while self._data and (
+                len(self._data) > self.maxsize
+                or (self.max_bytes is not None and self._bytes > self.max_bytes and len(self._data) > 1)
+            ):
+                oldest = next(iter(self._data))
+                self._drop(oldest)
+                self._stats["evictions"] += 1
+
+    def delete(self, key: Hashable) -> None:
+        with self._lock:
+            self._drop(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def keys(self) -> List[Hashable]:
+        with self._lock:
+            return list(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            value, fresh = self._lookup(key, time.monotonic())
+            return value is not _MISSING and fresh
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __iter__(self) -> Iterator[Hashable]:
+        return iter(self.keys())
+
+    def _load(self, key: Hashable, loader: Callable[..., Any], ttl, args, kwargs) -> Any:
+        started = time.perf_counter()
+        try:
+            value = loader(*args, **kwargs)
+        except Exception:
+            with self._lock:
+                self._stats["load_errors"] += 1
+            raise
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self._stats["loads"] += 1
+            self._stats["load_time_sec"] += elapsed
+        self.set(key, value, ttl)
+        return value
+
+    def get_or_load(
+        self,
+        key: Hashable,
+        loader: Callable[..., Any],
+        *args,
+        ttl: float | None = _MISSING,  # type: ignore[assignment]
+        flight: SingleFlight | None = None,
+        **kwargs,
+    ) -> Any:
+        """Return the cached value, loading it (once per key across threads) on miss.
+
+        Stale entries are returned immediately and reloaded in background.
+        """
+        flight = flight or self._flight
+        value, fresh = self.get_stale(key, _MISSING)
+        if value is not _MISSING:
+            if not fresh:
+                def _revalidate():
+                    try:
+                        flight.do(key, self._load, key, loader, ttl, args, kwargs)
+                    except Exception:
+                        logging.exception(f"Background reload failed for cache {self.name} key {key!r}")
+                try:
+                    _reload_pool.submit(_revalidate)
+                except RuntimeError:
+                    pass
+            return value
+        return flight.do(key, self._load, key, loader, ttl, args, kwargs)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["size"] = len(self._data)
+            stats["bytes"] = self._bytes
+        lookups = stats["hits"] + stats["stale_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["hits"] + stats["stale_hits"]) / lookups if lookups else 0.0
+        stats["avg_load_ms"] = (stats["load_time_sec"] / stats["loads"] * 1000.0) if stats["loads"] else 0.0
+        stats.update(
+            maxsize=self.maxsize, max_bytes=self.max_bytes, ttl=self.ttl, stale_ttl=self.stale_ttl
+        )
+        return stats
+
+
+_caches: Dict[str, NamedCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_cache(name: str, **kwargs) -> NamedCache:
+    """Return the cache called `name`, creating it with `kwargs` the first time."""
+    with _caches_lock:
+        if name not in _caches:
+            _caches[name] = NamedCache(name, **kwargs)
+        return _caches[name]
+
+
+def all_stats() -> Dict[str, Dict[str, Any]]:
+    with _caches_lock:
+        caches = list(_caches.values())
+    return {c.name: c.stats() for c in caches}
@@ -0,0 +1,87 @@
+"""Shrink a bar series to at most `max_points` for charting.
+
+Two shapes, both working on whole NumPy columns (see `bars.py`):
+- "line":  Largest-Triangle-Three-Buckets on the close. Keeps the first and
+           last bar and, from each bucket in between, the bar forming the
+           largest triangle with the previously kept bar and the next
+           bucket's average, so peaks and troughs survive. Kept bars are
+           returned whole and unchanged.
+- "ohlc":  Merges runs of consecutive bars into candles: first open, max
+           high, min low, last close, summed volume, stamped with the first
+           bar's time.
+
+Series already at or under `max_points` come back as they are.
+"""
+
+from typing import Any, Dict, List
+
+import numpy as np
+
+from .bars import BAR_FIELDS
+
+SHAPES = ("ohlc", "line")
+MIN_POINTS = 3
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """Indices of the points LTTB keeps from `(x, y)`, in order."""
+    n = len(x)
+    if n_out >= n or n_out < MIN_POINTS:
+        return np.arange(n)
+    # Interior points 1..n-2 split into n_out-2 buckets; edges[i]:edges[i+1] is bucket i
+    every = (n - 2) / (n_out - 2)
+    edges = (np.floor(np.arange(n_out - 1) * every) + 1).astype(np.int64)
+    edges[-1] = n - 1
+    # Third vertex for bucket i: the average of bucket i+1 (the last point for the last bucket)
+    counts = np.diff(edges)
+    avg_x = np.append((np.add.reduceat(x[1:n - 1], edges[:-1] - 1) / counts)[1:], x[-1])
+    avg_y = np.append((np.add.reduceat(y[1:n - 1], edges[:-1] - 1) / counts)[1:], y[-1])
+    keep = [0]
+    a = 0
+    # Plain-float scalars in the loop: indexing NumPy scalars costs more than the math
+    bounds, ax_list, ay_list = edges.tolist(), avg_x.tolist(), avg_y.tolist()
+    for i in range(n_out - 2):
+        lo, hi = bounds[i], bounds[i + 1]
+        xa, ya = float(x[a]), float(y[a])
+        # Twice the triangle area; the factor does not change the argmax
+        area = np.abs((xa - ax_list[i]) * (y[lo:hi] - ya) - (xa - x[lo:hi]) * (ay_list[i] - ya))
+        a = lo + int(area.argmax())
+        keep.append(a)
+    keep.append(n - 1)
+    return np.asarray(keep, dtype=np.int64)
+
+
+def ohlc_buckets(arrays: Dict[str, np.ndarray], n_out: int) -> Dict[str, np.ndarray]:
+    """Merge consecutive bars into `n_out` candles of (nearly) equal bar count."""
+    n = len(arrays["time"])
+    if n_out >= n:
+        return arrays
+    starts = (np.arange(n_out) * n) // n_out
+    ends = np.append(starts[1:], n)
+    return {
+        "time": arrays["time"][starts],
+        "open": arrays["open"][starts],
+        "high": np.maximum.reduceat(arrays["high"], starts),
+        "low": np.minimum.reduceat(arrays["low"], starts),
+        "close": arrays["close"][ends - 1],
+        "volume": np.add.reduceat(arrays["volume"], starts),
+    }
+
+
+def downsample_columns(columns: Dict[str, List[Any]], max_points: int, shape: str = "ohlc") -> Dict[str, List[Any]]:
+    """Columnar bars (`bars.bars_to_columns` layout) reduced to at most `max_points`."""
+    if shape not in SHAPES:
+        raise ValueError(f"Unknown shape {shape!r}; expected one of {SHAPES}")
+    n = len(columns["time"])
+    if n <= max_points:
+        return columns
+    arrays = {
+        f: np.asarray(columns[f], dtype=np.int64 if f == "time" else np.float64)
+        for f in BAR_FIELDS
+    }
+    if shape == "line":
+        keep = lttb_indices(arrays["time"].astype(np.float64), arrays["close"], max_points)
+        arrays = {f: a[keep] for f, a in arrays.items()}
+    else:
+        arrays = ohlc_buckets(arrays, max_points)
+    return {f: arrays[f].tolist() for f in BAR_FIELDS}
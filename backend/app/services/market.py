@@ -1,9 +1,9 @@
 """Market data services: historical caching, market-hours logic, and snapshots.
 
 Implements:
-- Historical daily caching for 6 months in MongoDB (serves 1Mo/3Mo/6Mo, etc.)
+- Historical daily bars in a bucketed MongoDB store (serves 1Mo/3Mo/6Mo, etc.)
 - Intraday (5m) for 1D/5D via yfinance with short TTL cache
-- Market hours detection (US/Eastern 09:30–16:00, Mon–Fri)
+- Market hours detection (US/Eastern 09:30–16:00 on NYSE trading days, early closes)
 - Snapshot structure populated either from live stream (when open) or last close
 """
 
@@ -11,14 +11,25 @@ import json
 import time
 import threading
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+from collections.abc import MutableMapping
 from typing import Any, Dict, List, Tuple
 
 import yfinance as yf
-from cachetools import TTLCache
 import pytz
 
-from .. import extensions
+from ..utils import offload, singleflight
+from . import barstore, market_calendar
+from .cache import get_cache
+from .barcache import bar_cache
+from .barbuilder import CUT_GRACE_SEC as LIVE_CUT_GRACE_SEC, INTERVALS as LIVE_BAR_INTERVALS, PERSIST_EVERY_SEC as LIVE_PERSIST_SEC, BarBuilder
+from .meta import MetaRefresher
+from .quoteboard import BoardQuotes, QuoteBoard
+from .quotes import QuotePoller
+from .snapshots import SnapshotMaterializer
+from .bars import bars_to_columns, columns_to_bars, frame_to_bars
+from .downsample import downsample_columns
 
 # Symbols to support (trim or expand as needed)
 SUBSCRIBE_SYMBOLS: List[str] = [
@@ -31,13 +42,33 @@ SUBSCRIBE_SYMBOLS: List[str] = [
 # Optional basic metadata
 STOCK_METADATA: Dict[str, Dict[str, Any]] = {s: {"name": s} for s in SUBSCRIBE_SYMBOLS}
 
-# In-memory latest snapshot updated by live streamer
-latest_stock_data: Dict[str, Dict[str, Any]] = {}
-
-# Intraday cache to avoid hammering yfinance for 1d/5d
-_intraday_cache: TTLCache = TTLCache(maxsize=256, ttl=10 * 60)  # 10 minutes
-# Cache for metadata like market cap, 52W range, avg volume
-_meta_cache: TTLCache = TTLCache(maxsize=512, ttl=30 * 60)  # 30 minutes
+# In-memory latest snapshot updated by live streamer; a view over the shared
+# quote board instead when worker processes share one feed (`use_quote_board`)
+latest_stock_data: MutableMapping[str, Dict[str, Any]] = {}
+quote_board: QuoteBoard | None = None
+
+
+def use_quote_board(name: str) -> QuoteBoard:
+    """Back `latest_stock_data` with the shared-memory board `name`."""
+    global latest_stock_data, quote_board
+    quote_board = QuoteBoard(SUBSCRIBE_SYMBOLS, name)
+    latest_stock_data = BoardQuotes(quote_board, STOCK_METADATA)
+    return quote_board
+
+# Intraday cache to avoid hammering yfinance for 1d/5d; entries carry a
+# market-hours-aware TTL (next 5m bar in session, next open otherwise)
+_intraday_cache = get_cache("intraday", maxsize=256, ttl=10 * 60, max_bytes=64 * 1024 * 1024)
+# Stored trade-built bars of the current session, keyed by the bar builder's
+# persist generation so bars leaving memory are never missing from both
+_stored_intraday_cache = get_cache("intraday.stored", maxsize=256, ttl=LIVE_PERSIST_SEC)
+# Charts reduced to `max_points`, keyed by request and source fingerprint
+_downsampled_cache = get_cache("history.downsampled", maxsize=1024, ttl=10 * 60, max_bytes=32 * 1024 * 1024)
+
+# Coalesce concurrent identical upstream (yfinance) calls
+_intraday_flights = singleflight.group("yf.intraday")
+_daily_flights = singleflight.group("yf.daily")
+_quote_flights = singleflight.group("yf.quote")
+_meta_flights = singleflight.group("yf.meta")
 
 # Supported periods/timeframes and mapping to lookback days
 PERIODS = {"1d", "5d", "1mo", "3mo", "6mo"}
@@ -51,91 +82,73 @@ PERIOD_TO_DAYS: Dict[str, int] = {
 
 US_EASTERN = pytz.timezone("US/Eastern")
 
+# Bulk daily ingestion: symbols per multi-ticker download, and the bounded
+# per-symbol parallelism used when a batch (or a symbol within it) fails.
+HISTORY_BATCH_SIZE = 20
+HISTORY_FETCH_WORKERS = 8
+# Daily history retained in the bar store; incremental refreshes grow history
+# up to this bound without re-downloading what is already stored.
+DAILY_RETENTION_DAYS = 5 * 365
+# Daily refresh version this process has loaded (None: not checked yet)
+_daily_refresh_seen: List[int | None] = [None]
+# 1D charts are served from bars built off the trade stream at this interval;
+# up to LIVE_GAP_BARS missing bars in a row are tolerated before backfilling
+LIVE_INTERVAL = "5m"
+LIVE_GAP_BARS = 1
 
-def is_market_open_now(now_utc: datetime | None = None) -> bool:
-    now_utc = now_utc or datetime.utcnow().replace(tzinfo=pytz.utc)
-    now_et = now_utc.astimezone(US_EASTERN)
-    # Weekday 0=Mon .. 6=Sun
-    if now_et.weekday() > 4:
-        return False
-    open_time = now_et.replace(hour=9, minute=30, second=0, microsecond=0)
-    close_time = now_et.replace(hour=16, minute=0, second=0, microsecond=0)
-    return open_time <= now_et <= close_time
+# Builds 1m/5m bars from streamed trades and persists them to the bar store
+bar_builder = BarBuilder()
 
 
-def _mongo():
-    return getattr(extensions, "db", None)
+def is_market_open_now(now_utc: datetime | None = None) -> bool:
+    # Regular session on NYSE trading days, honouring holidays and early closes
+    return market_calendar.is_open(now_utc)
 
 
-def _historical_col():
-    db = _mongo()
-    return db["historical_prices"] if db is not None else None
+def _upsert_daily_bars(symbol: str, bars: List[Dict[str, Any]]) -> None:
+    barstore.write_bars(symbol, "1d", bars)
+    bar_cache.invalidate([symbol], "1d")
+    touch_symbols([symbol])
 
 
-def _upsert_daily_bars(symbol: str, bars: List[Dict[str, Any]]) -> None:
-    col = _historical_col()
-    if col is None:
-        return
-    col.update_one(
-        {"symbol": symbol, "interval": "1d"},
-        {
-            "$set": {
-                "symbol": symbol,
-                "interval": "1d",
-                "updated_at": datetime.utcnow(),
-                "bars": bars,
-            }
-        },
-        upsert=True,
-    )
+def _read_daily_bars(symbol: str, start: int | None = None) -> List[Dict[str, Any]]:
+    """Stored daily bars for `symbol`, optionally only those at or after `start`."""
+    return barstore.read_range(symbol, "1d", start=start)
 
 
-def _read_daily_bars(symbol: str) -> List[Dict[str, Any]] | None:
-    col = _historical_col()
-    if col is None:
-        return None
-    doc = col.find_one({"symbol": symbol, "interval": "1d"}, {"_id": 0, "bars": 1})
-    if not doc:
-        return None
-    return doc.get("bars")
+@offload.blocking
+def _fetch_symbol_meta(symbol: str) -> Dict[str, Any]:
+    meta: Dict[str, Any] = {}
+    tkr = yf.Ticker(symbol)
+    fi = getattr(tkr, "fast_info", None)
+    if fi is not None:
+        # These attributes may not always be present
+        meta["market_cap"] = float(getattr(fi, "market_cap", 0.0) or 0.0)
+        meta["year_high"] = float(getattr(fi, "year_high", 0.0) or 0.0)
+        meta["year_low"] = float(getattr(fi, "year_low", 0.0) or 0.0)
+    return meta
 
 
-def _compute_avg_volume_30d(bars: List[Dict[str, Any]]) -> float:
-    if not bars:
-        return 0.0
-    # Take up to last 30 bars
-    recent = bars[-30:]
-    volumes = [float(b.get("volume", 0.0) or 0.0) for b in recent]
-    return sum(volumes) / len(volumes) if volumes else 0.0
+def _fetch_symbol_meta_once(symbol: str) -> Dict[str, Any]:
+    return _meta_flights.do(symbol, _fetch_symbol_meta, symbol)
 
 
 def _get_symbol_meta(symbol: str) -> Dict[str, Any]:
-    key = (symbol, "meta")
-    if key in _meta_cache:
-        return _meta_cache[key]
-    meta: Dict[str, Any] = {}
-    try:
-        tkr = yf.Ticker(symbol)
-        fi = getattr(tkr, "fast_info", None)
-        if fi is not None:
-            # These attributes may not always be present
-            meta["market_cap"] = float(getattr(fi, "market_cap", 0.0) or 0.0)
-            meta["year_high"] = float(getattr(fi, "year_high", 0.0) or 0.0)
-            meta["year_low"] = float(getattr(fi, "year_low", 0.0) or 0.0)
-        # Compute 30d average volume from cached daily bars if available
-        bars = _read_daily_bars(symbol) or []
-        meta["avg_volume_30d"] = _compute_avg_volume_30d(bars)
-    except Exception:
-        logging.exception(f"Failed to load metadata for {symbol}")
-    _meta_cache[key] = meta
-    return meta
+    """Cached metadata; refreshed in background, never fetched on the caller's thread."""
+    return meta_refresher.get(symbol)
 
 
 def fetch_quote(symbol: str) -> Dict[str, Any]:
     """Fetch a lightweight quote via yfinance fast_info.
 
     Used as a fallback or periodic polling when Finnhub is unavailable.
+    Concurrent requests for the same symbol share one upstream call.
     """
+    return dict(_quote_flights.do(symbol, _fetch_quote_upstream, symbol))
+
+
+@offload.blocking
+def _fetch_quote_upstream(symbol: str) -> Dict[str, Any]:
     tkr = yf.Ticker(symbol)
     info = getattr(tkr, "fast_info", None)
     last_price = 0.0
@@ -152,173 +165,439 @@ def fetch_quote(symbol: str) -> Dict[str, Any]:
     return {"symbol": symbol, "price": last_price, "currency": currency}
 
 
-def fetch_many(symbols: List[str]) -> List[Dict[str, Any]]:
-    return [fetch_quote(s) for s in symbols]
+# Bounded fan-out for the yfinance polling fallback (yfinance shares one
+# pooled HTTP session across Ticker objects, so workers reuse connections)
+quote_poller = QuotePoller(fetch_quote)
 
 
-def preload_historical_cache(symbols: List[str] | None = None) -> None:
-    symbols = symbols or SUBSCRIBE_SYMBOLS
+def fetch_many(symbols: List[str], deadline: float | None = None) -> List[Dict[str, Any]]:
+    """Quotes for `symbols`, fetched concurrently.
+
+    With a `deadline` (seconds), symbols that have not answered in time keep
+    their last polled quote instead of holding up the rest.
+    """
+    return quote_poller.poll(symbols, deadline)
+
+
+@offload.blocking
+def _download_daily_batch(
+    symbols: List[str], period: str = "6mo", start: str | None = None
+) -> Dict[str, List[Dict[str, Any]]]:
+    """Fetch daily bars for several symbols in one `yf.download` call.
+
+    The wide (ticker, field) frame is split per symbol; symbols that come back
+    empty are left out so the caller can retry them individually. `start`
+    (YYYY-MM-DD) takes precedence over `period`.
+    """
+    df = yf.download(
+        symbols,
+        period=None if start else period,
+        start=start,
+        interval="1d",
+        group_by="ticker",
+        auto_adjust=True,
+        threads=min(HISTORY_FETCH_WORKERS, len(symbols)),
+        progress=False,
+    )
+    out: Dict[str, List[Dict[str, Any]]] = {}
+    if df is None or df.empty:
+        return out
+    tickers = set(df.columns.get_level_values(0))
     for sym in symbols:
+        if sym not in tickers:
+            continue
+        bars = frame_to_bars(df[sym])
+        if bars:
+            out[sym] = bars
+    return out
+
+
+@offload.blocking
+def _fetch_daily_single(symbol: str, period: str = "6mo", start: str | None = None) -> List[Dict[str, Any]]:
+    tkr = yf.Ticker(symbol)
+    if start:
+        df = tkr.history(start=start, interval="1d")
+    else:
+        df = tkr.history(period=period, interval="1d")
+    return frame_to_bars(df)
+
+
+def fetch_daily_bars_bulk(
+    symbols: List[str], period: str = "6mo", start: str | None = None
+) -> Dict[str, List[Dict[str, Any]]]:
+    """Fetch daily bars for many symbols with as few upstream calls as possible.
+
+    Symbols are downloaded in batches of `HISTORY_BATCH_SIZE`; anything a batch
+    could not deliver is retried per symbol on a bounded thread pool.
+    """
+    result: Dict[str, List[Dict[str, Any]]] = {}
+    missing: List[str] = []
+    for i in range(0, len(symbols), HISTORY_BATCH_SIZE):
+        batch = symbols[i:i + HISTORY_BATCH_SIZE]
         try:
-            # Fetch 6 months of daily bars
-            tkr = yf.Ticker(sym)
-            df = tkr.history(period="6mo", interval="1d")
-            bars = [
-                {
-                    "time": int(idx.timestamp()),
-                    "open": float(row["Open"]),
-                    "high": float(row["High"]),
-                    "low": float(row["Low"]),
-                    "close": float(row["Close"]),
-                    "volume": float(row.get("Volume", 0.0) or 0.0),
-                }
-                for idx, row in df.iterrows()
-            ]
-            _upsert_daily_bars(sym, bars)
+            got = _download_daily_batch(batch, period, start)
         except Exception:
-            logging.exception(f"Failed to preload daily bars for {sym}")
-            continue
+            logging.exception(f"Batch daily download failed for {len(batch)} symbols")
+            got = {}
+        result.update(got)
+        missing.extend(s for s in batch if s not in got)
+
+    if missing:
+        logging.warning(f"Retrying daily bars individually for: {', '.join(missing)}")
+
+        def _one(sym: str) -> Tuple[str, List[Dict[str, Any]]]:
+            try:
+                return sym, _fetch_daily_single(sym, period, start)
+            except Exception:
+                logging.exception(f"Failed to fetch daily bars for {sym}")
+                return sym, []
+
+        with ThreadPoolExecutor(max_workers=min(HISTORY_FETCH_WORKERS, len(missing))) as pool:
+            for sym, bars in pool.map(_one, missing):
+                if bars:
+                    result[sym] = bars
+    return result
+
+
+def refresh_daily_bars(symbols: List[str] | None = None) -> None:
+    """Bring stored daily bars up to date with minimal download and write volume.
+
+    Symbols with stored history only fetch the days since their last bar
+    (which is re-fetched to fix a partial session); symbols without any
+    history get a full 6-month load.
+    """
+    symbols = list(symbols or SUBSCRIBE_SYMBOLS)
+    started = time.monotonic()
+    barstore.ensure_indexes()
+    barstore.migrate_legacy()
+    last_times = barstore.last_times(symbols, "1d")
+    fresh = [s for s in symbols if s not in last_times]
+    stored = [s for s in symbols if s in last_times]
+
+    fetched: Dict[str, List[Dict[str, Any]]] = {}
+    if fresh:
+        full = fetch_daily_bars_bulk(fresh, period="6mo")
+        try:
+            barstore.write_many(full, "1d")
+        except Exception:
+            logging.exception("Failed to write full daily bar loads")
+        fetched.update(full)
+
+    if stored:
+        oldest = min(last_times[s] for s in stored)
+        start = datetime.fromtimestamp(oldest, US_EASTERN).strftime("%Y-%m-%d")
+        recent = fetch_daily_bars_bulk(stored, start=start)
+        appends: Dict[str, List[Dict[str, Any]]] = {}
+        for sym, bars in recent.items():
+            tail = [b for b in bars if b["time"] >= last_times[sym]]
+            if tail:
+                appends[sym] = tail
+        try:
+            barstore.write_many(appends, "1d")
+        except Exception:
+            logging.exception("Failed to append incremental daily bars")
+        fetched.update(appends)
+
+    try:
+        retention_cutoff = int(time.time()) - DAILY_RETENTION_DAYS * 86400
+        barstore.trim("1d", retention_cutoff)
+    except Exception:
+        logging.exception("Failed to trim expired daily bars")
+
+    bar_cache.reload(symbols, "1d")
+    touch_symbols(symbols)
+    try:
+        _daily_refresh_seen[0] = barstore.publish_refresh("1d")
+    except Exception:
+        logging.exception("Failed to publish the daily bar refresh")
+
+    failed = [s for s in symbols if s not in fetched]
+    if failed:
+        logging.warning(f"No daily bars refreshed for: {', '.join(failed)}")
+    logging.info(
+        f"Refreshed daily bars for {len(fetched)}/{len(symbols)} symbols "
+        f"({len(fresh)} full, {len(stored)} incremental) in {time.monotonic() - started:.1f}s"
+    )
+
+
+def follow_daily_refresh() -> bool:
+    """Reload cached daily bars if another process published a newer refresh.
+
+    Only the feed process refreshes daily bars; the other workers call this
+    periodically so their snapshot and portfolio closes follow. Returns
+    whether anything was reloaded.
+    """
+    version = barstore.refresh_version("1d")
+    if version == _daily_refresh_seen[0]:
+        return False
+    _daily_refresh_seen[0] = version
+    bar_cache.invalidate(interval="1d")
+    bar_cache.reload(SUBSCRIBE_SYMBOLS, "1d")
+    touch_symbols(SUBSCRIBE_SYMBOLS)
+    return True
+
+
+def preload_historical_cache(symbols: List[str] | None = None) -> None:
+    refresh_daily_bars(symbols or SUBSCRIBE_SYMBOLS)
 
 
 def refresh_historical_daily_all() -> None:
     logging.info("Refreshing historical daily bars for all symbols...")
-    preload_historical_cache(SUBSCRIBE_SYMBOLS)
+    refresh_daily_bars(SUBSCRIBE_SYMBOLS)
     logging.info("Historical refresh complete.")
 
 
-def _slice_daily_bars(bars: List[Dict[str, Any]], period: str) -> List[Dict[str, Any]]:
-    if not bars:
-        return []
+def _period_cutoff(period: str) -> int:
     lookback_days = PERIOD_TO_DAYS.get(period, 30)
-    cutoff_ts = int((datetime.utcnow() - timedelta(days=lookback_days)).timestamp())
-    return [b for b in bars if int(b.get("time", 0)) >= cutoff_ts]
+    return int((datetime.utcnow() - timedelta(days=lookback_days)).timestamp())
+
 
+def _slice_daily_bars(symbol: str, period: str) -> List[Dict[str, Any]]:
+    """Daily bars inside the period window, filtered by the bar store query."""
+    return _read_daily_bars(symbol, start=_period_cutoff(period))
 
+
+@offload.blocking
 def _fetch_intraday(symbol: str, period: str) -> Dict[str, Any]:
     # yfinance supports 1d/5d at 1m/2m/5m intervals; use 5m to keep arrays reasonable
     yf_period = "1d" if period == "1d" else "5d"
     interval = "5m"
     tkr = yf.Ticker(symbol)
     df = tkr.history(period=yf_period, interval=interval)
-    series = [
-        {
-            "time": int(idx.timestamp()),
-            "open": float(row["Open"]),
-            "high": float(row["High"]),
-            "low": float(row["Low"]),
-            "close": float(row["Close"]),
-            "volume": float(row.get("Volume", 0.0) or 0.0),
-        }
-        for idx, row in df.iterrows()
-    ]
+    series = frame_to_bars(df)
     return {"symbol": symbol, "period": period, "interval": interval, "data": series}
 
 
-def history(symbol: str, period: str = "1d") -> Dict[str, Any]:
+def _merge_bars(*sources: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Union by bar time, later sources winning; oldest first."""
+    by_time: Dict[int, Dict[str, Any]] = {}
+    for bars in sources:
+        for bar in bars:
+            by_time[int(bar["time"])] = bar
+    return [by_time[t] for t in sorted(by_time)]
+
+
+def _has_gaps(bars: List[Dict[str, Any]], start: int, step: int) -> bool:
+    prev = start - step
+    for bar in bars:
+        if bar["time"] - prev > step * (LIVE_GAP_BARS + 1):
+            return True
+        prev = bar["time"]
+    return False
+
+
+def _stored_intraday(symbol: str, start: int, end: int) -> Tuple[Tuple[Any, ...], List[Dict[str, Any]]]:
+    key = (symbol, start, bar_builder.generation)
+    return key, _stored_intraday_cache.get_or_load(key, barstore.read_range, symbol, LIVE_INTERVAL, start, end)
+
+
+def _live_intraday(symbol: str) -> Dict[str, Any] | None:
+    """Today's (or the last session's) 5m bars from our own trade-built bars.
+
+    Missing stretches (server started mid-session, feed reconnects, a feed
+    that stopped before the close) are filled once from yfinance and
+    persisted, so later requests need no upstream call. Returns None when we
+    have nothing usable (no stream, or the live feed has gone stale),
+    leaving the caller to use yfinance.
+
+    A worker that does not run the bar builder (not the feed process) only
+    sees persisted bars: no open bar, and completed bars up to one cut grace,
+    one persist interval and one stored-bar cache TTL late. Its staleness
+    check allows for that lag.
+    """
+    open_et, close_et = market_calendar.current_session()
+    start, end = int(open_et.timestamp()), int(close_et.timestamp()) - 1
+    step = LIVE_BAR_INTERVALS[LIVE_INTERVAL]
+    now = time.time()
+    # Memory first (the generation is read after it): bars persisted in
+    # between then show up in both, never neither
+    live = bar_builder.live_bars(symbol, LIVE_INTERVAL, start)
+    key, stored = _stored_intraday(symbol, start, end)
+    bars = _merge_bars(stored, live)
+    if not bars:
+        return None
+    session_over = not market_calendar.is_open() and now > end
+    # After the close the last bar starts one step before it
+    tail_missing = session_over and bars[-1]["time"] < end + 1 - step
+    if tail_missing or _has_gaps(bars, start, step):
+        upstream = _intraday_cache.get_or_load(
+            (symbol, "1d"),
+            _fetch_intraday,
+            symbol,
+            "1d",
+            ttl=market_calendar.intraday_ttl(),
+            flight=_intraday_flights,
+        )
+        have = {b["time"] for b in bars}
+        # In session, only bars older than our newest one are complete upstream too
+        until = end + 1 if session_over else bars[-1]["time"]
+        fills = [
+            b for b in upstream["data"]
+            if start <= b["time"] < until and b["time"] not in have
+        ]
+        if fills:
+            barstore.write_bars(symbol, LIVE_INTERVAL, fills)
+            _stored_intraday_cache.delete(key)
+            bars = _merge_bars(fills, bars)
+    if session_over and bars[-1]["time"] < end + 1 - step:
+        return None
+    stale_after = step * (LIVE_GAP_BARS + 1)
+    if not bar_builder.running:
+        stale_after += LIVE_CUT_GRACE_SEC + 2 * LIVE_PERSIST_SEC
+    if market_calendar.is_open() and bars[-1]["time"] < now - stale_after:
+        return None
+    return {"symbol": symbol, "period": "1d", "interval": LIVE_INTERVAL, "data": bars}
+
+
+def _load_daily_fallback(symbol: str) -> List[Dict[str, Any]]:
+    bars = _fetch_daily_single(symbol, "6mo")
+    _upsert_daily_bars(symbol, bars)
+    return bars
+
+
+def _columnar(payload: Dict[str, Any]) -> Dict[str, Any]:
+    return payload | {"format": "columns", "data": bars_to_columns(payload["data"])}
+
+
+def history(
+    symbol: str,
+    period: str = "1d",
+    columnar: bool = False,
+    max_points: int | None = None,
+    shape: str = "ohlc",
+) -> Dict[str, Any]:
+    """Chart bars for `symbol`.
+
+    With `columnar=True` the `data` field holds parallel time/open/high/low/
+    close/volume arrays instead of a list of bar dicts. With `max_points` the
+    series is reduced to at most that many bars (see `downsample.py`).
+    """
     symbol = symbol.upper()
     if period not in PERIODS:
         period = "1d"
+    if max_points:
+        return _downsampled_history(symbol, period, max_points, shape, columnar)
+
+    # 1D from bars built off the live trade stream when we have them
+    if period == "1d":
+        try:
+            payload = _live_intraday(symbol)
+        except Exception:
+            logging.exception(f"Failed to serve live intraday bars for {symbol}")
+            payload = None
+        if payload is not None:
+            return _columnar(payload) if columnar else payload
 
     # Intraday: use short-lived cache
     if period in {"1d", "5d"}:
         cache_key = (symbol, period)
-        if cache_key in _intraday_cache:
-            return _intraday_cache[cache_key]
-        payload = _fetch_intraday(symbol, period)
-        _intraday_cache[cache_key] = payload
-        return payload
+        # One upstream fetch per key no matter how many clients miss together
+        payload = _intraday_cache.get_or_load(
+            cache_key,
+            _fetch_intraday,
+            symbol,
+            period,
+            ttl=market_calendar.intraday_ttl(),
+            flight=_intraday_flights,
+        )
+        return _columnar(payload) if columnar else payload
 
     # Daily bars served from DB (preloaded and refreshed daily)
-    bars = _read_daily_bars(symbol)
-    if not bars:
-        # Fallback: fetch now and persist
+    sliced = _slice_daily_bars(symbol, period)
+    if not sliced and not barstore.last_times([symbol], "1d"):
+        # Fallback: nothing stored yet, fetch now and persist
         try:
-            tkr = yf.Ticker(symbol)
-            df = tkr.history(period="6mo", interval="1d")
-            bars = [
-                {
-                    "time": int(idx.timestamp()),
-                    "open": float(row["Open"]),
-                    "high": float(row["High"]),
-                    "low": float(row["Low"]),
-                    "close": float(row["Close"]),
-                    "volume": float(row.get("Volume", 0.0) or 0.0),
-                }
-                for idx, row in df.iterrows()
-            ]
-            _upsert_daily_bars(symbol, bars)
+            bars = _daily_flights.do(symbol, _load_daily_fallback, symbol)
         except Exception:
             logging.exception(f"Failed to fetch fallback 6mo daily bars for {symbol}")
             bars = []
-
-    sliced = _slice_daily_bars(bars, period)
-    return {"symbol": symbol, "period": period, "interval": "1d", "data": sliced}
+        cutoff = _period_cutoff(period)
+        sliced = [b for b in bars if int(b.get("time", 0)) >= cutoff]
+    payload = {"symbol": symbol, "period": period, "interval": "1d", "data": sliced}
+    return _columnar(payload) if columnar else payload
+
+
+def _downsampled_history(symbol: str, period: str, max_points: int, shape: str, columnar: bool) -> Dict[str, Any]:
+    payload = history(symbol, period, columnar=True)
+    cols = payload["data"]
+    n = len(cols["time"])
+    if n > max_points:
+        # Live bars grow and the newest one keeps changing, so the source's
+        # length and last bar are part of the key
+        key = (symbol, period, max_points, shape, n, cols["time"][-1], cols["close"][-1])
+        cols = _downsampled_cache.get_or_load(key, downsample_columns, cols, max_points, shape)
+    payload = payload | {"data": cols, "shape": shape, "max_points": max_points, "source_points": n}
+    if columnar:
+        return payload
+    payload.pop("format", None)
+    return payload | {"data": columns_to_bars(cols)}
 
 
 def _last_close_from_daily(symbol: str) -> float:
-    bars = _read_daily_bars(symbol) or []
-    if not bars:
-        return 0.0
-    return float(bars[-1].get("close", 0.0))
+    return bar_cache.stats(symbol, "1d")["last_close"]
 
 
 def _prev_close_from_daily(symbol: str) -> float:
-    bars = _read_daily_bars(symbol) or []
-    if len(bars) < 2:
-        return 0.0
-    return float(bars[-2].get("close", 0.0) or 0.0)
+    return bar_cache.stats(symbol, "1d")["prev_close"]
+
+
+def _snapshot_entry(sym: str, market_open: bool) -> Dict[str, Any]:
+    entry = dict(latest_stock_data.get(sym, {}))
+    entry.setdefault("symbol", sym)
+    entry.setdefault("name", STOCK_METADATA.get(sym, {}).get("name", sym))
+    # Daily aggregates come from the in-process bar cache (no DB reads)
+    daily = bar_cache.stats(sym, "1d")
+    last_close = daily["last_close"]
+    prev_close = daily["prev_close"]
+    # Price fallback: use live price when open, else last close; if live missing, fall back to last close
+    price_live = float(entry.get("price", 0.0) or 0.0)
+    price = price_live if (market_open and price_live > 0) else last_close
+    entry["price"] = price
+    # Day change vs previous close
+    if prev_close > 0:
+        change_abs = price - prev_close
+        change_pct = (change_abs / prev_close) * 100.0
+    else:
+        change_abs = 0.0
+        change_pct = 0.0
+    entry["change"] = change_pct
+    entry["change_abs"] = change_abs
+    # Volume: use last daily bar, and compute change vs previous day's volume
+    vol = daily["last_volume"]
+    prev_vol = daily["prev_volume"]
+    entry["volume"] = vol
+    entry["prevVolume"] = prev_vol
+    # Relative volume vs 30-day average (using last complete daily bar)
+    meta = _get_symbol_meta(sym)
+    avg30 = daily["avg_volume_30d"]
+    entry["rvol"] = (vol / avg30) if avg30 > 0 else 0.0
+    entry["market_cap"] = meta.get("market_cap", 0.0)
+    entry["year_high"] = meta.get("year_high", 0.0)
+    entry["year_low"] = meta.get("year_low", 0.0)
+    entry.setdefault("time", entry.get("time", int(time.time())))
+    entry["market_open"] = market_open
+    if not market_open:
+        entry["status"] = "Market Closed"
+    return entry
 
 
 def snapshot(symbols: List[str]) -> Dict[str, Dict[str, Any]]:
     # Ensure minimal fields in every entry
     market_open = is_market_open_now()
-    data: Dict[str, Dict[str, Any]] = {s: dict(latest_stock_data.get(s, {})) for s in symbols}
-    for sym in symbols:
-        entry = data.get(sym) or {}
-        entry.setdefault("symbol", sym)
-        entry.setdefault("name", STOCK_METADATA.get(sym, {}).get("name", sym))
-        last_close = _last_close_from_daily(sym)
-        prev_close = _prev_close_from_daily(sym)
-        # Price fallback: use live price when open, else last close; if live missing, fall back to last close
-        price_live = float(entry.get("price", 0.0) or 0.0)
-        price = price_live if (market_open and price_live > 0) else last_close
-        entry["price"] = price
-        # Day change vs previous close
-        if prev_close > 0:
-            change_abs = price - prev_close
-            change_pct = (change_abs / prev_close) * 100.0
-        else:
-            change_abs = 0.0
-            change_pct = 0.0
-        entry["change"] = change_pct
-        entry["change_abs"] = change_abs
-        # Volume: use last daily bar, and compute change vs previous day's volume
-        vol = 0.0
-        prev_vol = 0.0
-        try:
-            bars = _read_daily_bars(sym) or []
-            if bars:
-                vol = float(bars[-1].get("volume", 0.0) or 0.0)
-                if len(bars) >= 2:
-                    prev_vol = float(bars[-2].get("volume", 0.0) or 0.0)
-        except Exception:
-            vol = 0.0
-            prev_vol = 0.0
-        entry["volume"] = vol
-        entry["prevVolume"] = prev_vol
-        # Relative volume vs 30-day average (using last complete daily bar)
-        meta = _get_symbol_meta(sym)
-        avg30 = float(meta.get("avg_volume_30d", 0.0) or 0.0)
-        entry["rvol"] = (vol / avg30) if avg30 > 0 else 0.0
-        entry["market_cap"] = meta.get("market_cap", 0.0)
-        entry["year_high"] = meta.get("year_high", 0.0)
-        entry["year_low"] = meta.get("year_low", 0.0)
-        entry.setdefault("time", entry.get("time", int(time.time())))
-        entry["market_open"] = market_open
-        if not market_open:
-            entry["status"] = "Market Closed"
-        data[sym] = entry
-    return data
+    return {sym: _snapshot_entry(sym, market_open) for sym in symbols}
+
+
+# Pre-serialized snapshot of the full universe, rebuilt per touched symbol
+snapshot_view = SnapshotMaterializer(SUBSCRIBE_SYMBOLS, _snapshot_entry, lambda: is_market_open_now())
+
+
+def touch_symbols(symbols: List[str] | None = None) -> None:
+    """Signal that live, daily or meta data changed for `symbols` (default: all)."""
+    snapshot_view.touch(symbols)
+
+
+# Market cap / 52W range, warmed concurrently and refreshed ahead of expiry
+meta_refresher = MetaRefresher(_fetch_symbol_meta_once, on_update=touch_symbols)
 
 
 def get_market_status() -> Dict[str, Any]:
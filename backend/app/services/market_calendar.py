@@ -0,0 +1,199 @@
+"""US equity market calendar and market-hours-aware cache TTLs.
+
+Regular session is 09:30–16:00 US/Eastern on NYSE trading days; early-close
+days end at 13:00. Holidays are derived from the exchange rules (observed
+dates included), so no yearly table needs maintaining.
+
+The TTL helpers let caches hold data exactly as long as it cannot change:
+during a session intraday entries expire on the next 5-minute bar boundary,
+outside it they live until shortly after the next session opens.
+"""
+
+from datetime import date, datetime, time as dtime, timedelta
+from functools import lru_cache
+from typing import Set, Tuple
+
+import pytz
+
+US_EASTERN = pytz.timezone("US/Eastern")
+SESSION_OPEN = dtime(9, 30)
+SESSION_CLOSE = dtime(16, 0)
+EARLY_CLOSE = dtime(13, 0)
+
+# Upstream needs a few seconds to publish a just-completed bar
+BAR_PUBLISH_GRACE_SEC = 5
+# Final bars / daily candles settle a little after the close
+CLOSE_SETTLE_SEC = 15 * 60
+MIN_TTL_SEC = 5
+
+
+def _easter(year: int) -> date:
+    # Anonymous Gregorian algorithm
+    a = year % 19
+    b, c = divmod(year, 100)
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return date(year, month, day + 1)
+
+
+def _nth_weekday(year: int, month: int, weekday: int, n: int) -> date:
+    first = date(year, month, 1)
+    offset = (weekday - first.weekday()) % 7
+    return first + timedelta(days=offset + 7 * (n - 1))
+
+
+def _last_weekday(year: int, month: int, weekday: int) -> date:
+    nxt = date(year + (month == 12), month % 12 + 1, 1)
+    last = nxt - timedelta(days=1)
+    return last - timedelta(days=(last.weekday() - weekday) % 7)
+
+
+def _observed(d: date) -> date | None:
+    """Saturday holidays move to Friday, Sunday ones to Monday.
+
+    NYSE does not observe a Saturday New Year's Day on the prior Friday.
+    """
+    if d.weekday() == 5:
+        return None if (d.month, d.day) == (1, 1) else d - timedelta(days=1)
+    if d.weekday() == 6:
+        return d + timedelta(days=1)
+    return d
+
+
+@lru_cache(maxsize=32)
+def holidays(year: int) -> Set[date]:
+    days = {
+        _observed(date(year, 1, 1)),
+        _nth_weekday(year, 1, 0, 3),           # Martin Luther King Jr. Day
+        _nth_weekday(year, 2, 0, 3),           # Washington's Birthday
+        _easter(year) - timedelta(days=2),     # Good Friday
+        _last_weekday(year, 5, 0),             # Memorial Day
+        _observed(date(year, 7, 4)),
+        _nth_weekday(year, 9, 0, 1),           # Labor Day
+        _nth_weekday(year, 11, 3, 4),          # Thanksgiving
+        _observed(date(year, 12, 25)),
+    }
+    if year >= 2022:
+        days.add(_observed(date(year, 6, 19)))  # Juneteenth
+    # _observed() returns None for an unobserved Saturday New Year's Day
+    days.discard(None)
+    return days
+
+
+@lru_cache(maxsize=32)
+def early_closes(year: int) -> Set[date]:
+    days = set()
+    july3 = date(year, 7, 3)
+    if july3.weekday() < 4:
+        days.add(july3)
+    days.add(_nth_weekday(year, 11, 3, 4) + timedelta(days=1))  # Day after Thanksgiving
+    xmas_eve = date(year, 12, 24)
+    if xmas_eve.weekday() < 5:
+        days.add(xmas_eve)
+    return {d for d in days if is_trading_day(d)}
+
+
+def is_trading_day(d: date) -> bool:
+    return d.weekday() < 5 and d not in holidays(d.year)
+
+
+def session_bounds(d: date) -> Tuple[datetime, datetime] | None:
+    """(open, close) as aware US/Eastern datetimes, or None if closed all day."""
+    if not is_trading_day(d):
+        return None
+    close = EARLY_CLOSE if d in early_closes(d.year) else SESSION_CLOSE
+    return (
+        US_EASTERN.localize(datetime.combine(d, SESSION_OPEN)),
+        US_EASTERN.localize(datetime.combine(d, close)),
+    )
+
+
+def _now_et(now_utc: datetime | None) -> datetime:
+    now_utc = now_utc or datetime.utcnow().replace(tzinfo=pytz.utc)
+    return now_utc.astimezone(US_EASTERN)
+
+
+def is_open(now_utc: datetime | None = None) -> bool:
+    now_et = _now_et(now_utc)
+    bounds = session_bounds(now_et.date())
+    return bounds is not None and bounds[0] <= now_et <= bounds[1]
+
+
+def next_open(now_utc: datetime | None = None) -> datetime:
+    """Start of the next session strictly after `now` (US/Eastern)."""
+    now_et = _now_et(now_utc)
+    d = now_et.date()
+    for _ in range(15):
+        bounds = session_bounds(d)
+        if bounds is not None and bounds[0] > now_et:
+            return bounds[0]
+        d += timedelta(days=1)
+    raise RuntimeError("No trading session found in the next 15 days")
+
+
+def last_close(now_utc: datetime | None = None) -> datetime:
+    """End of the most recent session that has closed (US/Eastern)."""
+    now_et = _now_et(now_utc)
+    d = now_et.date()
+    for _ in range(15):
+        bounds = session_bounds(d)
+        if bounds is not None and bounds[1] <= now_et:
+            return bounds[1]
+        d -= timedelta(days=1)
+    raise RuntimeError("No trading session found in the last 15 days")
+
+
+def current_session(now_utc: datetime | None = None) -> Tuple[datetime, datetime]:
+    """Bounds of the session in progress, or of the most recent one that opened."""
+    now_et = _now_et(now_utc)
+    d = now_et.date()
+    for _ in range(15):
+        bounds = session_bounds(d)
+        if bounds is not None and bounds[0] <= now_et:
+            return bounds
+        d -= timedelta(days=1)
+    raise RuntimeError("No trading session found in the last 15 days")
+
+
+def intraday_ttl(now_utc: datetime | None = None, bar_seconds: int = 300) -> int:
+    """Seconds an intraday (e.g. 5m bars) payload stays valid.
+
+    In session: until the next bar boundary (plus publish grace). Shortly
+    after the close: until the settle window ends. Otherwise: until the next
+    session opens.
+    """
+    now_et = _now_et(now_utc)
+    if is_open(now_et):
+        elapsed = int(now_et.timestamp()) % bar_seconds
+        return max(MIN_TTL_SEC, bar_seconds - elapsed + BAR_PUBLISH_GRACE_SEC)
+    since_close = (now_et - last_close(now_et)).total_seconds()
+    if since_close < CLOSE_SETTLE_SEC:
+        return max(MIN_TTL_SEC, int(CLOSE_SETTLE_SEC - since_close))
+    return max(MIN_TTL_SEC, int((next_open(now_et) - now_et).total_seconds()) + BAR_PUBLISH_GRACE_SEC)
+
+
+def quote_ttl(now_utc: datetime | None = None, open_ttl: int = 300) -> int:
+    """Seconds a last-price quote stays valid: `open_ttl` in session, else until next open."""
+    if is_open(now_utc):
+        return open_ttl
+    return intraday_ttl(now_utc)
+
+
+def seconds_until_daily_refresh(now_utc: datetime | None = None) -> int:
+    """Seconds until the next session's close has settled (when daily bars are final)."""
+    now_et = _now_et(now_utc)
+    d = now_et.date()
+    for _ in range(15):
+        bounds = session_bounds(d)
+        if bounds is not None:
+            due = bounds[1] + timedelta(seconds=CLOSE_SETTLE_SEC)
+            if due > now_et:
+                return max(MIN_TTL_SEC, int((due - now_et).total_seconds()))
+        d += timedelta(days=1)
+    return 24 * 3600
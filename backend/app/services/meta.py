@@ -0,0 +1,121 @@
+"""Background refresher for per-symbol metadata (market cap, 52W range).
+
+`yf.Ticker(symbol).fast_info` is slow and was fetched lazily from inside
+the snapshot loop, one symbol at a time. Here request threads only read what
+is already cached (stale-while-revalidate): a missing or ageing entry
+schedules a refresh on a bounded worker pool and the caller gets the current
+value immediately. A token bucket caps the upstream request rate, and a
+background loop refreshes entries ahead of expiry so they rarely go stale.
+"""
+
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List
+
+from ..utils.ratelimit import TokenBucket
+from .cache import get_cache
+
+META_TTL_SEC = 30 * 60
+# Refresh once an entry has used this fraction of its TTL
+META_REFRESH_AHEAD = 0.8
+META_WORKERS = 6
+META_RATE_PER_SEC = 4.0
+META_BURST = 8
+# How long a stale entry may still be served while upstream keeps failing
+META_STALE_SEC = 24 * 3600
+
+
+class MetaRefresher:
+    def __init__(
+        self,
+        fetch: Callable[[str], Dict[str, Any]],
+        on_update: Callable[[List[str]], None] | None = None,
+        ttl: float = META_TTL_SEC,
+        refresh_ahead: float = META_REFRESH_AHEAD,
+        workers: int = META_WORKERS,
+        rate: float = META_RATE_PER_SEC,
+        burst: float = META_BURST,
+    ):
+        self._fetch = fetch
+        self._on_update = on_update
+        self._workers = workers
+        self._bucket = TokenBucket(rate, burst)
+        self._lock = threading.Lock()
+        # Entries turn stale at the refresh-ahead point and stay servable after
+        self._cache = get_cache(
+            "meta", maxsize=512, ttl=ttl * refresh_ahead, stale_ttl=ttl * (1 - refresh_ahead) + META_STALE_SEC
+        )
+        self._inflight: set = set()
+        self._pool: ThreadPoolExecutor | None = None
+        self._started = False
+
+    def _executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self._workers, thread_name_prefix="meta")
+            return self._pool
+
+    def get(self, symbol: str) -> Dict[str, Any]:
+        """Cached metadata for `symbol`; never blocks on upstream.
+
+        Returns `{}` until the first fetch completes. Entries past the
+        refresh-ahead point are returned as-is and revalidated in background.
+        """
+        meta, fresh = self._cache.get_stale(symbol, None)
+        if not fresh:
+            self.schedule([symbol])
+        return meta if meta is not None else {}
+
+    def schedule(self, symbols: Iterable[str]) -> None:
+        todo = []
+        with self._lock:
+            for sym in symbols:
+                if sym not in self._inflight:
+                    self._inflight.add(sym)
+                    todo.append(sym)
+        if not todo:
+            return
+        pool = self._executor()
+        for sym in todo:
+            try:
+                pool.submit(self._refresh, sym)
+            except RuntimeError:
+                # Executor shut down (interpreter exit)
+                with self._lock:
+                    self._inflight.discard(sym)
+
+    def _refresh(self, symbol: str) -> None:
+        try:
+            self._bucket.acquire()
+            meta = self._fetch(symbol)
+            self._cache.set(symbol, meta)
+            if self._on_update is not None:
+                self._on_update([symbol])
+        except Exception:
+            # Keep serving the previous (stale) value; retried on next schedule
+            logging.exception(f"Failed to refresh metadata for {symbol}")
+        finally:
+            with self._lock:
+                self._inflight.discard(symbol)
+
+    def due(self, symbols: Iterable[str]) -> List[str]:
+        return [s for s in symbols if s not in self._cache]
+
+    def start(self, symbols: List[str], interval_sec: float = 60.0) -> None:
+        """Warm every symbol now and keep refreshing ahead of expiry."""
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+
+        def loop():
+            while True:
+                try:
+                    self.schedule(self.due(symbols))
+                except Exception:
+                    logging.exception("Metadata refresh loop error")
+                time.sleep(interval_sec)
+
+        threading.Thread(target=loop, daemon=True, name="meta-refresh").start()
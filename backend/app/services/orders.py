@@ -0,0 +1,447 @@
+"""Simulated resting orders: limit, stop and stop-limit, GTC or DAY.
+
+Open orders are kept in MongoDB (`orders`) and, for matching, in memory as
+two heaps of trigger levels per symbol:
+
+- `up`:   fires once the price rises to the level (SELL limit, BUY stop)
+- `down`: fires once the price falls to the level (BUY limit, SELL stop)
+
+Each price update pops only the entries it crossed, so a tick costs
+O(log n) per triggered order and O(1) when nothing crosses, however many
+orders rest on the symbol. A stop-limit's stop leg, once crossed, re-enters
+the book as a limit order at its limit price. Cancelled orders are dropped
+from the order map and their heap entries are skipped when they surface.
+DAY orders expire at the close of their session (an expiry heap is swept
+periodically, and crossed orders are checked on the way out).
+
+Prices come from the streamer (`sockets/events.py`), so resting orders are
+limited to the streamed universe. Fills run on a small thread pool: each
+order is first claimed with a conditional update (`status: open -> filling`),
+so an order is filled at most once even if several worker processes hold
+it, then executed as a market order at the crossing price through
+`trading.execute_market_order`. Cash and shares are checked at fill time,
+not reserved when the order is placed.
+
+Every worker loads all open orders when it starts (`start`) and then adds
+the ones it places itself. With a shared quote board only the feed process
+sees every tick; the other workers see the latest price per flush. The feed
+process therefore also picks up orders placed in any worker (`start_sync`)
+and matches them tick by tick. Several processes may thus hold one order;
+the claim keeps them from filling it twice, and the periodic `prune` drops
+orders that were filled, cancelled or expired elsewhere.
+"""
+
+import heapq
+import itertools
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Tuple
+
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, ReturnDocument
+
+from .. import extensions
+from . import market_calendar, trading
+
+ORDER_TYPES = ("limit", "stop", "stop_limit")
+SIDES = ("BUY", "SELL")
+TIME_IN_FORCE = ("gtc", "day")
+OPEN = "open"
+SWEEP_EVERY_SEC = 30
+# How often the feed process picks up orders placed in other workers
+SYNC_EVERY_SEC = 2
+# Re-read this far back to catch inserts that landed out of created_at order
+SYNC_OVERLAP_SEC = 5
+# Outside the session, only a price this recent may fill an order on arrival
+ARRIVAL_MAX_AGE_SEC = 60
+FILL_WORKERS = 4
+# Ids per query when checking which locally held orders are still open
+PRUNE_BATCH = 500
+
+
+def _col():
+    return extensions.db["orders"]
+
+
+class _Order:
+    __slots__ = ("id", "user_id", "symbol", "side", "type", "qty", "limit", "stop", "expires_at", "triggered")
+
+    def __init__(self, doc: Dict[str, Any]):
+        self.id = str(doc["_id"])
+        self.user_id = doc["user_id"]
+        self.symbol = doc["symbol"]
+        self.side = doc["side"]
+        self.type = doc["type"]
+        self.qty = int(doc["quantity"])
+        self.limit = doc.get("limit_price")
+        self.stop = doc.get("stop_price")
+        self.expires_at = doc.get("expires_at")
+        self.triggered = bool(doc.get("triggered"))
+
+    def leg(self) -> Tuple[str, float]:
+        """`(heap, level)` the order currently waits on."""
+        if self.type == "limit" or self.triggered:
+            return ("down" if self.side == "BUY" else "up"), self.limit
+        return ("up" if self.side == "BUY" else "down"), self.stop
+
+
+class _SymbolBook:
+    __slots__ = ("up", "down")
+
+    def __init__(self):
+        # up: (level, seq, order_id); down: (-level, seq, order_id) -- both min-heaps
+        self.up: List[Tuple[float, int, str]] = []
+        self.down: List[Tuple[float, int, str]] = []
+
+
+def _day_expiry(now: float) -> int:
+    """Close of the session in progress, or of the next one if the market is closed."""
+    now_utc = datetime.fromtimestamp(now, tz=timezone.utc)
+    if market_calendar.is_open(now_utc):
+        return int(market_calendar.current_session(now_utc)[1].timestamp())
+    next_open = market_calendar.next_open(now_utc)
+    return int(market_calendar.session_bounds(next_open.date())[1].timestamp())
+
+
+def to_json(doc: Dict[str, Any]) -> Dict[str, Any]:
+    out = {k: v for k, v in doc.items() if k not in ("_id", "user_id")}
+    out["id"] = str(doc["_id"])
+    return out
+
+
+class OrderEngine:
+    def __init__(self, execute: Callable[..., Dict[str, Any]] = trading.execute_market_order):
+        self._execute = execute
+        self._lock = threading.Lock()
+        self._books: Dict[str, _SymbolBook] = {}
+        self._orders: Dict[str, _Order] = {}
+        self._expiries: List[Tuple[int, str]] = []
+        # symbol -> (last price, when it was seen)
+        self._last: Dict[str, Tuple[float, float]] = {}
+        self._seq = itertools.count()
+        self._pool = ThreadPoolExecutor(max_workers=FILL_WORKERS, thread_name_prefix="order-fill")
+        self._started = False
+        self._syncing = False
+        self._stats = {"ticks": 0, "triggered": 0, "filled": 0, "rejected": 0, "expired": 0, "cancelled": 0}
+
+    # ---------- book -------------------------------------------------
+    def _add(self, order: _Order) -> None:
+        """Rest `order` on its current leg (caller holds the lock)."""
+        self._orders[order.id] = order
+        book = self._books.setdefault(order.symbol, _SymbolBook())
+        side, level = order.leg()
+        if side == "up":
+            heapq.heappush(book.up, (level, next(self._seq), order.id))
+        else:
+            heapq.heappush(book.down, (-level, next(self._seq), order.id))
+
+    def _cross(self, symbol: str, price: float, now: float) -> Tuple[List[_Order], List[_Order], List[str]]:
+        """Pop every order `price` crosses (caller holds the lock).
+
+        Returns `(orders to fill, stop-limits just triggered, expired order ids)`.
+        """
+        book = self._books.get(symbol)
+        fills: List[_Order] = []
+        triggered: List[_Order] = []
+        expired: List[str] = []
+        if book is None:
+            return fills, triggered, expired
+        crossed = True
+        # A triggered stop-limit re-enters on the other heap and may cross right away
+        while crossed:
+            crossed = False
+            for heap, hit in ((book.up, lambda k: k <= price), (book.down, lambda k: -k >= price)):
+                while heap and hit(heap[0][0]):
+                    _, _, oid = heapq.heappop(heap)
+                    order = self._orders.get(oid)
+                    if order is None:
+                        continue  # cancelled, expired or filled
+                    if order.expires_at and now >= order.expires_at:
+                        del self._orders[oid]
+                        expired.append(oid)
+                    elif order.type == "stop_limit" and not order.triggered:
+                        order.triggered = True
+                        triggered.append(order)
+                        self._add(order)
+                        crossed = True
+                    else:
+                        del self._orders[oid]
+                        fills.append(order)
+        return fills, triggered, expired
+
+    # ---------- feed -------------------------------------------------
+    def on_price(self, symbol: str, price: float, now: float | None = None) -> int:
+        """Match resting orders against a new price; returns how many were sent to fill."""
+        if price <= 0:
+            return 0
+        now = now or time.time()
+        with self._lock:
+            self._last[symbol] = (price, now)
+        return self._match(symbol, price, now)
+
+    def _match(self, symbol: str, price: float, now: float) -> int:
+        with self._lock:
+            self._stats["ticks"] += 1
+            if symbol not in self._books:
+                return 0
+            fills, triggered, expired = self._cross(symbol, price, now)
+            self._stats["triggered"] += len(triggered)
+            self._stats["expired"] += len(expired)
+        if triggered:
+            self._pool.submit(self._mark_triggered, [o.id for o in triggered])
+        if expired:
+            self._pool.submit(self._mark_expired, expired)
+        for order in fills:
+            self._pool.submit(self._fill, order, price)
+        return len(fills)
+
+    # ---------- orders -----------------------------------------------
+    def place(
+        self,
+        user_id,
+        symbol: str,
+        side: str,
+        order_type: str,
+        quantity: int,
+        limit_price: float | None = None,
+        stop_price: float | None = None,
+        tif: str = "gtc",
+        last_price: float | None = None,
+        last_time: float | None = None,
+    ) -> Dict[str, Any]:
+        """Validate, persist and rest an order; raises `ValueError` on bad input.
+
+        An order the latest price already crosses fills right away, but only
+        while the market is open or that price is recent; a stale close does
+        not fill orders placed overnight.
+        """
+        if side not in SIDES:
+            raise ValueError("side must be BUY or SELL")
+        if order_type not in ORDER_TYPES:
+            raise ValueError(f"type must be one of {', '.join(ORDER_TYPES)}")
+        if tif not in TIME_IN_FORCE:
+            raise ValueError(f"tif must be one of {', '.join(TIME_IN_FORCE)}")
+        if quantity <= 0:
+            raise ValueError("quantity must be a positive integer")
+        if order_type in ("limit", "stop_limit") and not (limit_price and limit_price > 0):
+            raise ValueError("limit_price must be a positive number")
+        if order_type in ("stop", "stop_limit") and not (stop_price and stop_price > 0):
+            raise ValueError("stop_price must be a positive number")
+        now = time.time()
+        doc = {
+            "user_id": user_id,
+            "symbol": symbol,
+            "side": side,
+            "type": order_type,
+            "quantity": quantity,
+            "limit_price": limit_price if order_type != "stop" else None,
+            "stop_price": stop_price if order_type != "limit" else None,
+            "tif": tif,
+            "expires_at": _day_expiry(now) if tif == "day" else None,
+            "status": OPEN,
+            "triggered": False,
+            "created_at": int(now),
+        }
+        doc["_id"] = _col().insert_one(doc).inserted_id
+        order = _Order(doc)
+        with self._lock:
+            self._add(order)
+            if order.expires_at:
+                heapq.heappush(self._expiries, (order.expires_at, order.id))
+            last, seen_at = self._last.get(symbol) or (last_price, last_time or 0)
+        # Marketable on arrival: match against the latest price right away
+        if last and (market_calendar.is_open() or now - seen_at <= ARRIVAL_MAX_AGE_SEC):
+            self._match(symbol, last, now)
+        return to_json(doc)
+
+    def cancel(self, user_id, order_id: str) -> Dict[str, Any] | None:
+        """Cancel an open order owned by `user_id`; None if there is no such open order."""
+        try:
+            oid = ObjectId(order_id)
+        except Exception:
+            return None
+        doc = _col().find_one_and_update(
+            {"_id": oid, "user_id": user_id, "status": OPEN},
+            {"$set": {"status": "cancelled", "closed_at": int(time.time())}},
+            return_document=ReturnDocument.AFTER,
+        )
+        if doc is None:
+            return None
+        with self._lock:
+            if self._orders.pop(order_id, None) is not None:
+                self._stats["cancelled"] += 1
+        return to_json(doc)
+
+    def list_orders(self, user_id, status: str | None = None, limit: int = 200) -> List[Dict[str, Any]]:
+        query: Dict[str, Any] = {"user_id": user_id}
+        if status:
+            query["status"] = status
+        return [to_json(d) for d in _col().find(query).sort("created_at", DESCENDING).limit(limit)]
+
+    # ---------- persistence ------------------------------------------
+    def _fill(self, order: _Order, price: float) -> None:
+        oid = ObjectId(order.id)
+        # Claim first: only one process (or thread) may fill an order
+        if _col().find_one_and_update({"_id": oid, "status": OPEN}, {"$set": {"status": "filling"}}) is None:
+            # Filled, cancelled or expired elsewhere: make sure no copy stays in the book
+            with self._lock:
+                self._orders.pop(order.id, None)
+            return
+        update: Dict[str, Any] = {"closed_at": int(time.time())}
+        try:
+            self._execute(order.user_id, order.symbol, order.side, order.qty, price)
+            update |= {"status": "filled", "fill_price": price}
+            key = "filled"
+        except trading.TradeRejected as e:
+            update |= {"status": "rejected", "reason": str(e)}
+            key = "rejected"
+        except Exception:
+            logging.exception(f"Fill failed for order {order.id}")
+            update |= {"status": "rejected", "reason": "execution error"}
+            key = "rejected"
+        _col().update_one({"_id": oid}, {"$set": update})
+        with self._lock:
+            self._stats[key] += 1
+
+    def _mark_triggered(self, ids: List[str]) -> None:
+        try:
+            _col().update_many({"_id": {"$in": [ObjectId(i) for i in ids]}, "status": OPEN}, {"$set": {"triggered": True}})
+        except Exception:
+            logging.exception("Failed to persist triggered stop-limit orders")
+
+    def _mark_expired(self, ids: List[str]) -> None:
+        try:
+            _col().update_many(
+                {"_id": {"$in": [ObjectId(i) for i in ids]}, "status": OPEN},
+                {"$set": {"status": "expired", "closed_at": int(time.time())}},
+            )
+        except Exception:
+            logging.exception("Failed to persist expired orders")
+
+    def _compact(self) -> None:
+        """Drop heap entries of orders no longer open (caller holds the lock)."""
+        for book in self._books.values():
+            book.up = [e for e in book.up if e[2] in self._orders]
+            book.down = [e for e in book.down if e[2] in self._orders]
+            heapq.heapify(book.up)
+            heapq.heapify(book.down)
+
+    def sweep(self, now: float | None = None) -> int:
+        """Expire DAY orders whose session has closed; returns how many.
+
+        Also rebuilds the heaps once most of their entries are stale.
+        """
+        now = now or time.time()
+        expired = []
+        with self._lock:
+            while self._expiries and self._expiries[0][0] <= now:
+                _, oid = heapq.heappop(self._expiries)
+                if self._orders.pop(oid, None) is not None:
+                    expired.append(oid)
+            self._stats["expired"] += len(expired)
+            entries = sum(len(b.up) + len(b.down) for b in self._books.values())
+            if entries > 2 * len(self._orders) + 1024:
+                self._compact()
+        if expired:
+            self._mark_expired(expired)
+        return len(expired)
+
+    def prune(self) -> int:
+        """Drop orders no longer open in MongoDB; returns how many.
+
+        Catches orders another process filled, cancelled or expired, which
+        would otherwise rest here (and count as open) until they cross.
+        """
+        with self._lock:
+            ids = list(self._orders)
+        still_open = set()
+        for i in range(0, len(ids), PRUNE_BATCH):
+            chunk = [ObjectId(x) for x in ids[i : i + PRUNE_BATCH]]
+            still_open.update(str(d["_id"]) for d in _col().find({"_id": {"$in": chunk}, "status": OPEN}, {"_id": 1}))
+        n = 0
+        with self._lock:
+            for oid in ids:
+                if oid not in still_open and self._orders.pop(oid, None) is not None:
+                    n += 1
+        return n
+
+    def load(self, since: int | None = None) -> int:
+        """Rest every open order stored in MongoDB (e.g. after a restart).
+
+        With `since`, only orders created at or after it; orders already in
+        the book are skipped either way.
+        """
+        col = _col()
+        col.create_index([("user_id", ASCENDING), ("created_at", DESCENDING)], name="user_created")
+        col.create_index([("status", ASCENDING)], name="status")
+        query: Dict[str, Any] = {"status": OPEN}
+        if since is not None:
+            query["created_at"] = {"$gte": int(since)}
+        n = 0
+        with self._lock:
+            for doc in col.find(query):
+                order = _Order(doc)
+                if order.id in self._orders:
+                    continue
+                self._add(order)
+                if order.expires_at:
+                    heapq.heappush(self._expiries, (order.expires_at, order.id))
+                n += 1
+        return n
+
+    def _loop(self) -> None:
+        while True:
+            time.sleep(SWEEP_EVERY_SEC)
+            try:
+                self.sweep()
+                self.prune()
+            except Exception:
+                logging.exception("Order expiry sweep error")
+
+    def start(self) -> None:
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        try:
+            logging.info(f"Loaded {self.load()} open orders")
+        except Exception:
+            logging.exception("Failed to load open orders")
+        threading.Thread(target=self._loop, daemon=True, name="order-sweep").start()
+
+    def _sync_loop(self) -> None:
+        since = int(time.time())
+        while True:
+            time.sleep(SYNC_EVERY_SEC)
+            started = int(time.time())
+            try:
+                self.load(since=since - SYNC_OVERLAP_SEC)
+                since = started
+            except Exception:
+                logging.exception("Order sync error")
+
+    def start_sync(self) -> None:
+        """Keep resting orders placed by other worker processes (feed process only)."""
+        with self._lock:
+            if self._syncing:
+                return
+            self._syncing = True
+        try:
+            self.load()
+        except Exception:
+            logging.exception("Failed to load open orders")
+        threading.Thread(target=self._sync_loop, daemon=True, name="order-sync").start()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return self._stats | {
+                "open": len(self._orders),
+                "symbols": sum(1 for b in self._books.values() if b.up or b.down),
+                "heap_entries": sum(len(b.up) + len(b.down) for b in self._books.values()),
+            }
+
+
+engine = OrderEngine()
@@ -2,40 +2,171 @@
 Pure domain logic – NO Flask, NO JWT, NO request.
 Keep here anything that does **not** need the request context.
 """
-import yfinance as yf
-from datetime import datetime
+import logging
+import time
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from ..utils import singleflight
+from . import market, market_calendar
+from .barcache import bar_cache
+from .cache import get_cache
+
+# Daily window fetched for symbols the stream and the bar store cannot price
+FALLBACK_PERIOD = "5d"
+# A streamed price older than this is not used to execute a trade
+EXECUTION_MAX_AGE_SEC = 30
+
+
+def _session_day_start() -> int:
+    """Epoch seconds of midnight ET on the current (or latest) session day; daily bars are stamped there."""
+    open_et = market_calendar.current_session()[0]
+    return int(open_et.replace(hour=0, minute=0, second=0, microsecond=0).timestamp())
+
+
+def _from_daily(last_time: int, last_close: float, prev_close: float, day_start: int) -> Tuple[float, float]:
+    """`(price, previous close)` from the last two daily bars.
+
+    If the latest bar belongs to the current session, its close is the price
+    and the bar before is the reference; otherwise the session has no bar
+    yet, so the latest close is the reference and there is no price.
+    """
+    if last_time >= day_start:
+        return last_close, prev_close
+    return 0.0, last_close
+
 
 class PortfolioSvc:
-    """ Stateless helper – instantiated once and shared. """
+    """Pricing facade for portfolios – instantiated once (`pricing`) and shared.
+
+    Prices and previous closes are resolved per batch, cheapest source first:
+    the live quote (`market.latest_stock_data`), the cached daily aggregates
+    of the bar store (`bar_cache`), then one multi-ticker daily
+    download for whatever is left. Downloaded closes are cached per symbol
+    until the quote TTL runs out, and concurrent identical downloads share
+    one call. All state lives in thread-safe named caches.
+    """
     def __init__(self):
-        self._cache = {}          # optional in-memory price cache
-        self._ttl  = 300          # 5 min
+        # symbol -> (last daily bar time, last close, previous close)
+        self._closes = get_cache("portfolio.closes", maxsize=1024, ttl=300)
+        self._flights = singleflight.group("yf.portfolio")
 
     # ---------- public ------------------------------------------------
+    def quotes(self, symbols: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """Parallel `(price, previous_close)` arrays for `symbols`.
+
+        A price that cannot be found is 0; a missing previous close falls
+        back to the price (no daily change).
+        """
+        n = len(symbols)
+        price = np.zeros(n)
+        prev = np.zeros(n)
+        day_start = _session_day_start()
+        unresolved: List[int] = []
+        for i, sym in enumerate(symbols):
+            live = market.latest_stock_data.get(sym) or {}
+            price[i] = float(live.get("price", 0.0) or 0.0)
+            daily = bar_cache.stats(sym, "1d")
+            if daily["last_time"]:
+                daily_price, prev[i] = _from_daily(daily["last_time"], daily["last_close"], daily["prev_close"], day_start)
+                if price[i] <= 0:
+                    price[i] = daily_price
+            if price[i] <= 0 or prev[i] <= 0:
+                unresolved.append(i)
+
+        if unresolved:
+            fetched = self._fallback_closes(list(dict.fromkeys(symbols[i] for i in unresolved)))
+            for i in unresolved:
+                closes = fetched.get(symbols[i])
+                if closes is None:
+                    continue
+                daily_price, daily_prev = _from_daily(*closes, day_start)
+                if price[i] <= 0:
+                    # Without a bar for this session, the latest close is still the best price we have
+                    price[i] = daily_price or closes[1]
+                if prev[i] <= 0:
+                    prev[i] = daily_prev
+
+        prev = np.where(prev > 0, prev, price)
+        return price, prev
+
+    def price_many(self, symbols: List[str]) -> Dict[str, float]:
+        price, _ = self.quotes(symbols)
+        return dict(zip(symbols, price.tolist()))
+
+    def prev_close_many(self, symbols: List[str]) -> Dict[str, float]:
+        _, prev = self.quotes(symbols)
+        return dict(zip(symbols, prev.tolist()))
+
+    def current_price(self, symbol: str) -> float:
+        return self.price_many([symbol])[symbol]
+
+    def execution_price(self, symbol: str) -> float:
+        """Price to fill a market order at; 0 if there is no trustworthy one.
+
+        The streamed price is used while it is recent; otherwise a live
+        quote is fetched. Only outside the session may the last close stand
+        in for both.
+        """
+        live = market.latest_stock_data.get(symbol) or {}
+        price = float(live.get("price", 0.0) or 0.0)
+        if price > 0 and time.time() - float(live.get("timestamp", 0) or 0) <= EXECUTION_MAX_AGE_SEC:
+            return price
+        try:
+            price = float(market.fetch_quote(symbol).get("price", 0.0) or 0.0)
+        except Exception:
+            logging.exception(f"Live quote failed for {symbol}")
+            price = 0.0
+        if price > 0:
+            return price
+        return 0.0 if market_calendar.is_open() else self.current_price(symbol)
+
+    def prev_close(self, symbol: str) -> float:
+        return self.prev_close_many([symbol])[symbol]
+
     def total_value(self, cash: float, holdings: dict) -> float:
         """holdings: {symbol: qty}"""
-        return cash + sum(q * self.current_price(s) for s, q in holdings.items())
+        price, _ = self.quotes(list(holdings))
+        return cash + float(np.dot(np.array(list(holdings.values()), dtype=float), price))
 
     def daily_pnl(self, holdings: dict) -> float:
-        pnl = 0.0
-        for sym, qty in holdings.items():
-            prev = self.prev_close(sym)
-            now  = self.current_price(sym)
-            pnl += (now - prev) * qty
-        return pnl
+        price, prev = self.quotes(list(holdings))
+        return float(np.dot(np.array(list(holdings.values()), dtype=float), price - prev))
 
     # ---------- helpers ----------------------------------------------
-    def current_price(self, symbol: str) -> float:
-        now = datetime.now()
-        key = (symbol, "price")
-        if key in self._cache:
-            ts, px = self._cache[key]
-            if (now - ts).total_seconds() < self._ttl:
-                return px
-        px = float(yf.Ticker(symbol).history(period="1d")["Close"].iloc[-1])
-        self._cache[key] = (now, px)
-        return px
+    def _fallback_closes(self, symbols: List[str]) -> Dict[str, Tuple[int, float, float]]:
+        out: Dict[str, Tuple[int, float, float]] = {}
+        missing = []
+        for sym in symbols:
+            hit = self._closes.get(sym)
+            if hit is not None:
+                out[sym] = hit
+            else:
+                missing.append(sym)
+        if missing:
+            key = tuple(sorted(missing))
+            out.update(self._flights.do(key, self._download_closes, list(key)))
+        return out
 
-    def prev_close(self, symbol: str) -> float:
-        hist = yf.Ticker(symbol).history(period="2d")
-        return float(hist["Close"].iloc[-2]) if len(hist) >= 2 else self.current_price(symbol)
\ No newline at end of file
+    def _download_closes(self, symbols: List[str]) -> Dict[str, Tuple[int, float, float]]:
+        try:
+            fetched = market.fetch_daily_bars_bulk(symbols, period=FALLBACK_PERIOD)
+        except Exception:
+            logging.exception(f"Fallback daily download failed for {', '.join(symbols)}")
+            return {}
+        ttl = market_calendar.quote_ttl()
+        out = {}
+        for sym, bars in fetched.items():
+            last = bars[-1]
+            prev = bars[-2] if len(bars) >= 2 else {}
+            out[sym] = (
+                int(last.get("time", 0) or 0),
+                float(last.get("close", 0.0) or 0.0),
+                float(prev.get("close", 0.0) or 0.0),
+            )
+            self._closes.set(sym, out[sym], ttl=ttl)
+        return out
+
+
+pricing = PortfolioSvc()
@@ -0,0 +1,165 @@
+"""Cross-process live quote board in shared memory.
+
+With several worker processes, one of them (elected with a file lock, see
+`utils/leader.py`) owns the upstream feed and writes quotes here; every
+worker reads them straight out of the shared segment through a numpy view.
+
+Layout: a 16-byte header (magic, symbol count) followed by one fixed-size
+row per symbol, in `SUBSCRIBE_SYMBOLS` order:
+
+    version u8 | price f8 | change f8 | ts i8 | size f8
+
+`version` is a per-row seqlock: odd while the writer is mid-update, bumped
+to the next even value when done. Readers retry until they see the same
+even version before and after reading, so they never observe a torn row.
+Version 0 means the symbol was never written.
+
+`size` is the size of the latest trade print (0 for polled quotes).
+"""
+
+import threading
+import time
+from collections.abc import MutableMapping
+from multiprocessing import resource_tracker, shared_memory
+from typing import Any, Dict, Iterator, List
+
+import numpy as np
+
+QUOTE_DTYPE = np.dtype(
+    [("version", "<u8"), ("price", "<f8"), ("change", "<f8"), ("ts", "<i8"), ("size", "<f8")]
+)
+HEADER_DTYPE = np.dtype([("magic", "<u8"), ("count", "<u8")])
+MAGIC = 0x46534251  # "FSBQ"
+READ_RETRIES = 10000
+
+
+class QuoteBoard:
+    def __init__(self, symbols: List[str], name: str):
+        self._symbols = list(symbols)
+        self._index = {s: i for i, s in enumerate(self._symbols)}
+        size = HEADER_DTYPE.itemsize + QUOTE_DTYPE.itemsize * len(self._symbols)
+        try:
+            self._shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+            created = True
+        except FileExistsError:
+            self._shm = shared_memory.SharedMemory(name=name)
+            created = False
+        # The segment outlives any single worker: keep the resource tracker from
+        # unlinking it when the process that happened to create it exits
+        resource_tracker.unregister(self._shm._name, "shared_memory")
+
+        header = np.ndarray((), dtype=HEADER_DTYPE, buffer=self._shm.buf)
+        if created:
+            header["count"] = len(self._symbols)
+            header["magic"] = MAGIC
+        elif int(header["magic"]) != MAGIC or int(header["count"]) != len(self._symbols):
+            raise RuntimeError(f"Shared quote board {name!r} has a different layout; unlink it first")
+        self._rows = np.ndarray(
+            (len(self._symbols),), dtype=QUOTE_DTYPE, buffer=self._shm.buf, offset=HEADER_DTYPE.itemsize
+        )
+        # Field views into the shared segment (no copies)
+        self._version = self._rows["version"]
+        self._price = self._rows["price"]
+        self._change = self._rows["change"]
+        self._ts = self._rows["ts"]
+        self._size = self._rows["size"]
+        self._write_lock = threading.Lock()
+        self._seen = np.zeros(len(self._symbols), dtype=np.uint64)
+
+    @property
+    def name(self) -> str:
+        return self._shm.name
+
+    @property
+    def symbols(self) -> List[str]:
+        return list(self._symbols)
+
+    def write(self, symbol: str, price: float, change: float, ts: int, size: float = 0.0) -> None:
+        i = self._index.get(symbol)
+        if i is None:
+            return
+        with self._write_lock:
+            v = int(self._version[i])
+            self._version[i] = v + 1
+            self._price[i] = price
+            self._change[i] = change
+            self._ts[i] = ts
+            self._size[i] = size
+            self._version[i] = v + 2
+
+    def read(self, symbol: str) -> Dict[str, Any] | None:
+        """Consistent `{price, change, timestamp, size}`, or None if never written."""
+        i = self._index.get(symbol)
+        if i is None:
+            return None
+        for attempt in range(READ_RETRIES):
+            # One memcpy of the whole row, then confirm no write overlapped it
+            v, price, change, ts, size = self._rows[i].item()
+            if v == 0:
+                return None
+            if v % 2 == 0 and int(self._version[i]) == v:
+                return {"price": price, "change": change, "timestamp": ts, "size": size}
+            if attempt % 100 == 99:
+                time.sleep(0)
+        raise RuntimeError(f"Quote board row for {symbol} kept changing during read")
+
+    def written(self) -> List[str]:
+        return [self._symbols[i] for i in np.flatnonzero(self._version)]
+
+    def changed(self) -> List[str]:
+        """Symbols rewritten since the previous call in this process."""
+        current = self._version.copy()
+        idx = np.flatnonzero((current != self._seen) & (current % 2 == 0))
+        self._seen[idx] = current[idx]
+        return [self._symbols[i] for i in idx]
+
+    def clear(self, symbol: str) -> None:
+        i = self._index.get(symbol)
+        if i is not None:
+            with self._write_lock:
+                self._version[i] = 0
+
+    def close(self) -> None:
+        self._shm.close()
+
+    def unlink(self) -> None:
+        # SharedMemory.unlink() unregisters from the tracker; undo our unregister first
+        resource_tracker.register(self._shm._name, "shared_memory")
+        self._shm.unlink()
+
+
+class BoardQuotes(MutableMapping):
+    """`latest_stock_data`-shaped view over a `QuoteBoard`.
+
+    Reads build `{symbol, name, price, change, timestamp, size}` records from
+    the shared rows; assigning a record writes its price/change/timestamp.
+    """
+
+    def __init__(self, board: QuoteBoard, metadata: Dict[str, Dict[str, Any]]):
+        self._board = board
+        self._metadata = metadata
+
+    def __getitem__(self, symbol: str) -> Dict[str, Any]:
+        quote = self._board.read(symbol)
+        if quote is None:
+            raise KeyError(symbol)
+        name = self._metadata.get(symbol, {}).get("name", symbol)
+        return {"symbol": symbol, "name": name} | quote
+
+    def __setitem__(self, symbol: str, record: Dict[str, Any]) -> None:
+        self._board.write(
+            symbol,
+            float(record.get("price", 0.0) or 0.0),
+            float(record.get("change", 0.0) or 0.0),
+            int(record.get("timestamp", 0) or 0),
+            float(record.get("size", 0.0) or 0.0),
+        )
+
+    def __delitem__(self, symbol: str) -> None:
+        self._board.clear(symbol)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._board.written())
+
+    def __len__(self) -> int:
+        return len(self._board.written())
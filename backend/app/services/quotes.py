@@ -0,0 +1,113 @@
+"""Concurrent quote polling for the yfinance fallback stream.
+
+Fetching 34 quotes one after another takes far longer than the poll
+interval. `QuotePoller` fans a cycle out over a bounded worker pool and waits
+at most until the cycle deadline: symbols that have not answered by then
+keep their last known quote, and their in-flight fetch is left to finish in
+the background (its result is used next cycle) instead of being submitted
+again. Each cycle's latency is recorded against the target interval.
+
+Every quote carries `fetched_at` (epoch seconds of its upstream answer), so a
+caller can tell a fresh quote from a repeated fallback.
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ALL_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List
+
+QUOTE_POLL_WORKERS = 16
+# Cycle latencies kept for the percentile stats
+LATENCY_WINDOW = 200
+
+
+class QuotePoller:
+    def __init__(self, fetch: Callable[[str], Dict[str, Any]], workers: int = QUOTE_POLL_WORKERS):
+        self._fetch = fetch
+        self._workers = workers
+        self._lock = threading.Lock()
+        self._pool: ThreadPoolExecutor | None = None
+        self._inflight: Dict[str, Future] = {}
+        self._last: Dict[str, Dict[str, Any]] = {}
+        self._latencies: deque = deque(maxlen=LATENCY_WINDOW)
+        self._target_sec = 0.0
+        self._cycles = 0
+        self._on_time = 0
+        self._late_symbols = 0
+        self._errors = 0
+
+    def _executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self._workers, thread_name_prefix="quote")
+            return self._pool
+
+    def _timed_fetch(self, symbol: str) -> Dict[str, Any]:
+        quote = self._fetch(symbol)
+        return {**quote, "fetched_at": time.time()}
+
+    def _done(self, symbol: str, fut: Future) -> None:
+        with self._lock:
+            if self._inflight.get(symbol) is fut:
+                del self._inflight[symbol]
+            if fut.exception() is not None:
+                self._errors += 1
+                logging.warning(f"Quote fetch failed for {symbol}: {fut.exception()}")
+                return
+            self._last[symbol] = fut.result()
+
+    def poll(self, symbols: List[str], deadline: float | None = None) -> List[Dict[str, Any]]:
+        """Quotes for `symbols`, waiting at most `deadline` seconds.
+
+        Symbols whose fetch misses the deadline (or fails) fall back to their
+        last quote; symbols never fetched successfully are left out.
+        """
+        started = time.monotonic()
+        pool = self._executor()
+        futures: List[Future] = []
+        submitted: List[tuple] = []
+        with self._lock:
+            for sym in symbols:
+                fut = self._inflight.get(sym)
+                if fut is None:
+                    fut = pool.submit(self._timed_fetch, sym)
+                    self._inflight[sym] = fut
+                    submitted.append((sym, fut))
+                futures.append(fut)
+        # Outside the lock: a callback on an already-finished future runs inline
+        for sym, fut in submitted:
+            fut.add_done_callback(lambda f, s=sym: self._done(s, f))
+        _, pending = wait(futures, timeout=deadline, return_when=ALL_COMPLETED)
+        elapsed = time.monotonic() - started
+        with self._lock:
+            self._cycles += 1
+            self._latencies.append(elapsed)
+            if deadline:
+                self._target_sec = deadline
+                if elapsed <= deadline:
+                    self._on_time += 1
+            self._late_symbols += len(pending)
+            # Done callbacks may not have run yet when wait() returns
+            for sym, fut in zip(symbols, futures):
+                if fut.done() and fut.exception() is None:
+                    self._last[sym] = fut.result()
+            return [dict(self._last[s]) for s in symbols if s in self._last]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lat = sorted(self._latencies)
+            pct = lambda q: (lat[min(len(lat) - 1, int(q * len(lat)))] * 1000.0) if lat else 0.0
+            return {
+                "workers": self._workers,
+                "cycles": self._cycles,
+                "target_ms": self._target_sec * 1000.0,
+                "last_ms": (self._latencies[-1] * 1000.0) if self._latencies else 0.0,
+                "p50_ms": pct(0.5),
+                "p95_ms": pct(0.95),
+                "on_time_ratio": (self._on_time / self._cycles) if self._cycles else 0.0,
+                "late_symbols": self._late_symbols,
+                "in_flight": len(self._inflight),
+                "errors": self._errors,
+            }
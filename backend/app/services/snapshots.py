@@ -0,0 +1,94 @@
+"""Materialized `/api/snapshot` payload.
+
+Keeps a pre-serialized JSON body for the whole symbol universe plus a
+monotonically increasing version. Producers (ticks, bar refreshes, metadata
+refreshes) only mark symbols dirty; the next read re-serializes just those
+symbols and bumps the version. A change in market open/closed state rebuilds
+every entry. The version restarts at 0 in every process, so the HTTP ETag
+pairs it with a random per-instance epoch; unchanged polls are answered with
+304, and a poll that reaches another worker or a restarted one never matches
+a stale tag.
+
+A MessagePack body in columns (see `utils/codec.py`) is built on demand, at
+most once per version.
+"""
+
+import json
+import secrets
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Tuple
+
+from ..utils import codec
+
+
+class SnapshotMaterializer:
+    def __init__(
+        self,
+        symbols: List[str],
+        build_entry: Callable[[str, bool], Dict[str, Any]],
+        market_open: Callable[[], bool],
+    ):
+        self._symbols = list(symbols)
+        self._known = set(self._symbols)
+        self._build_entry = build_entry
+        self._market_open = market_open
+        self._dirty_lock = threading.Lock()
+        self._dirty: set = set(self._symbols)
+        self._build_lock = threading.Lock()
+        self._fragments: Dict[str, bytes] = {}
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._last_open: bool | None = None
+        self._version = 0
+        self._body = b"{}"
+        self._packed = b""
+        self._packed_version = -1
+        # Identifies this instance; versions from another process are unrelated
+        self.epoch = secrets.token_hex(4)
+
+    def touch(self, symbols: Iterable[str] | None = None) -> None:
+        """Mark symbols (default: all) for re-serialization on the next read."""
+        with self._dirty_lock:
+            if symbols is None:
+                self._dirty.update(self._symbols)
+            else:
+                self._dirty.update(s for s in symbols if s in self._known)
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def current(self) -> Tuple[bytes, int]:
+        """Return `(json_body, version)`, rebuilding dirty entries first."""
+        market_open = self._market_open()
+        with self._dirty_lock:
+            clean = not self._dirty and market_open == self._last_open
+        if clean:
+            return self._body, self._version
+
+        with self._build_lock:
+            with self._dirty_lock:
+                dirty = self._dirty
+                self._dirty = set()
+            if market_open != self._last_open:
+                dirty = set(self._symbols)
+            if not dirty and self._version:
+                return self._body, self._version
+            for sym in self._symbols:
+                if sym in dirty or sym not in self._fragments:
+                    entry = self._entries[sym] = self._build_entry(sym, market_open)
+                    self._fragments[sym] = json.dumps(entry, separators=(",", ":")).encode()
+            self._body = b"{" + b",".join(
+                json.dumps(sym).encode() + b":" + self._fragments[sym] for sym in self._symbols
+            ) + b"}"
+            self._last_open = market_open
+            self._version += 1
+            return self._body, self._version
+
+    def current_packed(self) -> Tuple[bytes, int]:
+        """Like `current`, but the body is columnar MessagePack (requires msgpack)."""
+        self.current()
+        with self._build_lock:
+            if self._packed_version != self._version:
+                self._packed = codec.pack_records({s: self._entries[s] for s in self._symbols})
+                self._packed_version = self._version
+            return self._packed, self._packed_version
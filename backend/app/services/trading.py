@@ -0,0 +1,138 @@
+"""Market order execution against `portfolios` / `portfolio_holdings`.
+
+Each side is a short chain of conditional `find_one_and_update` calls whose
+filters carry the guard, so concurrent orders cannot overdraw cash or sell
+shares twice:
+
+- BUY:  take the cash only if `available_balance >= total`, then upsert the
+        holding, recomputing the average price from the stored document in
+        the same update (pipeline update).
+- SELL: take the shares only if `quantity >= qty`, then credit the cash.
+
+If the second step fails, the first is reverted. The trade response is
+built from the documents those updates return plus one read of the holdings.
+"""
+
+import logging
+from typing import Any, Dict
+
+from pymongo import ASCENDING, ReturnDocument
+from pymongo.errors import OperationFailure
+
+from .. import extensions
+
+_indexes_ready = False
+
+
+class TradeRejected(ValueError):
+    """Order refused (unknown portfolio, not enough cash or shares)."""
+
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.status = status
+
+
+def _portfolios():
+    return extensions.db["portfolios"]
+
+
+def _holdings():
+    return extensions.db["portfolio_holdings"]
+
+
+def ensure_indexes() -> None:
+    """One holding per (portfolio, symbol), so concurrent first buys upsert into the same document."""
+    global _indexes_ready
+    if _indexes_ready:
+        return
+    try:
+        _holdings().create_index(
+            [("portfolio_id", ASCENDING), ("stock_symbol", ASCENDING)],
+            unique=True,
+            name="portfolio_symbol",
+        )
+    except OperationFailure:
+        # e.g. duplicate holdings left by the old read-modify-write trades
+        logging.exception("Could not create the unique portfolio_holdings index")
+    _indexes_ready = True
+
+
+def _rejected_buy(user_id, total: float) -> TradeRejected:
+    if _portfolios().find_one({"user_id": user_id}, {"_id": 1}) is None:
+        return TradeRejected("Portfolio not found", 404)
+    return TradeRejected("Insufficient balance")
+
+
+def _buy(user_id, symbol: str, qty: int, price: float) -> Dict[str, Any]:
+    total = price * qty
+    portfolio = _portfolios().find_one_and_update(
+        {"user_id": user_id, "available_balance": {"$gte": total}},
+        {"$inc": {"available_balance": -total}},
+        return_document=ReturnDocument.AFTER,
+    )
+    if portfolio is None:
+        raise _rejected_buy(user_id, total)
+    held = {"$ifNull": ["$quantity", 0]}
+    try:
+        _holdings().find_one_and_update(
+            {"portfolio_id": portfolio["_id"], "stock_symbol": symbol},
+            [{"$set": {
+                # Both fields read the stored values, before this update
+                "average_price": {"$divide": [
+                    {"$add": [{"$multiply": [held, {"$ifNull": ["$average_price", 0]}]}, total]},
+                    {"$add": [held, qty]},
+                ]},
+                "quantity": {"$add": [held, qty]},
+            }}],
+            upsert=True,
+        )
+    except Exception:
+        logging.exception(f"Holding update failed for BUY {qty} {symbol}; refunding cash")
+        _portfolios().update_one({"_id": portfolio["_id"]}, {"$inc": {"available_balance": total}})
+        raise
+    return portfolio
+
+
+def _sell(user_id, symbol: str, qty: int, price: float) -> Dict[str, Any]:
+    total = price * qty
+    found = _portfolios().find_one({"user_id": user_id}, {"_id": 1})
+    if found is None:
+        raise TradeRejected("Portfolio not found", 404)
+    holding = _holdings().find_one_and_update(
+        {"portfolio_id": found["_id"], "stock_symbol": symbol, "quantity": {"$gte": qty}},
+        {"$inc": {"quantity": -qty}},
+        return_document=ReturnDocument.AFTER,
+    )
+    if holding is None:
+        raise TradeRejected("Insufficient shares")
+    try:
+        portfolio = _portfolios().find_one_and_update(
+            {"_id": found["_id"]},
+            {"$inc": {"available_balance": total}},
+            return_document=ReturnDocument.AFTER,
+        )
+    except Exception:
+        logging.exception(f"Cash credit failed for SELL {qty} {symbol}; restoring shares")
+        _holdings().update_one({"_id": holding["_id"]}, {"$inc": {"quantity": qty}})
+        raise
+    if holding["quantity"] == 0:
+        # Only if no concurrent buy topped it up meanwhile
+        _holdings().delete_one({"_id": holding["_id"], "quantity": 0})
+    return portfolio
+
+
+def execute_market_order(user_id, symbol: str, side: str, qty: int, price: float) -> Dict[str, Any]:
+    """Fill `qty` shares of `symbol` at `price`; returns `{"usd", "shares"}` after the fill.
+
+    Raises `TradeRejected` when the order cannot be filled.
+    """
+    ensure_indexes()
+    if side == "BUY":
+        portfolio = _buy(user_id, symbol, qty, price)
+    else:
+        portfolio = _sell(user_id, symbol, qty, price)
+    shares = {
+        h["stock_symbol"]: h["quantity"]
+        for h in _holdings().find({"portfolio_id": portfolio["_id"], "quantity": {"$gt": 0}})
+    }
+    return {"usd": portfolio["available_balance"], "shares": shares}
@@ -0,0 +1,54 @@
+"""Batched portfolio valuation.
+
+Prices and previous closes for every holding come from one
+`PortfolioSvc.quotes` call (live quote, then cached daily bars, then a single
+multi-ticker download for the rest). Value, cost, daily P&L and return are
+then computed over NumPy arrays, so the number of upstream calls no longer
+grows with the number of positions.
+"""
+
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+
+from .portfolio import pricing
+
+
+def value_portfolio(
+    available_balance: float,
+    holdings: List[Dict[str, Any]],
+    name_for: Callable[[str], str] = lambda s: s,
+) -> Dict[str, Any]:
+    """The `GET /api/portfolio` body for `holdings` (portfolio_holdings documents)."""
+    symbols = [h["stock_symbol"] for h in holdings]
+    qty = np.array([float(h["quantity"]) for h in holdings])
+    avg = np.array([float(h["average_price"]) for h in holdings])
+    price, prev = pricing.quotes(symbols)
+
+    value = qty * price
+    holdings_value = float(value.sum())
+    total_cost = float((qty * avg).sum())
+    daily_profit = float(((price - prev) * qty).sum())
+
+    total_value = available_balance + holdings_value
+    initial_investment = available_balance + total_cost
+    overall_return = ((total_value - initial_investment) / initial_investment) * 100 if initial_investment > 0 else 0
+
+    return {
+        "holdings": [
+            {
+                "stock_symbol": sym,
+                "stock_name": name_for(sym),
+                "quantity": h["quantity"],
+                "average_price": h["average_price"],
+                "current_price": p,
+                "previous_close": pc,
+                "total_value": v,
+            }
+            for sym, h, p, pc, v in zip(symbols, holdings, price.tolist(), prev.tolist(), value.tolist())
+        ],
+        "totalValue": total_value,
+        "dailyProfit": daily_profit,
+        "overallReturn": overall_return,
+        "availableBalance": available_balance,
+    }
@@ -0,0 +1,54 @@
+"""Tick conflation between upstream ingest and client fan-out.
+
+Upstream trades are merged into a per-symbol latest-state buffer; a flusher
+drains the buffer on a fixed cadence so outbound `stock_update` volume
+depends on the flush interval, not on how busy the market is.
+"""
+
+import threading
+import time
+from typing import Any, Dict
+
+
+class TickConflator:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._started = time.monotonic()
+        self._ticks_in = 0
+        self._updates_out = 0
+        self._messages_out = 0
+        self._flushes = 0
+
+    def ingest(self, symbol: str, update: Dict[str, Any]) -> None:
+        """Record the newest state for `symbol`; older pending state is replaced."""
+        with self._lock:
+            self._pending[symbol] = update
+            self._ticks_in += 1
+
+    def drain(self) -> Dict[str, Dict[str, Any]]:
+        """Take everything pending since the last flush."""
+        with self._lock:
+            batch, self._pending = self._pending, {}
+            if batch:
+                self._flushes += 1
+                self._updates_out += len(batch)
+            return batch
+
+    def record_messages(self, count: int) -> None:
+        with self._lock:
+            self._messages_out += count
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            elapsed = max(time.monotonic() - self._started, 1e-9)
+            return {
+                "ticks_in": self._ticks_in,
+                "updates_out": self._updates_out,
+                "messages_out": self._messages_out,
+                "flushes": self._flushes,
+                "pending": len(self._pending),
+                "ticks_in_per_sec": self._ticks_in / elapsed,
+                "messages_out_per_sec": self._messages_out / elapsed,
+                "conflation_ratio": (self._ticks_in / self._updates_out) if self._updates_out else 0.0,
+            }
@@ -0,0 +1,113 @@
+"""Compact delta encoding for `stock_update`.
+
+Symbols are addressed by a small integer id (their index in the symbol
+table) and fields by one-letter codes. The encoder remembers the last state
+sent per symbol, so each frame only carries fields that actually changed.
+
+Frames:
+- keyframe `stock_keyframe`: {"epoch", "seq", "symbols": [table], "k": [[id, {code: value}], ...]}
+- delta    `stock_delta`:    {"epoch", "seq", "prev", "t", "d": [[id, {code: value}], ...]}
+
+Per-symbol timestamps are not diffed: a delta frame carries one `t` (the
+flush time) that applies to every symbol in it, and keyframes carry each
+symbol's own `t`.
+
+`seq` increases by one per flush that changed anything. `prev` is the seq of
+the previous frame delivered to that client; if it does not match the last
+seq the client saw, the client has missed a frame and should ask for a
+resync (`resync` event -> keyframe).
+
+`epoch` is a random id drawn when the encoder is created. seq restarts at 0
+with every process, so a seq is only meaningful together with its epoch.
+"""
+
+import secrets
+import threading
+from typing import Any, Dict, Iterable, List, Tuple
+
+FIELD_CODES: Dict[str, str] = {
+    "price": "p",
+    "change": "c",
+    "market_open": "o",
+}
+TIME_FIELD, TIME_CODE = "timestamp", "t"
+
+Changes = Dict[int, Dict[str, Any]]
+
+
+class DeltaEncoder:
+    def __init__(self, symbols: Iterable[str]):
+        self._table: List[str] = list(symbols)
+        self._ids: Dict[str, int] = {s: i for i, s in enumerate(self._table)}
+        self._lock = threading.Lock()
+        self._state: Dict[int, Dict[str, Any]] = {}
+        self._seq = 0
+        self._time = 0
+        # Stream identity; a seq from another epoch says nothing about this one
+        self.epoch = secrets.token_hex(4)
+
+    @property
+    def seq(self) -> int:
+        return self._seq
+
+    def symbol_table(self) -> List[str]:
+        return list(self._table)
+
+    def symbol_id(self, symbol: str) -> int | None:
+        return self._ids.get(symbol)
+
+    def apply(self, batch: Dict[str, Dict[str, Any]]) -> Tuple[int, Changes]:
+        """Fold a `{symbol: update}` batch into the state.
+
+        Returns `(seq, {id: changed_fields})`; seq only advances when
+        something changed.
+        """
+        changes: Changes = {}
+        with self._lock:
+            for sym, update in batch.items():
+                sid = self._ids.get(sym)
+                if sid is None:
+                    continue
+                state = self._state.setdefault(sid, {})
+                diff = {}
+                for field, code in FIELD_CODES.items():
+                    if field in update and state.get(code) != update[field]:
+                        diff[code] = update[field]
+                        state[code] = update[field]
+                if diff:
+                    changes[sid] = diff
+                    if TIME_FIELD in update:
+                        state[TIME_CODE] = update[TIME_FIELD]
+                        self._time = max(self._time, int(update[TIME_FIELD] or 0))
+            if changes:
+                self._seq += 1
+            return self._seq, changes
+
+    @property
+    def time(self) -> int:
+        """Timestamp of the newest change folded in."""
+        return self._time
+
+    def keyframe(self, symbols: Iterable[str] | None = None) -> Dict[str, Any]:
+        with self._lock:
+            if symbols is None:
+                ids = sorted(self._state)
+            else:
+                ids = sorted(i for i in (self._ids.get(s) for s in symbols) if i in self._state)
+            return {
+                "epoch": self.epoch,
+                "seq": self._seq,
+                "symbols": list(self._table),
+                "k": [[i, dict(self._state[i])] for i in ids],
+            }
+
+    def ids_for(self, symbols: Iterable[str]) -> set:
+        return {self._ids[s] for s in symbols if s in self._ids}
+
+
+def delta_frame(
+    epoch: str, seq: int, prev: int, changes: Changes, ts: int, ids: set | None = None
+) -> Dict[str, Any]:
+    """Build a `stock_delta` frame, optionally restricted to `ids`."""
+    items = changes.items() if ids is None else ((i, c) for i, c in changes.items() if i in ids)
+    return {"epoch": epoch, "seq": seq, "prev": prev, "t": ts, "d": [[i, c] for i, c in items]}
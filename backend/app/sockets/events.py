@@ -1,177 +1,472 @@
 """Socket streamer: uses Finnhub when market is open; otherwise sends last close.
 
-Falls back to periodic yfinance polling if FINNHUB_API_KEY is missing.
+The upstream connection is owned by `StreamerSupervisor` (see
+`supervisor.py`), which falls back to periodic yfinance polling if
+FINNHUB_API_KEY is missing or Finnhub is unavailable.
+
+Clients may `subscribe` / `unsubscribe` to symbols; subscribed clients get
+one `stock_update` per flush holding only their symbols. Clients that never
+subscribe receive every symbol; unsubscribing from some leaves them the rest.
+
+Passing `{"encoding": "delta"}` to `subscribe` switches a client to compact
+`stock_delta` frames (see `delta.py`): a `stock_keyframe` is sent right away
+and periodically, then only changed fields; `resync` requests a keyframe.
+`{"encoding": "msgpack"}` keeps `stock_update` but sends the records as one
+binary MessagePack attachment in columns (needs the optional msgpack package).
+
+After a reconnect, clients send `resume` with the last seq they saw (json
+clients get it as the second `stock_update` argument) and receive only what
+changed meanwhile, instead of refetching the snapshot (see `replay.py`).
+
+With several workers (QUOTE_BOARD), the feed process writes quotes to the
+shared board and every worker's flush loop emits them to its own clients.
+Stream frames therefore bypass the Socket.IO message queue: the queue would
+hand each frame to every worker and deliver it once per worker, and
+subscriptions, seq and replay state only exist in the worker holding the
+client. The queue carries the feed process's status broadcasts (`error`,
+`info`) to every worker's clients.
 """
 
 import os
-import json
 import time
 import threading
 import logging
 from threading import Lock
 
-import websocket  # type: ignore
+from flask import request
+from flask_socketio import join_room, leave_room
 
 from ..extensions import socketio
-from ..services import market
+from ..services import market, orders
+from .conflation import TickConflator
+from .delta import DeltaEncoder, delta_frame
+from .replay import ReplayBuffer
+from .subscriptions import SubscriptionRegistry
+from .supervisor import StreamerSupervisor
+from ..utils import codec
+from ..utils.leader import LeaderLock
 
 _started = False
 _lock = Lock()
 
+# Rooms for clients that have not subscribed to specific symbols, per encoding
+FIREHOSE_ROOM = "stock_update:all"
+DELTA_FIREHOSE_ROOM = "stock_delta:all"
+MSGPACK_FIREHOSE_ROOM = "stock_update:msgpack"
+_FIREHOSE_ROOMS = {"json": FIREHOSE_ROOM, "delta": DELTA_FIREHOSE_ROOM, "msgpack": MSGPACK_FIREHOSE_ROOM}
+# Share of the poll interval a yfinance polling pass may spend waiting on quotes
+POLL_DEADLINE_FRACTION = 0.8
+# symbol -> `fetched_at` of the last polled quote ingested
+_polled_at: dict = {}
+subscriptions = SubscriptionRegistry()
+conflator = TickConflator()
+encoder = DeltaEncoder(market.SUBSCRIBE_SYMBOLS)
+replay = ReplayBuffer()
+supervisor: StreamerSupervisor | None = None
+feed_lock: LeaderLock | None = None
+# How often a standby worker tries to take over the upstream feed
+FEED_TAKEOVER_SEC = 5.0
+# Work deferred until this process owns the upstream feed (`run_as_feed_leader`)
+_leader_tasks: list = []
+
+
+def _emit(event: str, data, to: str) -> None:
+    # Stream frames stay in this process (see the module docstring): each
+    # worker feeds its own clients from the quote board
+    socketio.emit(event, data, to=to, ignore_queue=True)
+
+
+def _update_args(records: dict, seq: int, encoding: str) -> tuple:
+    """`stock_update` arguments for a client's encoding: `(records, seq, epoch)`."""
+    if encoding == "msgpack":
+        return codec.pack_records(records), seq, encoder.epoch
+    return records, seq, encoder.epoch
+
+
+def _parse_symbols(data) -> list:
+    raw = data.get("symbols", []) if isinstance(data, dict) else data
+    if isinstance(raw, str):
+        raw = [raw]
+    known = set(market.SUBSCRIBE_SYMBOLS)
+    return [str(s).upper() for s in (raw or []) if str(s).upper() in known]
+
+
+@socketio.on("connect")
+def _on_connect(*_args):
+    subscriptions.connect(request.sid)
+    join_room(FIREHOSE_ROOM)
+
+
+@socketio.on("disconnect")
+def _on_disconnect(*_args):
+    subscriptions.disconnect(request.sid)
+
+
+def _sync_firehose_room(sid: str) -> None:
+    firehose = subscriptions.symbols_for(sid) is None
+    encoding = subscriptions.encoding_for(sid)
+    for enc, room in _FIREHOSE_ROOMS.items():
+        if firehose and enc == encoding:
+            join_room(room, sid=sid)
+        else:
+            leave_room(room, sid=sid)
+
 
-def _start_finnhub_ws(app, api_key: str):
-    """Connect to Finnhub WebSocket and emit updates to clients.
+def _send_keyframe(sid: str) -> None:
+    frame = encoder.keyframe(subscriptions.symbols_for(sid))
+    subscriptions.mark_sent(sid, frame["seq"])
+    _emit("stock_keyframe", frame, to=sid)
 
-    We subscribe to all `SUBSCRIBE_SYMBOLS` using US stocks format (e.g., AAPL).
+
+@socketio.on("subscribe")
+def _on_subscribe(data):
+    """`{"symbols": [...], "encoding": "json" | "msgpack" | "delta"}`; both keys optional."""
+    sid = request.sid
+    encoding = data.get("encoding") if isinstance(data, dict) else None
+    if encoding == "msgpack" and not codec.msgpack_available():
+        return {"error": "msgpack encoding is not available on this server"}
+    if encoding:
+        try:
+            subscriptions.set_encoding(sid, encoding)
+        except ValueError as e:
+            return {"error": str(e)}
+    symbols = []
+    if not isinstance(data, dict) or "symbols" in data:
+        symbols = _parse_symbols(data)
+        subscriptions.subscribe(sid, symbols)
+    _sync_firehose_room(sid)
+    subs = subscriptions.symbols_for(sid)
+
+    # Send current state right away so the client does not wait for a tick
+    if subscriptions.encoding_for(sid) == "delta":
+        _send_keyframe(sid)
+    else:
+        current = {s: market.latest_stock_data[s] for s in symbols if s in market.latest_stock_data}
+        if current:
+            _emit("stock_update", _update_args(current, encoder.seq, subscriptions.encoding_for(sid)), to=sid)
+    return {
+        "symbols": sorted(subs) if subs is not None else list(market.SUBSCRIBE_SYMBOLS),
+        "encoding": subscriptions.encoding_for(sid),
+        "seq": encoder.seq,
+        "epoch": encoder.epoch,
+    }
+
+
+@socketio.on("unsubscribe")
+def _on_unsubscribe(data):
+    sid = request.sid
+    symbols = _parse_symbols(data)
+    if symbols and subscriptions.symbols_for(sid) is None:
+        # Leaving the firehose: keep every other symbol
+        dropped = set(symbols)
+        subscriptions.subscribe(sid, [s for s in market.SUBSCRIBE_SYMBOLS if s not in dropped])
+    subs = subscriptions.unsubscribe(sid, symbols)
+    _sync_firehose_room(sid)
+    return {"symbols": sorted(subs)}
+
+
+@socketio.on("resync")
+def _on_resync(*_args):
+    _send_keyframe(request.sid)
+
+
+def _current_records(symbols) -> dict:
+    return {s: market.latest_stock_data[s] for s in symbols if s in market.latest_stock_data}
+
+
+@socketio.on("resume")
+def _on_resume(data):
+    """`{"since_seq": n, "epoch": e}` after a reconnect: replay what the client missed.
+
+    Delta clients get one `stock_delta` merging every missed change; json
+    clients get one `stock_update` with the current records of the symbols
+    that changed. If the gap is older than the replay buffer, delta clients
+    get a keyframe and json clients the current records of all their symbols;
+    the same happens when `epoch` names another stream (a restarted or
+    different worker), whose seqs say nothing about this one.
     """
-    ws_url = f"wss://ws.finnhub.io?token={api_key}"
+    sid = request.sid
+    try:
+        since = int(data.get("since_seq") if isinstance(data, dict) else data)
+    except (TypeError, ValueError):
+        return {"error": "since_seq must be an integer"}
+    subs = subscriptions.symbols_for(sid)
+    ids = None if subs is None else encoder.ids_for(subs)
+    epoch = data.get("epoch") if isinstance(data, dict) else None
+    if epoch is not None and epoch != encoder.epoch:
+        seq, missed = encoder.seq, None
+    else:
+        seq, missed = replay.since(since, ids)
+    encoding = subscriptions.encoding_for(sid)
+    delta = encoding == "delta"
+    if missed is None:
+        if delta:
+            _send_keyframe(sid)
+        else:
+            records = _current_records(subs if subs is not None else market.SUBSCRIBE_SYMBOLS)
+            _emit("stock_update", _update_args(records, seq, encoding), to=sid)
+        return {"mode": "keyframe", "seq": seq, "epoch": encoder.epoch}
+    if missed:
+        if delta:
+            subscriptions.mark_sent(sid, seq)
+            _emit("stock_delta", delta_frame(encoder.epoch, seq, since, missed, encoder.time), to=sid)
+        else:
+            table = encoder.symbol_table()
+            records = _current_records(table[i] for i in missed)
+            _emit("stock_update", _update_args(records, seq, encoding), to=sid)
+    return {"mode": "delta", "seq": seq, "epoch": encoder.epoch, "symbols": len(missed)}
 
-    def on_open(ws):
-        with app.app_context():
-            for sym in market.SUBSCRIBE_SYMBOLS:
-                ws.send(json.dumps({"type": "subscribe", "symbol": sym}))
 
-    def on_message(ws, message):
-        with app.app_context():
-            try:
-                payload = json.loads(message)
-                if payload.get("type") != "trade":
-                    return
-                data = payload.get("data", [])
-                batch = {}
-                now = int(time.time())
-                for trade in data:
-                    sym = trade.get("s")
-                    price = float(trade.get("p", 0.0) or 0.0)
-                    if not sym:
-                        continue
-                    prev = market.latest_stock_data.get(sym, {})
-                    change_pct = 0.0
-                    old = prev.get("price")
-                    if old:
-                        try:
-                            change_pct = ((price - float(old)) / float(old)) * 100
-                        except Exception:
-                            change_pct = 0.0
-                    market.latest_stock_data[sym] = {
-                        "symbol": sym,
-                        "name": market.STOCK_METADATA.get(sym, {}).get("name", sym),
-                        "price": price,
-                        "change": change_pct,
-                        "timestamp": now,
-                    }
-                    batch[sym] = {
-                        "symbol": sym,
-                        "price": price,
-                        "change": change_pct,
-                        "timestamp": now,
-                        "market_open": True,
-                    }
-                if batch:
-                    socketio.emit("stock_update", batch)
-            except Exception as e:
-                logging.exception("Finnhub WS on_message error")
-                socketio.emit("error", {"message": str(e)})
-
-    def on_error(ws, error):
-        with app.app_context():
-            logging.error(f"Finnhub WS error: {error}")
-            socketio.emit("error", {"message": str(error)})
-
-    def on_close(ws, close_status_code, close_msg):
-        with app.app_context():
-            logging.warning("Finnhub WS closed")
-            socketio.emit("info", {"message": "Finnhub socket closed"})
-
-    ws = websocket.WebSocketApp(
-        ws_url,
-        on_open=on_open,
-        on_message=on_message,
-        on_error=on_error,
-        on_close=on_close,
-    )
-
-    def run_ws():
-        logging.info("Starting Finnhub WebSocket...")
-        ws.run_forever(ping_interval=20, ping_timeout=10)
-
-    threading.Thread(target=run_ws, daemon=True).start()
-
-
-def _poll_yfinance_loop(app):
+def _publish(batch: dict) -> int:
+    """Fan a `{symbol: update}` batch out to interested clients.
+
+    Firehose clients share one broadcast per encoding; each subscribed client
+    gets a single message with just its symbols. Delta clients only receive
+    fields that changed. Returns the number of messages emitted.
+    """
+    seq, changes = encoder.apply(batch)
+    if changes:
+        replay.record(seq, changes)
+    firehose, targets = subscriptions.route(batch.keys())
+    sent = 0
+    # stock_update clients (json, msgpack) get the seq and epoch as extra arguments so they can `resume`
+    if "json" in firehose:
+        _emit("stock_update", _update_args(batch, seq, "json"), to=FIREHOSE_ROOM)
+        sent += 1
+    if "msgpack" in firehose:
+        _emit("stock_update", _update_args(batch, seq, "msgpack"), to=MSGPACK_FIREHOSE_ROOM)
+        sent += 1
+    if "delta" in firehose and changes:
+        # Every changed frame reaches the delta firehose, so prev is always seq - 1
+        _emit("stock_delta", delta_frame(encoder.epoch, seq, seq - 1, changes, encoder.time), to=DELTA_FIREHOSE_ROOM)
+        sent += 1
+    for sid, (encoding, syms) in targets.items():
+        if encoding == "delta":
+            frame = delta_frame(encoder.epoch, seq, 0, changes, encoder.time, encoder.ids_for(syms))
+            if not frame["d"]:
+                continue
+            frame["prev"] = subscriptions.mark_sent(sid, seq)
+            _emit("stock_delta", frame, to=sid)
+        else:
+            _emit("stock_update", _update_args({s: batch[s] for s in syms}, seq, encoding), to=sid)
+        sent += 1
+    return sent
+
+
+def send_keyframes() -> None:
+    """Periodic keyframes so delta clients converge even without asking."""
+    _emit("stock_keyframe", encoder.keyframe(), to=DELTA_FIREHOSE_ROOM)
+    _, targets = subscriptions.route(market.SUBSCRIBE_SYMBOLS)
+    for sid, (encoding, _syms) in targets.items():
+        if encoding == "delta":
+            _send_keyframe(sid)
+
+
+def _ingest_price(sym: str, price: float, now: int, size: float = 0.0) -> None:
+    """Update the live quote for `sym`, match resting orders against it and
+    queue it for the next flush.
+
+    Orders are matched on every tick here, in the feed process. With a shared
+    quote board nothing else happens; every worker's flush loop picks the
+    quote up from the board (`_pull_board`).
+    """
+    prev = market.latest_stock_data.get(sym, {})
+    change_pct = 0.0
+    old = prev.get("price")
+    if old:
+        try:
+            change_pct = ((price - float(old)) / float(old)) * 100
+        except Exception:
+            change_pct = 0.0
+    market.latest_stock_data[sym] = {
+        "symbol": sym,
+        "name": market.STOCK_METADATA.get(sym, {}).get("name", sym),
+        "price": price,
+        "change": change_pct,
+        "timestamp": now,
+        "size": size,
+    }
+    orders.engine.on_price(sym, price, now)
+    if market.quote_board is not None:
+        return
+    conflator.ingest(sym, {
+        "symbol": sym,
+        "price": price,
+        "change": change_pct,
+        "timestamp": now,
+        "market_open": True,
+    })
+
+
+def _pull_board() -> None:
+    """Queue quotes the feed process wrote to the shared board since the last pull.
+
+    Other workers also match their own resting orders here, against the latest
+    price per pull, until the feed process has picked those orders up.
+    """
+    leader = feed_lock is not None and feed_lock.held
+    for sym in market.quote_board.changed():
+        quote = market.quote_board.read(sym)
+        if quote is None:
+            continue
+        if not leader:
+            orders.engine.on_price(sym, quote["price"])
+        conflator.ingest(sym, {
+            "symbol": sym,
+            "price": quote["price"],
+            "change": quote["change"],
+            "timestamp": quote["timestamp"],
+            "market_open": True,
+        })
+
+
+def flush_updates() -> int:
+    """Emit everything conflated since the last flush; returns messages sent."""
+    if market.quote_board is not None:
+        _pull_board()
+    batch = conflator.drain()
+    if not batch:
+        return 0
+    market.touch_symbols(list(batch))
+    sent = _publish(batch)
+    conflator.record_messages(sent)
+    return sent
+
+
+def _flush_loop(app):
     with app.app_context():
-        interval = app.config.get("STREAM_INTERVAL_SEC", 2)
+        interval = max(app.config.get("STREAM_FLUSH_MS", 250), 10) / 1000.0
+        keyframe_every = app.config.get("STREAM_KEYFRAME_SEC", 30)
+        next_keyframe = time.monotonic() + keyframe_every
         while True:
+            started = time.monotonic()
             try:
-                if not market.is_market_open_now():
-                    # Do not poll; we will serve last close from DB via snapshot
-                    time.sleep(interval)
-                    continue
-                quotes = market.fetch_many(market.SUBSCRIBE_SYMBOLS)
-                now = int(time.time())
-                batch = {}
-                for q in quotes:
-                    sym = q["symbol"]
-                    price = float(q.get("price", 0.0) or 0.0)
-                    prev = market.latest_stock_data.get(sym, {})
-                    change_pct = 0.0
-                    old = prev.get("price")
-                    if old:
-                        try:
-                            change_pct = ((price - float(old)) / float(old)) * 100
-                        except Exception:
-                            change_pct = 0.0
-                    market.latest_stock_data[sym] = {
-                        "symbol": sym,
-                        "name": market.STOCK_METADATA.get(sym, {}).get("name", sym),
-                        "price": price,
-                        "change": change_pct,
-                        "timestamp": now,
-                    }
-                    batch[sym] = {
-                        "symbol": sym,
-                        "price": price,
-                        "change": change_pct,
-                        "timestamp": now,
-                        "market_open": True,
-                    }
-                if batch:
-                    socketio.emit("stock_update", batch)
-            except Exception as e:
-                logging.exception("Polling loop error")
-                socketio.emit("error", {"message": str(e)})
-            time.sleep(interval)
+                flush_updates()
+                if started >= next_keyframe:
+                    send_keyframes()
+                    next_keyframe = started + keyframe_every
+            except Exception:
+                logging.exception("Stream flush error")
+            time.sleep(max(0.0, interval - (time.monotonic() - started)))
+
+
+def stream_stats() -> dict:
+    return {
+        "conflation": conflator.stats(),
+        "subscriptions": subscriptions.stats(),
+        "seq": encoder.seq,
+        "replay": replay.stats(),
+        "upstream": streamer_status(),
+        "polling": market.quote_poller.stats(),
+        "bars": market.bar_builder.stats(),
+        "orders": orders.engine.stats(),
+    }
+
+
+def streamer_status() -> dict:
+    if supervisor is None:
+        return {"state": "idle"}
+    status = supervisor.status()
+    if feed_lock is not None:
+        status["feed_leader"] = feed_lock.held
+        status["pid"] = os.getpid()
+    return status
+
+
+def _ingest_trades(data: list) -> None:
+    """Finnhub `trade` payload -> live quotes (conflated; the flusher emits) and bars."""
+    now = int(time.time())
+    for trade in data:
+        sym = trade.get("s")
+        if not sym:
+            continue
+        price = float(trade.get("p", 0.0) or 0.0)
+        _ingest_price(sym, price, now, float(trade.get("v", 0.0) or 0.0))
+        market.bar_builder.add_trade(sym, price, float(trade.get("v", 0.0) or 0.0), trade.get("t") or now * 1000)
+
+
+def _poll_once(interval: float) -> None:
+    """One yfinance polling pass; used when Finnhub is unavailable.
+
+    Slow symbols keep their last quote so the pass fits in the poll interval;
+    such a repeat is skipped rather than re-ingested as a new tick.
+    """
+    quotes = market.fetch_many(market.SUBSCRIBE_SYMBOLS, deadline=interval * POLL_DEADLINE_FRACTION)
+    for q in quotes:
+        sym = q["symbol"]
+        fetched_at = q.get("fetched_at") or time.time()
+        if _polled_at.get(sym) == fetched_at:
+            continue
+        _polled_at[sym] = fetched_at
+        _ingest_price(sym, float(q.get("price", 0.0) or 0.0), int(fetched_at))
+
+
+def _await_leadership(lock: LeaderLock, retry_sec: float) -> None:
+    """Follower: take over the feed if the current feed process goes away."""
+    while not lock.try_acquire():
+        time.sleep(retry_sec)
+    logging.info(f"Process {os.getpid()} took over the upstream feed")
+    supervisor.start()
+    with _lock:
+        tasks = list(_leader_tasks)
+        _leader_tasks.clear()
+    for fn in tasks:
+        try:
+            fn()
+        except Exception:
+            logging.exception("Feed leader task failed")
+
+
+def run_as_feed_leader(fn) -> None:
+    """Run `fn` only in the process that owns the upstream feed.
+
+    Without a quote board every process is its own feed, so `fn` runs now;
+    otherwise it runs once this process holds the feed lock (now, or when it
+    takes over from a feed process that went away).
+    """
+    with _lock:
+        if feed_lock is not None and not feed_lock.held:
+            _leader_tasks.append(fn)
+            return
+    fn()
 
 
 def start_streamer_once(app):
     """Start the market streamer exactly once.
 
-    - When market is open, prefer Finnhub if API key is provided. Else poll yfinance.
-    - When market is closed, do nothing; clients receive last close via `snapshot`.
+    The supervisor keeps a single Finnhub connection open during market hours
+    (reconnecting with backoff, falling back to yfinance polling when no API
+    key is set or Finnhub keeps failing). When the market is closed it closes
+    the connection; clients receive last close via `snapshot`.
+
+    With QUOTE_BOARD enabled, only the process holding the feed lock runs the
+    supervisor and writes quotes to the shared board; the others stand by to
+    take over. Every process runs its own flush loop for its own clients.
     """
-    global _started
+    global _started, supervisor, feed_lock
     with _lock:
         if _started:
             return
         _started = True
 
         api_key = os.environ.get("FINNHUB_API_KEY") or app.config.get("FINNHUB_API_KEY")
-
-        def guard_loop():
-            # This guard checks market hours and starts appropriate streamers
-            # It runs continuously and will reconnect next open.
-            while True:
-                try:
-                    if market.is_market_open_now():
-                        if api_key:
-                            _start_finnhub_ws(app, api_key)
-                        else:
-                            _poll_yfinance_loop(app)
-                    # Sleep a bit before re-checking
-                    time.sleep(30)
-                except Exception as e:
-                    logging.exception("Guard loop error")
-                    socketio.emit("error", {"message": str(e)})
-                    time.sleep(30)
-
-        threading.Thread(target=guard_loop, daemon=True).start()
+        interval = app.config.get("STREAM_INTERVAL_SEC", 2)
+        supervisor = StreamerSupervisor(
+            api_key,
+            market.SUBSCRIBE_SYMBOLS,
+            on_trades=_ingest_trades,
+            poll_once=lambda: _poll_once(interval),
+            is_open=market.is_market_open_now,
+            notify=lambda event, payload: socketio.emit(event, payload),
+            poll_interval=interval,
+            heartbeat_timeout=app.config.get("STREAM_HEARTBEAT_SEC", 60),
+        )
+        if app.config.get("QUOTE_BOARD"):
+            market.use_quote_board(app.config.get("QUOTE_BOARD_NAME", "finsight-quotes"))
+            feed_lock = LeaderLock(app.config["FEED_LOCK_PATH"])
+            threading.Thread(
+                target=_await_leadership, args=(feed_lock, FEED_TAKEOVER_SEC), daemon=True
+            ).start()
+        else:
+            supervisor.start()
+        threading.Thread(target=_flush_loop, args=(app,), daemon=True).start()
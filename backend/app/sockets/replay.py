@@ -0,0 +1,77 @@
+"""Bounded replay of recent stream changes for reconnecting clients.
+
+Every flush that changed something is recorded per symbol as
+`(seq, changed_fields)` in a fixed-size ring. A client that reconnects sends
+`resume` with the last seq it saw; the missed changes are merged into one
+delta per symbol. If any symbol's ring has already dropped a change newer
+than that seq, the gap is too old and the caller falls back to a keyframe.
+"""
+
+import threading
+from collections import deque
+from typing import Any, Dict, Iterable, Tuple
+
+from .delta import Changes
+
+# Changes kept per symbol; at a 250ms flush this is ~2 minutes of ticks
+REPLAY_DEPTH = 512
+
+
+class ReplayBuffer:
+    def __init__(self, depth: int = REPLAY_DEPTH):
+        self._depth = depth
+        self._lock = threading.Lock()
+        self._rings: Dict[int, deque] = {}
+        # Newest seq evicted per symbol id; resuming from before it is impossible
+        self._evicted: Dict[int, int] = {}
+        self._seq = 0
+        self._resumed = 0
+        self._too_old = 0
+
+    def record(self, seq: int, changes: Changes) -> None:
+        with self._lock:
+            for sid, diff in changes.items():
+                ring = self._rings.get(sid)
+                if ring is None:
+                    ring = self._rings[sid] = deque()
+                if len(ring) >= self._depth:
+                    self._evicted[sid] = ring.popleft()[0]
+                ring.append((seq, diff))
+            self._seq = max(self._seq, seq)
+
+    def since(self, since_seq: int, ids: Iterable[int] | None = None) -> Tuple[int, Changes | None]:
+        """`(current seq, {id: merged changes after since_seq})`.
+
+        The changes are None when the gap cannot be replayed (too old, or a
+        seq ahead of this stream). Seqs from another stream epoch must be
+        rejected by the caller; they can look valid here.
+        """
+        with self._lock:
+            seq = self._seq
+            wanted = self._rings.keys() if ids is None else [i for i in ids if i in self._rings]
+            if since_seq > seq or any(self._evicted.get(i, 0) > since_seq for i in wanted):
+                self._too_old += 1
+                return seq, None
+            merged: Changes = {}
+            for i in wanted:
+                diff: Dict[str, Any] = {}
+                # Walk newest-first and stop at the first change already seen
+                for s, d in reversed(self._rings[i]):
+                    if s <= since_seq:
+                        break
+                    for code, value in d.items():
+                        diff.setdefault(code, value)
+                if diff:
+                    merged[i] = diff
+            self._resumed += 1
+            return seq, merged
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "seq": self._seq,
+                "depth": self._depth,
+                "entries": sum(len(r) for r in self._rings.values()),
+                "resumed": self._resumed,
+                "too_old": self._too_old,
+            }
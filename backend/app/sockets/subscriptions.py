@@ -0,0 +1,117 @@
+"""Per-client symbol subscriptions for the `stock_update` stream.
+
+Clients send `subscribe` / `unsubscribe` with a list of symbols; the streamer
+then sends each client only the symbols it watches, packed into one message
+per flush. Clients that never subscribe keep the legacy behaviour and
+receive every symbol (the "firehose").
+
+Each client also has an encoding: "json" (full `stock_update` records, the
+default), "msgpack" (the same records as one binary MessagePack attachment
+in columns, see `utils/codec.py`) or "delta" (compact `stock_delta` frames,
+see `delta.py`).
+"""
+
+import threading
+from typing import Dict, Iterable, List, Set, Tuple
+
+ENCODINGS = ("json", "msgpack", "delta")
+
+
+class SubscriptionRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_sid: Dict[str, Set[str]] = {}
+        self._by_symbol: Dict[str, Set[str]] = {}
+        self._firehose: Set[str] = set()
+        self._encoding: Dict[str, str] = {}
+        self._last_seq: Dict[str, int] = {}
+
+    def connect(self, sid: str) -> None:
+        with self._lock:
+            self._firehose.add(sid)
+            self._encoding[sid] = "json"
+
+    def disconnect(self, sid: str) -> None:
+        with self._lock:
+            self._firehose.discard(sid)
+            self._encoding.pop(sid, None)
+            self._last_seq.pop(sid, None)
+            for sym in self._by_sid.pop(sid, set()):
+                sids = self._by_symbol.get(sym)
+                if sids is not None:
+                    sids.discard(sid)
+                    if not sids:
+                        del self._by_symbol[sym]
+
+    def subscribe(self, sid: str, symbols: Iterable[str]) -> Set[str]:
+        """Add symbols for `sid` (leaving firehose mode); returns its full set."""
+        with self._lock:
+            self._firehose.discard(sid)
+            subs = self._by_sid.setdefault(sid, set())
+            for sym in symbols:
+                subs.add(sym)
+                self._by_symbol.setdefault(sym, set()).add(sid)
+            return set(subs)
+
+    def unsubscribe(self, sid: str, symbols: Iterable[str]) -> Set[str]:
+        with self._lock:
+            subs = self._by_sid.get(sid, set())
+            for sym in symbols:
+                subs.discard(sym)
+                sids = self._by_symbol.get(sym)
+                if sids is not None:
+                    sids.discard(sid)
+                    if not sids:
+                        del self._by_symbol[sym]
+            return set(subs)
+
+    def symbols_for(self, sid: str) -> Set[str] | None:
+        """Subscribed symbols, or None for a firehose client."""
+        with self._lock:
+            if sid in self._firehose:
+                return None
+            return set(self._by_sid.get(sid, set()))
+
+    def set_encoding(self, sid: str, encoding: str) -> None:
+        if encoding not in ENCODINGS:
+            raise ValueError(f"Unknown encoding {encoding!r}")
+        with self._lock:
+            self._encoding[sid] = encoding
+
+    def encoding_for(self, sid: str) -> str:
+        with self._lock:
+            return self._encoding.get(sid, "json")
+
+    def mark_sent(self, sid: str, seq: int) -> int:
+        """Record that frame `seq` went to `sid`; returns the previous seq sent."""
+        with self._lock:
+            prev = self._last_seq.get(sid, 0)
+            self._last_seq[sid] = seq
+            return prev
+
+    def route(self, symbols: Iterable[str]) -> Tuple[Set[str], Dict[str, Tuple[str, List[str]]]]:
+        """Who should get an update touching `symbols`.
+
+        Returns `(encodings used by firehose clients,
+        {sid: (encoding, [symbols it subscribed to])})`.
+        """
+        targets: Dict[str, Tuple[str, List[str]]] = {}
+        with self._lock:
+            for sym in symbols:
+                for sid in self._by_symbol.get(sym, ()):
+                    if sid not in targets:
+                        targets[sid] = (self._encoding.get(sid, "json"), [])
+                    targets[sid][1].append(sym)
+            firehose = {self._encoding.get(sid, "json") for sid in self._firehose}
+            return firehose, targets
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "clients": len(self._encoding),
+                "firehose_clients": len(self._firehose),
+                "subscribed_clients": len(self._by_sid),
+                "delta_clients": sum(1 for e in self._encoding.values() if e == "delta"),
+                "msgpack_clients": sum(1 for e in self._encoding.values() if e == "msgpack"),
+                "symbols_watched": len(self._by_symbol),
+            }
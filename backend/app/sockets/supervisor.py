@@ -0,0 +1,325 @@
+"""Supervised upstream connection for the live quote stream.
+
+One supervisor thread owns the Finnhub WebSocket and moves through:
+
+    idle -> connecting -> streaming -> backoff -> connecting ...
+                \\-> polling (no API key, or Finnhub keeps failing)
+    any state -> closed_for_session (market closed; socket closed)
+
+There is never more than one upstream connection: a new socket is only
+created after the previous one's thread has exited. A connection that goes
+quiet for longer than the heartbeat timeout (Finnhub sends pings even when
+no trades print) is treated as dead. Reconnects back off exponentially with
+jitter; after repeated failures the supervisor falls back to yfinance polling
+and periodically retries Finnhub.
+"""
+
+import json
+import logging
+import random
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, List
+
+import websocket  # type: ignore
+
+IDLE = "idle"
+CONNECTING = "connecting"
+STREAMING = "streaming"
+BACKOFF = "backoff"
+POLLING = "polling"
+CLOSED_FOR_SESSION = "closed_for_session"
+
+FINNHUB_WS_URL = "wss://ws.finnhub.io?token={token}"
+
+
+class RateMeter:
+    """Events per second over a sliding window of one-second buckets."""
+
+    def __init__(self, window_sec: int = 60):
+        self._window = window_sec
+        self._buckets: deque = deque()
+        self._lock = threading.Lock()
+
+    def add(self, n: int = 1) -> None:
+        sec = int(time.monotonic())
+        with self._lock:
+            if self._buckets and self._buckets[-1][0] == sec:
+                self._buckets[-1][1] += n
+            else:
+                self._buckets.append([sec, n])
+            self._trim(sec)
+
+    def _trim(self, now_sec: int) -> None:
+        while self._buckets and self._buckets[0][0] <= now_sec - self._window:
+            self._buckets.popleft()
+
+    def rate(self) -> float:
+        now_sec = int(time.monotonic())
+        with self._lock:
+            self._trim(now_sec)
+            if not self._buckets:
+                return 0.0
+            span = min(self._window, now_sec - self._buckets[0][0] + 1)
+            return sum(n for _, n in self._buckets) / float(span)
+
+
+class StreamerSupervisor:
+    def __init__(
+        self,
+        api_key: str | None,
+        symbols: List[str],
+        on_trades: Callable[[List[Dict[str, Any]]], None],
+        poll_once: Callable[[], None],
+        is_open: Callable[[], bool],
+        notify: Callable[[str, Dict[str, Any]], None] | None = None,
+        poll_interval: float = 2.0,
+        heartbeat_timeout: float = 60.0,
+        connect_timeout: float = 15.0,
+        backoff_base: float = 1.0,
+        backoff_max: float = 60.0,
+        failures_before_polling: int = 5,
+        finnhub_retry_sec: float = 300.0,
+        closed_check_sec: float = 30.0,
+    ):
+        self._api_key = api_key
+        self._symbols = list(symbols)
+        self._on_trades = on_trades
+        self._poll_once = poll_once
+        self._is_open = is_open
+        self._notify = notify or (lambda _event, _payload: None)
+        self._poll_interval = poll_interval
+        self._heartbeat_timeout = heartbeat_timeout
+        self._connect_timeout = connect_timeout
+        self._backoff_base = backoff_base
+        self._backoff_max = backoff_max
+        self._failures_before_polling = failures_before_polling
+        self._finnhub_retry_sec = finnhub_retry_sec
+        self._closed_check_sec = closed_check_sec
+
+        self._lock = threading.Lock()
+        self._state = IDLE
+        self._state_since = time.time()
+        self._ws: websocket.WebSocketApp | None = None
+        self._ws_thread: threading.Thread | None = None
+        # Reader thread that outlived its close; no new socket until it exits
+        self._stuck_thread: threading.Thread | None = None
+        self._opened = threading.Event()
+        self._last_message = 0.0
+        self._failures = 0
+        self._polling_since = 0.0
+        self._last_error: str | None = None
+        self._connects = 0
+        self._messages = RateMeter()
+        self._trades = RateMeter()
+        self._messages_total = 0
+        self._trades_total = 0
+        self._started = False
+
+    # ---------- state --------------------------------------------------
+    def _set_state(self, state: str) -> None:
+        with self._lock:
+            if state == self._state:
+                return
+            logging.info(f"Streamer state {self._state} -> {state}")
+            self._state = state
+            self._state_since = time.time()
+
+    @property
+    def state(self) -> str:
+        return self._state
+
+    def status(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        with self._lock:
+            return {
+                "state": self._state,
+                "state_since": int(self._state_since),
+                "upstream_connected": self._state == STREAMING,
+                "finnhub_configured": bool(self._api_key),
+                "consecutive_failures": self._failures,
+                "connects": self._connects,
+                "last_error": self._last_error,
+                "last_message_age_sec": (now - self._last_message) if self._last_message else None,
+                "messages_total": self._messages_total,
+                "trades_total": self._trades_total,
+                "messages_per_sec": self._messages.rate(),
+                "trades_per_sec": self._trades.rate(),
+            }
+
+    # ---------- upstream socket ---------------------------------------
+    def _on_open(self, ws) -> None:
+        for sym in self._symbols:
+            ws.send(json.dumps({"type": "subscribe", "symbol": sym}))
+        self._last_message = time.monotonic()
+        self._opened.set()
+
+    def _on_message(self, ws, message) -> None:
+        self._last_message = time.monotonic()
+        self._messages.add()
+        with self._lock:
+            self._messages_total += 1
+        try:
+            payload = json.loads(message)
+        except ValueError:
+            return
+        kind = payload.get("type")
+        if kind == "trade":
+            data = payload.get("data") or []
+            self._trades.add(len(data))
+            with self._lock:
+                self._trades_total += len(data)
+            try:
+                self._on_trades(data)
+            except Exception:
+                logging.exception("Finnhub trade handler error")
+        elif kind == "error":
+            self._last_error = str(payload.get("msg") or payload)
+            logging.error(f"Finnhub error message: {self._last_error}")
+
+    def _on_error(self, ws, error) -> None:
+        self._last_error = str(error)
+        logging.error(f"Finnhub WS error: {error}")
+        self._notify("error", {"message": str(error)})
+
+    def _on_close(self, ws, close_status_code, close_msg) -> None:
+        logging.warning("Finnhub WS closed")
+        self._notify("info", {"message": "Finnhub socket closed"})
+
+    def _connect(self) -> None:
+        self._opened.clear()
+        self._ws = websocket.WebSocketApp(
+            FINNHUB_WS_URL.format(token=self._api_key),
+            on_open=self._on_open,
+            on_message=self._on_message,
+            on_error=self._on_error,
+            on_close=self._on_close,
+        )
+        self._connects += 1
+        self._ws_thread = threading.Thread(
+            target=self._ws.run_forever,
+            kwargs={"ping_interval": 20, "ping_timeout": 10},
+            daemon=True,
+            name="finnhub-ws",
+        )
+        self._ws_thread.start()
+
+    def _disconnect(self) -> None:
+        ws, thread = self._ws, self._ws_thread
+        self._ws, self._ws_thread = None, None
+        if ws is not None:
+            try:
+                ws.close()
+            except Exception:
+                logging.exception("Error closing Finnhub WS")
+        if thread is not None:
+            thread.join(timeout=10)
+            if thread.is_alive():
+                logging.error("Finnhub WS reader did not exit after close; delaying reconnect")
+                self._stuck_thread = thread
+
+    def _alive(self) -> bool:
+        return self._ws_thread is not None and self._ws_thread.is_alive()
+
+    def _backoff_delay(self) -> float:
+        cap = min(self._backoff_max, self._backoff_base * (2 ** max(0, self._failures - 1)))
+        return random.uniform(cap / 2.0, cap)
+
+    # ---------- supervisor loop ---------------------------------------
+    def _stream_session(self) -> None:
+        """Connect once and stay until the socket dies, goes stale or the market closes."""
+        if self._stuck_thread is not None:
+            if self._stuck_thread.is_alive():
+                # Never run two readers; count it as a failure and back off
+                self._last_error = "previous reader still running"
+                self._failures += 1
+                return
+            self._stuck_thread = None
+        self._set_state(CONNECTING)
+        self._connect()
+        deadline = time.monotonic() + self._connect_timeout
+        while not self._opened.wait(0.1) and self._alive() and time.monotonic() < deadline:
+            pass
+        if not self._opened.is_set():
+            self._last_error = self._last_error or "connect timeout"
+            self._failures += 1
+            self._disconnect()
+            return
+        self._set_state(STREAMING)
+        streaming_since = time.monotonic()
+        with self._lock:
+            messages_at_open = self._messages_total
+        while self._is_open():
+            time.sleep(1.0)
+            if not self._alive():
+                self._failures += 1
+                break
+            if time.monotonic() - self._last_message > self._heartbeat_timeout:
+                self._last_error = "heartbeat timeout"
+                logging.warning("Finnhub WS stale; reconnecting")
+                self._failures += 1
+                break
+            if self._failures and time.monotonic() - streaming_since >= self._heartbeat_timeout:
+                with self._lock:
+                    received = self._messages_total > messages_at_open
+                if received:
+                    # Healthy for a full heartbeat window; reset the backoff ladder
+                    self._failures = 0
+        self._disconnect()
+
+    def _poll_session(self) -> None:
+        self._set_state(POLLING)
+        if not self._polling_since:
+            self._polling_since = time.monotonic()
+        started = time.monotonic()
+        try:
+            self._poll_once()
+        except Exception as e:
+            self._last_error = str(e)
+            logging.exception("Polling error")
+            self._notify("error", {"message": str(e)})
+        time.sleep(max(0.0, self._poll_interval - (time.monotonic() - started)))
+
+    def _should_poll(self) -> bool:
+        if not self._api_key:
+            return True
+        if self._failures < self._failures_before_polling:
+            return False
+        if self._polling_since and time.monotonic() - self._polling_since >= self._finnhub_retry_sec:
+            # Give Finnhub another chance; one more failure drops back to polling
+            self._failures = self._failures_before_polling - 1
+            self._polling_since = 0.0
+            return False
+        return True
+
+    def _run(self) -> None:
+        while True:
+            try:
+                if not self._is_open():
+                    if self._alive():
+                        self._disconnect()
+                    self._failures = 0
+                    self._polling_since = 0.0
+                    self._set_state(CLOSED_FOR_SESSION)
+                    time.sleep(self._closed_check_sec)
+                    continue
+                if self._should_poll():
+                    self._poll_session()
+                    continue
+                self._stream_session()
+                if self._failures and self._is_open():
+                    self._set_state(BACKOFF)
+                    time.sleep(self._backoff_delay())
+            except Exception as e:
+                logging.exception("Streamer supervisor error")
+                self._last_error = str(e)
+                self._notify("error", {"message": str(e)})
+                time.sleep(self._backoff_max)
+
+    def start(self) -> None:
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        threading.Thread(target=self._run, daemon=True, name="streamer-supervisor").start()
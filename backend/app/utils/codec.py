@@ -0,0 +1,61 @@
+# app/utils/codec.py
+"""Optional MessagePack encoding for market payloads.
+
+JSON stays the default everywhere. Clients that send
+`Accept: application/msgpack` (REST) or subscribe with
+`{"encoding": "msgpack"}` (Socket.IO) get MessagePack instead, laid out in
+columns: one array per field rather than one dict per bar or symbol, so
+key strings are sent once per payload instead of once per row.
+
+`msgpack` is an optional dependency; without it every client gets JSON.
+"""
+from typing import Any, Dict
+
+try:
+    import msgpack
+except ImportError:  # optional: JSON only
+    msgpack = None
+
+MSGPACK_MIMETYPE = "application/msgpack"
+_MSGPACK_TYPES = (MSGPACK_MIMETYPE, "application/vnd.msgpack", "application/x-msgpack")
+
+
+def msgpack_available() -> bool:
+    return msgpack is not None
+
+
+def packb(obj: Any) -> bytes:
+    if msgpack is None:
+        raise RuntimeError("msgpack is not installed")
+    return msgpack.packb(obj, use_bin_type=True)
+
+
+def wants_msgpack(accept) -> bool:
+    """True if a request's `Accept` (werkzeug MIMEAccept) prefers MessagePack over JSON.
+
+    Ties, wildcards and a missing header go to JSON.
+    """
+    if msgpack is None:
+        return False
+    best = accept.best_match(("application/json",) + _MSGPACK_TYPES, default="application/json")
+    return best in _MSGPACK_TYPES
+
+
+def records_to_columns(records: Dict[str, Dict[str, Any]]) -> Dict[str, list]:
+    """`{symbol: {field: value}}` -> `{"symbol": [...], field: [...]}`.
+
+    Fields missing from a record come out as None.
+    """
+    symbols = list(records)
+    fields: Dict[str, None] = {}
+    for rec in records.values():
+        fields.update(dict.fromkeys(rec))
+    fields.pop("symbol", None)
+    columns: Dict[str, list] = {"symbol": symbols}
+    for field in fields:
+        columns[field] = [records[s].get(field) for s in symbols]
+    return columns
+
+
+def pack_records(records: Dict[str, Dict[str, Any]]) -> bytes:
+    return packb(records_to_columns(records))
@@ -0,0 +1,50 @@
+# app/utils/leader.py
+import logging
+import os
+
+try:
+    import fcntl
+except ImportError:  # Windows: no flock; single-process deployments only
+    fcntl = None
+
+
+class LeaderLock:
+    """Non-blocking exclusive `flock` on a file: whoever holds it is the leader.
+
+    The OS drops the lock when the holding process exits (even on a crash),
+    so another process can take over by calling `try_acquire` again.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._fd: int | None = None
+
+    @property
+    def held(self) -> bool:
+        return self._fd is not None
+
+    def try_acquire(self) -> bool:
+        if self._fd is not None:
+            return True
+        if fcntl is None:
+            logging.warning("fcntl unavailable; assuming this process is the only one")
+            self._fd = -1
+            return True
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        os.ftruncate(fd, 0)
+        os.write(fd, str(os.getpid()).encode())
+        self._fd = fd
+        return True
+
+    def release(self) -> None:
+        if self._fd is None:
+            return
+        if self._fd >= 0:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+        self._fd = None
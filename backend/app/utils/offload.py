@@ -0,0 +1,64 @@
+# app/utils/offload.py
+"""Run blocking calls off the event loop when serving on gevent / eventlet.
+
+Monkey patching makes stdlib sockets cooperative (pymongo, websocket-client,
+the Flask request cycle), but not C-level I/O or CPU work: yfinance talks
+through libcurl (curl_cffi), Gemini through gRPC, and pandas/numpy hold the
+hub while they crunch. Those calls go to a pool of real OS threads here so
+one slow upstream request cannot stall every connected socket.
+
+In threading mode (the default) everything runs inline on the caller.
+"""
+import functools
+from typing import Any, Callable, TypeVar
+
+ASYNC_MODES = ("threading", "gevent", "eventlet")
+DEFAULT_WORKERS = 16
+
+_mode = "threading"
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+
+def configure(mode: str, workers: int = DEFAULT_WORKERS) -> None:
+    """Select the offload strategy; call once at startup with the Socket.IO async mode."""
+    global _mode
+    if mode not in ASYNC_MODES:
+        raise ValueError(f"Unsupported async mode {mode!r}; expected one of {ASYNC_MODES}")
+    _mode = mode
+    if mode == "gevent":
+        import gevent
+
+        gevent.get_hub().threadpool.maxsize = workers
+    elif mode == "eventlet":
+        import os
+
+        # tpool reads its size from the environment when first used
+        os.environ.setdefault("EVENTLET_THREADPOOL_SIZE", str(workers))
+
+
+def mode() -> str:
+    return _mode
+
+
+def run_blocking(fn: Callable[..., Any], *args, **kwargs) -> Any:
+    """`fn(*args, **kwargs)` on a native thread under an async hub, inline otherwise."""
+    if _mode == "gevent":
+        import gevent
+
+        return gevent.get_hub().threadpool.apply(fn, args, kwargs)
+    if _mode == "eventlet":
+        from eventlet import tpool
+
+        return tpool.execute(fn, *args, **kwargs)
+    return fn(*args, **kwargs)
+
+
+def blocking(fn: F) -> F:
+    """Decorator form of `run_blocking`."""
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        return run_blocking(fn, *args, **kwargs)
+
+    return wrapper  # type: ignore[return-value]
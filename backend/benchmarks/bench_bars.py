@@ -0,0 +1,64 @@
+"""Micro-benchmark: DataFrame -> bars conversion.
+
+Compares the old per-row `iterrows` loop with the NumPy conversion in
+`app.services.bars` on frames shaped like a 1d/5m chart (78 bars) and a
+6mo/1d chart (126 bars).
+
+Run from `backend/`:
+    python -m benchmarks.bench_bars
+"""
+
+import timeit
+
+import numpy as np
+import pandas as pd
+
+from app.services.bars import frame_to_bars, frame_to_columns
+
+
+def _frame(n: int, freq: str) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    idx = pd.date_range("2025-01-02 09:30", periods=n, freq=freq, tz="America/New_York")
+    close = 100 + rng.standard_normal(n).cumsum()
+    return pd.DataFrame(
+        {
+            "Open": close + rng.standard_normal(n) * 0.1,
+            "High": close + 0.5,
+            "Low": close - 0.5,
+            "Close": close,
+            "Volume": rng.integers(1_000, 100_000, n).astype(float),
+        },
+        index=idx,
+    )
+
+
+def _iterrows_bars(df):
+    return [
+        {
+            "time": int(idx.timestamp()),
+            "open": float(row["Open"]),
+            "high": float(row["High"]),
+            "low": float(row["Low"]),
+            "close": float(row["Close"]),
+            "volume": float(row.get("Volume", 0.0) or 0.0),
+        }
+        for idx, row in df.iterrows()
+    ]
+
+
+def main(number: int = 500) -> None:
+    cases = [("intraday 78 x 5m", _frame(78, "5min")), ("daily 126 x 1d", _frame(126, "1D"))]
+    print(f"{'case':<20}{'iterrows':>12}{'rows':>12}{'columns':>12}{'speedup':>10}")
+    for label, df in cases:
+        assert _iterrows_bars(df) == frame_to_bars(df)
+        t_loop = timeit.timeit(lambda: _iterrows_bars(df), number=number) / number
+        t_rows = timeit.timeit(lambda: frame_to_bars(df), number=number) / number
+        t_cols = timeit.timeit(lambda: frame_to_columns(df), number=number) / number
+        print(
+            f"{label:<20}{t_loop * 1e6:>10.0f}us{t_rows * 1e6:>10.0f}us"
+            f"{t_cols * 1e6:>10.0f}us{t_loop / t_rows:>9.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""Micro-benchmark: JSON vs. columnar MessagePack payloads.
+
+Encodes the three market payloads both ways and reports body size and
+encode time:
+- `/api/history/<sym>/5d` (390 bars x 5m), as JSON rows (the default), JSON
+  columns (`?format=columns`) and MessagePack columns
+- `/api/snapshot` for the full 34-symbol universe, as the JSON object and
+  as MessagePack columns
+- one `stock_update` flush touching every symbol, as JSON and MessagePack
+
+Payloads are synthetic but shaped like the real ones. Requires msgpack.
+
+Run from `backend/`:
+    python -m benchmarks.bench_payloads
+"""
+
+import gzip
+import json
+import timeit
+
+import numpy as np
+import pandas as pd
+
+from app.services.bars import bars_to_columns, frame_to_bars
+from app.services.market import SUBSCRIBE_SYMBOLS
+from app.utils import codec
+
+
+def _history(n: int = 390) -> dict:
+    rng = np.random.default_rng(0)
+    idx = pd.date_range("2025-01-06 09:30", periods=n, freq="5min", tz="America/New_York")
+    close = 180 + rng.standard_normal(n).cumsum() * 0.2
+    df = pd.DataFrame(
+        {
+            "Open": close + rng.standard_normal(n) * 0.05,
+            "High": close + rng.random(n) * 0.3,
+            "Low": close - rng.random(n) * 0.3,
+            "Close": close,
+            "Volume": rng.integers(10_000, 2_000_000, n).astype(float),
+        },
+        index=idx,
+    )
+    return {"symbol": "AAPL", "period": "5d", "interval": "5m", "data": frame_to_bars(df)}
+
+
+def _snapshot() -> dict:
+    rng = np.random.default_rng(1)
+    out = {}
+    for sym in SUBSCRIBE_SYMBOLS:
+        price = float(rng.uniform(20, 900))
+        vol = float(rng.integers(1_000_000, 90_000_000))
+        out[sym] = {
+            "symbol": sym,
+            "name": f"{sym} Corporation",
+            "price": price,
+            "change": float(rng.normal(0, 2)),
+            "timestamp": 1736181000,
+            "size": float(rng.integers(1, 500)),
+            "change_abs": float(rng.normal(0, 3)),
+            "volume": vol,
+            "prevVolume": vol * float(rng.uniform(0.7, 1.3)),
+            "rvol": float(rng.uniform(0.5, 2.0)),
+            "market_cap": float(rng.uniform(1e10, 3e12)),
+            "year_high": price * 1.3,
+            "year_low": price * 0.7,
+            "time": 1736181000,
+            "market_open": True,
+        }
+    return out
+
+
+def _ticks() -> dict:
+    rng = np.random.default_rng(2)
+    return {
+        sym: {
+            "symbol": sym,
+            "price": float(rng.uniform(20, 900)),
+            "change": float(rng.normal(0, 0.05)),
+            "timestamp": 1736181000,
+            "market_open": True,
+        }
+        for sym in SUBSCRIBE_SYMBOLS
+    }
+
+
+def _json(obj) -> bytes:
+    return json.dumps(obj, separators=(",", ":")).encode()
+
+
+def main(number: int = 300) -> None:
+    history = _history()
+    history_cols = history | {"format": "columns", "data": bars_to_columns(history["data"])}
+    snapshot = _snapshot()
+    ticks = _ticks()
+    cases = [
+        ("history 5d/5m", "json rows", lambda: _json(history)),
+        ("history 5d/5m", "json columns", lambda: _json(history_cols)),
+        ("history 5d/5m", "msgpack columns", lambda: codec.packb(history_cols)),
+        ("snapshot 34 sym", "json", lambda: _json(snapshot)),
+        ("snapshot 34 sym", "msgpack columns", lambda: codec.pack_records(snapshot)),
+        ("stock_update 34", "json", lambda: _json(ticks)),
+        ("stock_update 34", "msgpack columns", lambda: codec.pack_records(ticks)),
+    ]
+    print(f"{'payload':<18}{'encoding':<18}{'bytes':>9}{'gzip':>9}{'encode':>11}")
+    for label, encoding, encode in cases:
+        body = encode()
+        t = timeit.timeit(encode, number=number) / number
+        print(f"{label:<18}{encoding:<18}{len(body):>9}{len(gzip.compress(body)):>9}{t * 1e6:>9.0f}us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+"""Load test: concurrent Socket.IO clients one server process can hold.
+
+Two halves, run in separate terminals from `backend/`:
+
+1. A stand-alone server with the real streamer fan-out (subscriptions,
+   conflation, flush loop) fed by synthetic ticks, so no MongoDB, Finnhub or
+   yfinance is needed:
+
+       python -m benchmarks.load_sockets serve --mode threading --port 5099
+       python -m benchmarks.load_sockets serve --mode gevent --port 5099
+
+2. A client ramp that opens websocket clients in steps and, after each step,
+   checks how many are still connected, the `subscribe` ack round trip
+   (p50/p95) and the `stock_update` rate each client sees. The ramp stops at
+   the first step with more than --max-fail failed clients or a p95 ack
+   above --max-p95-ms:
+
+       python -m benchmarks.load_sockets run --url http://127.0.0.1:5099 \\
+           --steps 100,250,500,1000,2000,4000
+
+Compare the "held" line of both modes. Raise the open-file limit first
+(`ulimit -n 65535`) or the ramp measures the limit instead of the server.
+The client side drives `websocket-client` (already in requirements.txt for
+the Finnhub feed) on gevent, so a single process can drive thousands of
+connections; watch its CPU too, and split the ramp over several `run`
+processes if it ever becomes the bottleneck.
+
+On a 1-vCPU sandbox with server and ramp sharing the core, both modes held
+100 clients (ack p50 34 ms threading, 36 ms gevent; ~4 updates/client/s)
+and failed the 250 step on ack latency (p50 3.0 s threading, 8.7 s gevent).
+The ramp process was the CPU bottleneck there, so those numbers bound the
+client, not the server; rerun on separate machines before comparing modes.
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+
+def _patch(mode: str) -> None:
+    # Must run before anything imports socket/threading
+    if mode == "gevent":
+        from gevent import monkey
+
+        monkey.patch_all()
+    elif mode == "eventlet":
+        import eventlet
+
+        eventlet.monkey_patch()
+
+
+def serve(mode: str, port: int, tick_hz: float) -> None:
+    _patch(mode)
+    import threading
+
+    from flask import Flask
+
+    from app.extensions import socketio
+    from app.services import market
+    from app.sockets import events
+    from app.utils import offload
+
+    flask_app = Flask("load_sockets")
+    offload.configure(mode)
+    socketio.init_app(flask_app, async_mode=mode, cors_allowed_origins="*", logger=False, engineio_logger=False)
+
+    def ticker():
+        prices = {s: 100.0 for s in market.SUBSCRIBE_SYMBOLS}
+        while True:
+            sym = random.choice(market.SUBSCRIBE_SYMBOLS)
+            prices[sym] *= 1 + random.uniform(-0.001, 0.001)
+            events._ingest_price(sym, round(prices[sym], 2), int(time.time()))
+            time.sleep(1.0 / tick_hz)
+
+    threading.Thread(target=ticker, daemon=True).start()
+    threading.Thread(target=events._flush_loop, args=(flask_app,), daemon=True).start()
+    print(f"serving mode={mode} pid={os.getpid()} port={port}", flush=True)
+    if mode == "threading":
+        socketio.run(flask_app, host="127.0.0.1", port=port, allow_unsafe_werkzeug=True, log_output=False)
+    else:
+        socketio.run(flask_app, host="127.0.0.1", port=port, log_output=False)
+
+
+def run(url: str, steps, settle: float, max_fail: float, max_p95_ms: float, probes: int) -> None:
+    _patch("gevent")
+    import json
+
+    import gevent
+    import gevent.event
+    import websocket
+    from gevent.pool import Pool
+
+    ws_url = url.replace("http", "ws", 1).rstrip("/") + "/socket.io/?EIO=4&transport=websocket"
+
+    class RawClient:
+        """Minimal Engine.IO v4 / Socket.IO v5 websocket client.
+
+        python-socketio's Client decodes every message and runs several
+        tasks per connection, so the load generator saturates long before
+        the server does; this one counts updates by prefix and only parses
+        acks.
+        """
+
+        def __init__(self):
+            self.ws = None
+            self.connected = False
+            self.updates = 0
+            self._acks = {}
+            self._next_id = 0
+
+        def connect(self) -> None:
+            try:
+                self.ws = websocket.create_connection(ws_url, timeout=10)
+                if not self.ws.recv().startswith("0"):
+                    return
+                self.ws.send("40")
+                self.connected = self.ws.recv().startswith("40")
+            except Exception:
+                self.connected = False
+                return
+            if self.connected:
+                gevent.spawn(self._read_loop)
+
+        def _read_loop(self) -> None:
+            try:
+                while True:
+                    msg = self.ws.recv()
+                    if msg == "2":
+                        self.ws.send("3")
+                    elif msg.startswith('42["stock_update"'):
+                        self.updates += 1
+                    elif msg.startswith("43"):
+                        digits = msg[2:msg.index("[")]
+                        ev = self._acks.pop(int(digits), None)
+                        if ev is not None:
+                            ev.set()
+            except Exception:
+                self.connected = False
+
+        def call(self, event: str, data, timeout: float) -> bool:
+            self._next_id += 1
+            ev = self._acks[self._next_id] = gevent.event.Event()
+            self.ws.send(f"42{self._next_id}" + json.dumps([event, data]))
+            return ev.wait(timeout)
+
+        def close(self) -> None:
+            try:
+                self.ws.close()
+            except Exception:
+                pass
+
+    clients = []
+
+    def connect_one():
+        c = RawClient()
+        c.connect()
+        clients.append(c)
+
+    def probe(c):
+        t0 = time.perf_counter()
+        try:
+            if not c.call("subscribe", {"encoding": "json"}, timeout=10):
+                return None
+        except Exception:
+            return None
+        return (time.perf_counter() - t0) * 1000.0
+
+    print(f"{'clients':>8} {'connected':>10} {'failed':>7} {'ack p50 ms':>11} {'ack p95 ms':>11} {'upd/client/s':>13}")
+    held = 0
+    pool = Pool(100)
+    for target in steps:
+        for _ in range(target - len(clients)):
+            pool.spawn(connect_one)
+        pool.join()
+        before = sum(c.updates for c in clients)
+        gevent.sleep(settle)
+        connected = [c for c in clients if c.connected]
+        rate = (sum(c.updates for c in clients) - before) / max(len(connected), 1) / settle
+        sample = random.sample(connected, min(probes, len(connected)))
+        lat = sorted(x for x in Pool(probes).map(probe, sample) if x is not None)
+        p50 = lat[len(lat) // 2] if lat else float("inf")
+        p95 = lat[min(len(lat) - 1, int(len(lat) * 0.95))] if lat else float("inf")
+        failed = len(clients) - len(connected) + (len(sample) - len(lat))
+        print(f"{len(clients):>8} {len(connected):>10} {failed:>7} {p50:>11.1f} {p95:>11.1f} {rate:>13.2f}", flush=True)
+        if failed > max_fail * len(clients) or p95 > max_p95_ms:
+            break
+        held = len(clients)
+    print(f"held: {held} concurrent clients")
+    for c in clients:
+        c.close()
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    s = sub.add_parser("serve")
+    s.add_argument("--mode", choices=["threading", "gevent", "eventlet"], default="threading")
+    s.add_argument("--port", type=int, default=5099)
+    s.add_argument("--tick-hz", type=float, default=200.0, help="synthetic trades per second")
+    r = sub.add_parser("run")
+    r.add_argument("--url", default="http://127.0.0.1:5099")
+    r.add_argument("--steps", default="100,250,500,1000,2000")
+    r.add_argument("--settle", type=float, default=5.0, help="seconds to hold each step")
+    r.add_argument("--max-fail", type=float, default=0.01, help="failed-client fraction that ends the ramp")
+    r.add_argument("--max-p95-ms", type=float, default=1000.0)
+    r.add_argument("--probes", type=int, default=50, help="clients sampled for ack latency")
+    args = parser.parse_args(argv)
+    if args.cmd == "serve":
+        serve(args.mode, args.port, args.tick_hz)
+    else:
+        steps = [int(x) for x in args.steps.split(",") if x]
+        run(args.url, steps, args.settle, args.max_fail, args.max_p95_ms, args.probes)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,4 +1,17 @@
 # run.py
+import os
+
+# Async workers must patch the stdlib before anything else is imported
+ASYNC_MODE = os.environ.get("SOCKETIO_ASYNC_MODE", "threading")
+if ASYNC_MODE == "gevent":
+    from gevent import monkey
+
+    monkey.patch_all()
+elif ASYNC_MODE == "eventlet":
+    import eventlet
+
+    eventlet.monkey_patch()
+
 from app import create_app
 from app.extensions import socketio
 from flask import Flask
@@ -9,5 +22,10 @@ app = create_app()
 CORS(app, origins="http://localhost:5173", supports_credentials=True)
 
 if __name__ == "__main__":
-    # Werkzeug is fine for local dev with Socket.IO in thread mode
-    socketio.run(app, host="0.0.0.0", port=5008, allow_unsafe_werkzeug=True)
+    if ASYNC_MODE == "threading":
+        # Werkzeug is fine for local dev with Socket.IO in thread mode
+        socketio.run(app, host="0.0.0.0", port=5008, allow_unsafe_werkzeug=True)
+    else:
+        # gevent / eventlet serve with their own WSGI servers; one OS thread
+        # holds every socket and blocking calls go through utils.offload
+        socketio.run(app, host="0.0.0.0", port=5008)
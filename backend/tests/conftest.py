@@ -0,0 +1,53 @@
+import mongomock
+import pytest
+
+from app import extensions
+from app.services import market_calendar, orders, trading
+
+
+class InlinePool:
+    """Runs submitted work right away so fills are visible when on_price returns."""
+
+    def submit(self, fn, *args, **kwargs):
+        fn(*args, **kwargs)
+
+
+class FakeExecute:
+    """Stands in for `trading.execute_market_order`; records every fill."""
+
+    def __init__(self):
+        self.calls = []
+        self.reject = None
+
+    def __call__(self, user_id, symbol, side, qty, price):
+        if self.reject:
+            raise trading.TradeRejected(self.reject)
+        self.calls.append((user_id, symbol, side, qty, price))
+        return {"usd": qty * price, "shares": qty}
+
+
+@pytest.fixture
+def db(monkeypatch):
+    database = mongomock.MongoClient().db
+    monkeypatch.setattr(extensions, "db", database, raising=False)
+    return database
+
+
+@pytest.fixture
+def market_open(monkeypatch):
+    """Whether the market counts as open; defaults to closed."""
+    state = {"open": False}
+    monkeypatch.setattr(market_calendar, "is_open", lambda *a, **k: state["open"])
+    return state
+
+
+@pytest.fixture
+def execute():
+    return FakeExecute()
+
+
+@pytest.fixture
+def engine(db, market_open, execute):
+    eng = orders.OrderEngine(execute=execute)
+    eng._pool = InlinePool()
+    return eng
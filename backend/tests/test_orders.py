@@ -0,0 +1,176 @@
+import time
+
+import pytest
+from bson import ObjectId
+
+from app.services import orders
+
+USER = "user-1"
+
+
+def _place(engine, side, order_type, limit=None, stop=None, **kwargs):
+    return engine.place(USER, "AAPL", side, order_type, 10, limit, stop, **kwargs)
+
+
+@pytest.mark.parametrize(
+    "side, order_type, limit, stop, miss, hit",
+    [
+        ("BUY", "limit", 100.0, None, 100.5, 99.5),
+        ("SELL", "limit", 100.0, None, 99.5, 100.5),
+        ("BUY", "stop", None, 100.0, 99.5, 100.5),
+        ("SELL", "stop", None, 100.0, 100.5, 99.5),
+    ],
+)
+def test_order_fills_once_price_crosses(engine, execute, db, side, order_type, limit, stop, miss, hit):
+    order = _place(engine, side, order_type, limit, stop)
+    assert order["status"] == "open"
+
+    assert engine.on_price("AAPL", miss) == 0
+    assert execute.calls == []
+
+    assert engine.on_price("AAPL", hit) == 1
+    assert execute.calls == [(USER, "AAPL", side, 10, hit)]
+    doc = db["orders"].find_one()
+    assert doc["status"] == "filled"
+    assert doc["fill_price"] == hit
+
+    # Filled orders leave the book
+    engine.on_price("AAPL", miss)
+    engine.on_price("AAPL", hit)
+    assert len(execute.calls) == 1
+    assert engine.stats()["open"] == 0
+
+
+def test_other_symbols_do_not_match(engine, execute):
+    _place(engine, "BUY", "limit", 100.0)
+    assert engine.on_price("MSFT", 50.0) == 0
+    assert execute.calls == []
+
+
+def test_stop_limit_reenters_as_limit(engine, execute, db):
+    _place(engine, "BUY", "stop_limit", limit=106.0, stop=105.0)
+
+    # Stop crossed, but the price is above the limit: the order now rests as a BUY limit
+    assert engine.on_price("AAPL", 107.0) == 0
+    assert execute.calls == []
+    doc = db["orders"].find_one()
+    assert doc["triggered"] is True
+    assert doc["status"] == "open"
+
+    # Falling back under the stop does not undo the trigger
+    assert engine.on_price("AAPL", 105.5) == 1
+    assert execute.calls == [(USER, "AAPL", "BUY", 10, 105.5)]
+
+
+def test_stop_limit_triggers_and_fills_on_one_tick(engine, execute):
+    _place(engine, "SELL", "stop_limit", limit=94.0, stop=95.0)
+    assert engine.on_price("AAPL", 94.5) == 1
+    assert execute.calls == [(USER, "AAPL", "SELL", 10, 94.5)]
+
+
+def test_cancel_before_cross(engine, execute, db):
+    order = _place(engine, "BUY", "limit", 100.0)
+
+    cancelled = engine.cancel(USER, order["id"])
+    assert cancelled["status"] == "cancelled"
+    assert engine.on_price("AAPL", 90.0) == 0
+    assert execute.calls == []
+    assert db["orders"].find_one()["status"] == "cancelled"
+
+    # Only open orders of their owner can be cancelled
+    assert engine.cancel(USER, order["id"]) is None
+    other = _place(engine, "BUY", "limit", 100.0)
+    assert engine.cancel("someone-else", other["id"]) is None
+
+
+def test_sweep_expires_day_orders(engine, execute, db):
+    order = _place(engine, "BUY", "limit", 100.0, tif="day")
+    _place(engine, "BUY", "limit", 100.0)
+    assert order["expires_at"]
+
+    assert engine.sweep(now=order["expires_at"] - 1) == 0
+    assert engine.sweep(now=order["expires_at"]) == 1
+    assert db["orders"].find_one({"tif": "day"})["status"] == "expired"
+
+    # Only the GTC order is left to fill
+    engine.on_price("AAPL", 90.0, now=order["expires_at"] + 1)
+    assert execute.calls == [(USER, "AAPL", "BUY", 10, 90.0)]
+    assert db["orders"].find_one({"tif": "gtc"})["status"] == "filled"
+
+
+def test_crossed_day_order_past_expiry_is_expired_not_filled(engine, execute, db):
+    order = _place(engine, "BUY", "limit", 100.0, tif="day")
+    engine.on_price("AAPL", 90.0, now=order["expires_at"] + 1)
+    assert execute.calls == []
+    assert db["orders"].find_one()["status"] == "expired"
+
+
+def test_rejected_fill_is_recorded(engine, execute, db):
+    execute.reject = "Insufficient funds"
+    _place(engine, "BUY", "limit", 100.0)
+    engine.on_price("AAPL", 99.0)
+    doc = db["orders"].find_one()
+    assert doc["status"] == "rejected"
+    assert doc["reason"] == "Insufficient funds"
+    assert engine.stats()["rejected"] == 1
+
+
+def test_arrival_match_needs_a_fresh_price_when_closed(engine, execute, market_open):
+    # Market closed, last quote from yesterday: the order rests
+    _place(engine, "BUY", "limit", 100.0, last_price=95.0, last_time=time.time() - 86400)
+    assert execute.calls == []
+
+    # A recent quote may fill the new order right away (and the resting one with it)
+    _place(engine, "BUY", "limit", 100.0, last_price=95.0, last_time=time.time())
+    assert len(execute.calls) == 2
+
+    # So may any known price while the market is open
+    engine.on_price("MSFT", 50.0, now=time.time() - 86400)
+    market_open["open"] = True
+    engine.place(USER, "MSFT", "SELL", "limit", 5, 45.0)
+    assert execute.calls[-1] == (USER, "MSFT", "SELL", 5, 50.0)
+
+
+def test_invalid_orders_are_refused(engine, db):
+    with pytest.raises(ValueError):
+        _place(engine, "HOLD", "limit", 100.0)
+    with pytest.raises(ValueError):
+        _place(engine, "BUY", "market")
+    with pytest.raises(ValueError):
+        _place(engine, "BUY", "stop_limit", stop=100.0)
+    with pytest.raises(ValueError):
+        _place(engine, "BUY", "limit", 100.0, tif="ioc")
+    assert db["orders"].count_documents({}) == 0
+
+
+def test_load_rests_stored_open_orders(engine, execute, db):
+    _place(engine, "BUY", "limit", 100.0)
+
+    restarted = orders.OrderEngine(execute=execute)
+    restarted._pool = engine._pool
+    assert restarted.load() == 1
+    assert restarted.load() == 0
+    restarted.on_price("AAPL", 99.0)
+    assert execute.calls == [(USER, "AAPL", "BUY", 10, 99.0)]
+
+
+def test_load_since_picks_up_only_new_orders(engine, db):
+    old = _place(engine, "BUY", "limit", 100.0)
+    db["orders"].update_one({}, {"$set": {"created_at": old["created_at"] - 60}})
+    _place(engine, "BUY", "limit", 100.0)
+
+    feed = orders.OrderEngine()
+    assert feed.load(since=old["created_at"] - 5) == 1
+
+
+def test_prune_drops_orders_closed_elsewhere(engine, execute, db):
+    cancelled = _place(engine, "BUY", "limit", 100.0)
+    _place(engine, "BUY", "limit", 100.0)
+    # Another worker cancels the first order
+    db["orders"].update_one({"status": "open"}, {"$set": {"status": "cancelled"}})
+    assert engine.stats()["open"] == 2
+
+    assert engine.prune() == 1
+    assert engine.stats()["open"] == 1
+    assert engine.on_price("AAPL", 99.0) == 1
+    assert db["orders"].find_one({"_id": ObjectId(cancelled["id"])})["status"] == "cancelled"
@@ -0,0 +1,81 @@
+import pytest
+
+from app.services import trading
+
+USER = "user-1"
+
+
+@pytest.fixture
+def portfolio(db):
+    db["portfolios"].insert_one({"user_id": USER, "available_balance": 1000.0})
+
+
+class FailingUpdates:
+    """Wraps a collection whose `find_one_and_update` always fails."""
+
+    def __init__(self, col):
+        self._col = col
+
+    def __getattr__(self, name):
+        return getattr(self._col, name)
+
+    def find_one_and_update(self, *args, **kwargs):
+        raise RuntimeError("write failed")
+
+
+def test_buy_updates_the_average_price(db, portfolio):
+    result = trading.execute_market_order(USER, "AAPL", "BUY", 2, 100.0)
+    assert result == {"usd": 800.0, "shares": {"AAPL": 2}}
+
+    result = trading.execute_market_order(USER, "AAPL", "BUY", 2, 150.0)
+    assert result == {"usd": 500.0, "shares": {"AAPL": 4}}
+    holding = db["portfolio_holdings"].find_one({"stock_symbol": "AAPL"})
+    assert holding["quantity"] == 4
+    assert holding["average_price"] == pytest.approx(125.0)
+
+
+def test_buy_needs_enough_balance(db, portfolio):
+    with pytest.raises(trading.TradeRejected, match="Insufficient balance") as e:
+        trading.execute_market_order(USER, "AAPL", "BUY", 11, 100.0)
+    assert e.value.status == 400
+    assert db["portfolios"].find_one()["available_balance"] == 1000.0
+    assert db["portfolio_holdings"].count_documents({}) == 0
+
+
+def test_unknown_portfolio_is_not_found(db):
+    with pytest.raises(trading.TradeRejected) as e:
+        trading.execute_market_order(USER, "AAPL", "BUY", 1, 100.0)
+    assert e.value.status == 404
+
+
+def test_sell_needs_enough_shares(db, portfolio):
+    trading.execute_market_order(USER, "AAPL", "BUY", 2, 100.0)
+    with pytest.raises(trading.TradeRejected, match="Insufficient shares"):
+        trading.execute_market_order(USER, "AAPL", "SELL", 3, 100.0)
+    with pytest.raises(trading.TradeRejected, match="Insufficient shares"):
+        trading.execute_market_order(USER, "MSFT", "SELL", 1, 100.0)
+    assert db["portfolio_holdings"].find_one()["quantity"] == 2
+    assert db["portfolios"].find_one()["available_balance"] == 800.0
+
+
+def test_selling_everything_removes_the_holding(db, portfolio):
+    trading.execute_market_order(USER, "AAPL", "BUY", 2, 100.0)
+    result = trading.execute_market_order(USER, "AAPL", "SELL", 2, 120.0)
+    assert result == {"usd": 1040.0, "shares": {}}
+    assert db["portfolio_holdings"].count_documents({}) == 0
+
+
+def test_failed_holding_update_refunds_the_cash(db, portfolio, monkeypatch):
+    monkeypatch.setattr(trading, "_holdings", lambda: FailingUpdates(db["portfolio_holdings"]))
+    with pytest.raises(RuntimeError):
+        trading.execute_market_order(USER, "AAPL", "BUY", 2, 100.0)
+    assert db["portfolios"].find_one()["available_balance"] == 1000.0
+
+
+def test_failed_cash_credit_restores_the_shares(db, portfolio, monkeypatch):
+    trading.execute_market_order(USER, "AAPL", "BUY", 2, 100.0)
+    monkeypatch.setattr(trading, "_portfolios", lambda: FailingUpdates(db["portfolios"]))
+    with pytest.raises(RuntimeError):
+        trading.execute_market_order(USER, "AAPL", "SELL", 1, 100.0)
+    assert db["portfolio_holdings"].find_one()["quantity"] == 2
+    assert db["portfolios"].find_one()["available_balance"] == 800.0
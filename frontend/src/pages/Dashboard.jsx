@@ -184,6 +184,13 @@ setStocks(transformedData);
   }, []);
 
   const socketRef = useRef(null);
+  // Delta stream state: symbol table from the last keyframe, and the seq
+  // (with its epoch) of the last frame applied
+  const symbolTableRef = useRef([]);
+  const lastSeqRef = useRef(null);
+  const lastEpochRef = useRef(null);
+  // Set while a keyframe is on its way; deltas are dropped until it lands
+  const awaitingKeyframeRef = useRef(true);
   
   useEffect(() => {
     if (loading) return;            // don’t attach until initial stocks are loaded
@@ -196,34 +203,58 @@ setStocks(transformedData);
     });
   
     socketRef.current = s;
+
+    // entries: [[symbol id, {p: price, c: change, ...}], ...] from a keyframe or delta
+    const applyEntries = (entries) => {
+      const snap = {};
+      for (const [id, fields] of entries || []) {
+        const symbol = symbolTableRef.current[id];
+        if (symbol) snap[symbol] = fields;
+      }
+      if (!Object.keys(snap).length) return;
+
+      setStocks(prev =>
+        prev.map(s => {
+          const upd = snap[s.symbol];
+          if (!upd) return s;
+          return { ...s, price: upd.p ?? s.price, change: upd.c ?? s.change, recentlyUpdated: true };
+        })
+      );
+
+      // remove highlight
+      setTimeout(() => {
+        setStocks(cur => cur.map(s => ({ ...s, recentlyUpdated: false })));
+      }, 1200);
+    };
   
     s.on("connect", () => {
       console.log("Socket.IO connected!");
       setConnected(true);
+      // Compact delta frames; the server answers with a keyframe of the current state
+      awaitingKeyframeRef.current = true;
+      s.emit("subscribe", { encoding: "delta" });
     });
-  
-    s.on("stock_update", (payload) => {
-      // server sends: { data: { AAPL:{price,change,...}, MSFT:{...} } }
-      const snap = payload?.data ?? payload;
-  
-      if (snap && typeof snap === "object" && !Array.isArray(snap)) {
-        setStocks(prev =>
-          prev.map(s => {
-            const upd = snap[s.symbol];
-            if (!upd) return s;
-            const nextPrice = typeof upd === "number" ? upd : (upd.price ?? s.price);
-            const nextChange = typeof upd === "number"
-              ? (s.price ? ((nextPrice - s.price)/s.price)*100 : s.change)
-              : (upd.change ?? s.change);
-            return { ...s, price: nextPrice, change: nextChange, recentlyUpdated: true };
-          })
-        );
-  
-        // remove highlight
-        setTimeout(() => {
-          setStocks(cur => cur.map(s => ({ ...s, recentlyUpdated: false })));
-        }, 1200);
+
+    s.on("stock_keyframe", (frame) => {
+      awaitingKeyframeRef.current = false;
+      symbolTableRef.current = frame.symbols || [];
+      lastSeqRef.current = frame.seq;
+      lastEpochRef.current = frame.epoch;
+      applyEntries(frame.k);
+    });
+
+    s.on("stock_delta", (frame) => {
+      if (awaitingKeyframeRef.current) return;
+      // Already covered by the keyframe
+      if (frame.epoch === lastEpochRef.current && frame.seq <= lastSeqRef.current) return;
+      // A frame from another stream epoch, or one that skips a seq: ask for a keyframe
+      if (frame.epoch !== lastEpochRef.current || frame.prev !== lastSeqRef.current) {
+        awaitingKeyframeRef.current = true;
+        s.emit("resync");
+        return;
       }
+      lastSeqRef.current = frame.seq;
+      applyEntries(frame.d);
     });
   
     s.on("disconnect", () => {
@@ -258,8 +289,9 @@ setStocks(transformedData);
           return;
         }
         
-        // Fetch from API if not cached
-        const history = await apiGet(`/api/history/${selectedSymbol}/${chartPeriod}`);
+        // Fetch from API if not cached; about one point per 2px is plenty for a line chart
+        const maxPoints = Math.min(1000, Math.max(200, Math.round(window.innerWidth / 2)));
+        const history = await apiGet(`/api/history/${selectedSymbol}/${chartPeriod}?max_points=${maxPoints}&shape=line`);
         const { data } = history;
         
         // Format the data